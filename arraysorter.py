@@ -0,0 +1,239 @@
+import numpy as np
+
+from instrumentation import log
+
+# NumPy array-backed assignment engine
+#
+# Holds the whole problem as a few dense arrays instead of Student / Class
+# objects and assigns one period at a time with batch operations:
+#
+#   preferences  students x choices   session position of each choice, -1 if none
+#   enrolment    sessions x periods   students in each class
+#   min_limit    sessions x periods   class minimums
+#   max_limit    sessions x periods   class maximums
+#   assignment   students x periods   session position per period, -1 if none
+#
+# Students are kept in the order they were given (getStudentData already puts
+# them in priority order), so whenever too many students want the same class
+# the earliest ones win. Student and session objects are only read while the
+# arrays are built, and the result goes back through Class.addStudent and
+# Student.assignSession once every period is done. A student left without a
+# class once the leftovers are placed gets a seat in a full class they can take
+# (makeRoom), freed by moving one of its students to a class with room.
+
+UNASSIGNED = -1
+
+# CUSTOM TYPES
+
+class AssignmentArrays:
+
+    def __init__(self, students: list, sessions: dict):
+
+        self.session_ids = np.array(list(sessions.keys()), dtype=np.int32)
+        positions = {session_id: position for position, session_id in enumerate(sessions.keys())}
+        session_list = list(sessions.values())
+
+        num_students = len(students)
+        num_choices = max((len(student.choices) for student in students), default=0)
+        self.num_periods = min(len(session.classes) for session in session_list)
+
+        # Choice matrix, unknown session ids are treated as no choice
+        self.preferences = np.full((num_students, num_choices), UNASSIGNED, dtype=np.int32)
+        for student_index, student in enumerate(students):
+            for choice_index, session_id in enumerate(student.choices):
+                self.preferences[student_index, choice_index] = positions.get(session_id, UNASSIGNED)
+
+        # Eligibility only depends on grade, so it is asked once per grade
+        grades = np.array([student.grade for student in students], dtype=np.int32)
+        grade_values, self.grade_codes = np.unique(grades, return_inverse=True)
+        self.eligible = np.zeros((len(grade_values), len(session_list)), dtype=bool)
+        for grade_code, grade in enumerate(grade_values):
+            example = students[int(np.flatnonzero(grades == grade)[0])]
+            self.eligible[grade_code] = [session.checkStudent(example) for session in session_list]
+
+        self.enrolment = np.array([[len(session_class.students) for session_class in session.classes[:self.num_periods]] for session in session_list], dtype=np.int32).reshape(len(session_list), self.num_periods)
+        self.min_limit = np.array([[session_class.min_limit for session_class in session.classes[:self.num_periods]] for session in session_list], dtype=np.int32).reshape(len(session_list), self.num_periods)
+        self.max_limit = np.array([[session_class.max_limit for session_class in session.classes[:self.num_periods]] for session in session_list], dtype=np.int32).reshape(len(session_list), self.num_periods)
+        self.assignment = np.full((num_students, self.num_periods), UNASSIGNED, dtype=np.int32)
+
+    # Checks which (student, session) pairs may be placed together in a period
+    def checkEligible(self, student_indexes: np.ndarray, session_positions: np.ndarray, period: int):
+
+        eligible = (session_positions >= 0) & self.eligible[self.grade_codes[student_indexes], np.maximum(session_positions, 0)]
+
+        # No repeats of a session the student already has in another period
+        if period > 0:
+            eligible &= ~(self.assignment[student_indexes, :period] == session_positions[:, None]).any(axis=1)
+
+        return eligible
+
+    # Places students in classes, earliest students first, as far as each class has room
+    def place(self, student_indexes: np.ndarray, session_positions: np.ndarray, period: int, room: np.ndarray):
+
+        order = np.argsort(session_positions, kind="stable")
+        student_indexes, session_positions = student_indexes[order], session_positions[order]
+
+        counts = np.bincount(session_positions, minlength=len(room))
+        group_start = np.cumsum(counts) - counts
+        place_in_line = np.arange(len(session_positions)) - group_start[session_positions]
+        accepted = place_in_line < room[session_positions]
+
+        student_indexes, session_positions = student_indexes[accepted], session_positions[accepted]
+        self.assignment[student_indexes, period] = session_positions
+        self.enrolment[:, period] += np.bincount(session_positions, minlength=len(room)).astype(np.int32)
+
+        return len(student_indexes)
+
+    # Gets students who can still be placed in a session for a period, in priority order
+    def getCandidates(self, free: np.ndarray, session_position: int, period: int):
+
+        candidates = np.flatnonzero(free)
+        positions = np.full(len(candidates), session_position, dtype=np.int32)
+
+        return candidates[self.checkEligible(candidates, positions, period)]
+
+# FUNCTIONS
+
+# Gives every student of a period their best available choice, one choice rank at a time
+def assignChoices(arrays: AssignmentArrays, period: int):
+
+    for choice_index in range(arrays.preferences.shape[1]):
+
+        candidates = np.flatnonzero(arrays.assignment[:, period] == UNASSIGNED)
+        if len(candidates) == 0:
+            break
+
+        wanted = arrays.preferences[candidates, choice_index]
+        eligible = arrays.checkEligible(candidates, wanted, period)
+
+        room = arrays.max_limit[:, period] - arrays.enrolment[:, period]
+        arrays.place(candidates[eligible], wanted[eligible], period, room)
+
+# Places students left without a class in a period, smallest classes first
+def assignLeftovers(arrays: AssignmentArrays, period: int):
+
+    # Special sessions have the smallest pool of students, so they are filled first
+    special = ~arrays.eligible.all(axis=0)
+
+    for needs_minimum in (True, False):
+
+        free = arrays.assignment[:, period] == UNASSIGNED
+        if not free.any():
+            return
+
+        enrolment = arrays.enrolment[:, period]
+        order = np.lexsort((enrolment, ~special))
+
+        for session_position in order:
+
+            if needs_minimum:
+                wanted = arrays.min_limit[session_position, period] - enrolment[session_position]
+            else:
+                wanted = arrays.max_limit[session_position, period] - enrolment[session_position]
+            if wanted <= 0:
+                continue
+
+            candidates = arrays.getCandidates(free, session_position, period)[:wanted]
+            arrays.assignment[candidates, period] = session_position
+            arrays.enrolment[session_position, period] += len(candidates)
+            free[candidates] = False
+
+# Places students still without a class in a period by moving a student out of a full class they can
+# take into a class with room
+def makeRoom(arrays: AssignmentArrays, period: int):
+
+    num_sessions = arrays.enrolment.shape[0]
+    all_sessions = np.arange(num_sessions)
+
+    for student_index in np.flatnonzero(arrays.assignment[:, period] == UNASSIGNED):
+
+        room = arrays.max_limit[:, period] - arrays.enrolment[:, period]
+        wanted = arrays.eligible[arrays.grade_codes[student_index]] & ~np.isin(all_sessions, arrays.assignment[student_index, :period])
+
+        # Sessions the student can take that are full, smallest first
+        for session_position in np.flatnonzero(wanted)[np.argsort(arrays.enrolment[wanted, period], kind="stable")]:
+
+            # Latest students in priority order are moved first
+            members = np.flatnonzero(arrays.assignment[:, period] == session_position)[::-1]
+            if len(members) == 0:
+                continue
+
+            targets = arrays.eligible[arrays.grade_codes[members]] & (room > 0)
+            targets &= ~(arrays.assignment[members, :period, None] == all_sessions).any(axis=1)
+            targets[:, session_position] = False
+
+            movable = np.flatnonzero(targets.any(axis=1))
+            if len(movable) == 0:
+                continue
+
+            member, target = members[movable[0]], int(np.argmax(targets[movable[0]]))
+            arrays.assignment[member, period] = target
+            arrays.assignment[student_index, period] = session_position
+            arrays.enrolment[target, period] += 1
+            break
+
+# Moves students out of classes above their minimum into classes still below it
+def fillMinimums(arrays: AssignmentArrays, period: int):
+
+    special = ~arrays.eligible.all(axis=0)
+    enrolment = arrays.enrolment[:, period]
+    order = np.lexsort((enrolment, ~special))
+
+    for session_position in order:
+
+        needed = arrays.min_limit[session_position, period] - enrolment[session_position]
+        if needed <= 0:
+            continue
+
+        surplus = np.maximum(enrolment - arrays.min_limit[:, period], 0)
+        surplus[session_position] = 0
+        movable = surplus[arrays.assignment[:, period]] > 0
+        movable &= arrays.assignment[:, period] != UNASSIGNED
+
+        # Latest students in priority order are moved first
+        candidates = arrays.getCandidates(movable, session_position, period)[::-1]
+        donors = arrays.assignment[candidates, period]
+
+        order_by_donor = np.argsort(donors, kind="stable")
+        candidates, donors = candidates[order_by_donor], donors[order_by_donor]
+        counts = np.bincount(donors, minlength=len(surplus))
+        place_in_line = np.arange(len(donors)) - (np.cumsum(counts) - counts)[donors]
+        keep = np.sort(np.flatnonzero(place_in_line < surplus[donors]))[:needed]
+        candidates, donors = candidates[keep], donors[keep]
+
+        np.subtract.at(arrays.enrolment[:, period], donors, 1)
+        arrays.assignment[candidates, period] = session_position
+        arrays.enrolment[session_position, period] += len(candidates)
+
+        if len(candidates) < needed:
+            log.warning("Session %s is %s students short in class #%s", arrays.session_ids[session_position], needed - len(candidates), period)
+
+# Assigns every period of the arrays
+def assignArrays(arrays: AssignmentArrays):
+
+    for period in range(arrays.num_periods):
+        assignChoices(arrays, period)
+        assignLeftovers(arrays, period)
+        makeRoom(arrays, period)
+        fillMinimums(arrays, period)
+
+    return arrays
+
+# Assigns students to classes with the array engine, same result structures as assignStudents
+def assignStudentsArray(students: list, sessions: dict):
+
+    arrays = assignArrays(AssignmentArrays(students, sessions))
+
+    for student, positions in zip(students, arrays.assignment.tolist()):
+
+        # A student's schedule is one session per period in order, so it stops at the first period without a class
+        if UNASSIGNED in positions:
+            positions = positions[:positions.index(UNASSIGNED)]
+            log.warning("Student (Id: %s) could only be given %s of %s classes", student.id, len(positions), arrays.num_periods)
+
+        for period, session_position in enumerate(positions):
+            session_id = int(arrays.session_ids[session_position])
+            sessions[session_id].classes[period].addStudent(student=student)
+            student.assignSession(session_id=session_id, sessions=sessions)
+
+    return students
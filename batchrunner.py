@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import fields
+from typing import List
+
+import evaluation
+import supersorter
+from bounds import getGap
+from instrumentation import logToFile, stats
+
+# Batch runner for many independent events or schools
+#
+# Reads a JSON manifest of jobs, each one a real_data/ style directory (or
+# explicit students / sessions files) with its own SortConfig, and solves them
+# concurrently on a process pool:
+#
+#   {
+#     "output_dir": "batch_output",
+#     "defaults": {"engine": "flow"},
+#     "jobs": [
+#       {"name": "north", "input_dir": "schools/north"},
+#       {"name": "south", "input_dir": "schools/south", "config": {"improve": true}, "timeout": 600}
+#     ]
+#   }
+#
+# Relative paths are taken from the manifest's directory. Every job writes
+# schedule.csv, updated_sessions.csv and run.log (its log messages) to
+# output_dir/<name>/, and a summary of outputs, timings, scores and errors is
+# written to output_dir/summary.json. A job that raises only fails itself; if
+# a worker process dies the jobs it took down are run again one per process,
+# so only the job that crashed is lost. A job may also have a timeout in
+# seconds (--timeout for every job without one): a job still running when it
+# is up fails as timed out, and the workers are stopped since a running job
+# cannot be cancelled; the other jobs they were running are run again.
+
+# CONSTANTS
+
+OUTPUT_DIR = "batch_output"
+SUMMARY_FILE = "summary.json"
+POLL_INTERVAL = 0.1 # Seconds between checks for jobs past their timeout
+
+# FUNCTIONS
+
+# Gets the jobs of a manifest with paths resolved and defaults applied
+def readManifest(filename: str):
+
+    with open(filename) as file:
+        manifest = json.load(file)
+
+    base_dir = os.path.dirname(os.path.abspath(filename))
+    resolve = lambda path: os.path.join(base_dir, path)
+
+    output_dir = resolve(manifest.get("output_dir", OUTPUT_DIR))
+    defaults = manifest.get("defaults", {})
+
+    jobs = []
+    for index, entry in enumerate(manifest["jobs"]):
+        input_dir = entry.get("input_dir")
+        name = entry.get("name") or (os.path.basename(os.path.normpath(input_dir)) if input_dir else f"job{index + 1}")
+
+        jobs.append({
+            "name": name,
+            "students": resolve(entry["students"]) if ("students" in entry) else resolve(os.path.join(input_dir or "", "students.csv")),
+            "sessions": resolve(entry["sessions"]) if ("sessions" in entry) else resolve(os.path.join(input_dir or "", "sessions.csv")),
+            "output_dir": resolve(entry["output_dir"]) if ("output_dir" in entry) else os.path.join(output_dir, name),
+            "config": {**defaults, **entry.get("config", {})},
+            "timeout": entry.get("timeout", manifest.get("timeout")),
+        })
+
+    names = [job["name"] for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{filename}: job names must be unique, repeated: {', '.join(duplicates)}")
+
+    return output_dir, jobs
+
+# Gets a SortConfig from a manifest config, unknown options are an error
+def getConfig(options: dict):
+
+    known = {config_field.name for config_field in fields(supersorter.SortConfig)}
+    unknown = sorted(set(options) - known)
+    if unknown:
+        raise ValueError(f"unknown config options: {', '.join(unknown)}")
+
+    return supersorter.SortConfig(**options)
+
+# Runs one job, every error is caught and returned so the batch goes on
+def runJob(job: dict):
+
+    start = time.perf_counter()
+    stats.reset()
+    summary = {"name": job["name"], "students": job["students"], "sessions": job["sessions"], "output_dir": job["output_dir"]}
+
+    try:
+        os.makedirs(job["output_dir"], exist_ok=True)
+        schedule_file = os.path.join(job["output_dir"], "schedule.csv")
+        updated_sessions_file = os.path.join(job["output_dir"], "updated_sessions.csv")
+
+        with logToFile(os.path.join(job["output_dir"], "run.log")):
+            config = getConfig(job["config"])
+
+            with stats.phase("parse"):
+                sessions = supersorter.getSessionData(filename=job["sessions"])
+                students = supersorter.getStudentData(filename=job["students"], session_ids=set(sessions.keys()))
+
+            result = supersorter.run(students, sessions, config)
+
+            with stats.phase("write"):
+                supersorter.writeStudentSelectionFile(filename=schedule_file, students=result.students, sessions=result.sessions)
+                supersorter.writeSessionSelectionFile(filename=updated_sessions_file, sessions=result.sessions)
+
+            with stats.phase("evaluate"):
+                report = evaluation.evaluateSchedule(result.students, result.sessions, supersorter.SPECIAL_SESSIONS)
+
+        summary.update({
+            "status": "ok" if report.passed else "infeasible",
+            "score": report.average_score,
+            "grade_scores": report.gradeAverages(),
+            "violations": len(report.violations),
+            "num_students": len(result.students),
+            "bound": result.bound.value if (result.bound is not None) else None,
+            "gap": getGap(report.average_score, result.bound) if (result.bound is not None) else None,
+            "outputs": [schedule_file, updated_sessions_file],
+        })
+
+    except Exception as error:
+        summary.update({"status": "failed", "error": f"{type(error).__name__}: {error}", "traceback": traceback.format_exc()})
+
+    summary["timings"] = stats.getSummary()["timings"]
+    summary["counters"] = stats.getSummary()["counters"]
+    summary["seconds"] = time.perf_counter() - start
+
+    return summary
+
+# Gets the summary of a job that did not finish
+def getFailedSummary(job: dict, error: str):
+    return {"name": job["name"], "output_dir": job["output_dir"], "status": "failed", "error": error}
+
+# Stops every worker of a pool, the pool is broken afterwards and its unfinished jobs raise BrokenProcessPool
+def killWorkers(executor: ProcessPoolExecutor):
+    for process in list((executor._processes or {}).values()):
+        process.kill()
+
+# Runs jobs on a process pool, returns their summaries in job order, the jobs a dead worker took down and
+# the jobs stopped along with one that timed out
+def runPool(jobs: List[dict], workers: int):
+
+    workers = workers if (workers is not None) else (os.cpu_count() or 1)
+    summaries: List[dict] = [None] * len(jobs)
+    lost: List[int] = []
+    stopped: List[int] = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # No more jobs are handed out than there are workers, so a job starts when it is submitted and
+        # its timeout counts from there
+        waiting = list(range(len(jobs)))
+        running: dict = {} # Future -> (job index, when it was submitted)
+        killed = False
+
+        while running or (waiting and not killed):
+            while waiting and (len(running) < workers) and (not killed):
+                index = waiting.pop(0)
+                running[executor.submit(runJob, jobs[index])] = (index, time.perf_counter())
+
+            done, _ = wait(running, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index, _ = running.pop(future)
+                try:
+                    summaries[index] = future.result()
+                except BrokenProcessPool:
+                    (stopped if killed else lost).append(index)
+
+            now = time.perf_counter()
+            expired = [future for future, (index, submitted) in running.items() if (jobs[index]["timeout"] is not None) and (now - submitted >= jobs[index]["timeout"])]
+
+            for future in expired:
+                index, _ = running.pop(future)
+                summaries[index] = getFailedSummary(jobs[index], f"timed out after {jobs[index]['timeout']}s")
+            if expired and (not killed):
+                killWorkers(executor)
+                killed = True
+
+        # A stopped pool takes no more jobs
+        stopped += waiting
+
+    return summaries, sorted(lost), sorted(stopped)
+
+# Runs every job of a batch and collects their summaries
+def runBatch(jobs: List[dict], workers: int = None, timeout: float = None):
+
+    jobs = [{**job, "timeout": timeout} if (job.get("timeout") is None) else job for job in jobs]
+    summaries, lost, stopped = runPool(jobs, workers)
+
+    # Jobs stopped with a timed out one did nothing wrong and are run again together, every round
+    # takes out at least the job that timed out
+    while stopped:
+        retried, retried_lost, retried_stopped = runPool([jobs[index] for index in stopped], workers)
+        for index, summary in zip(stopped, retried):
+            summaries[index] = summary
+        lost += [stopped[position] for position in retried_lost]
+        stopped = [stopped[position] for position in retried_stopped]
+
+    # A dead worker breaks the whole pool, so its jobs are retried alone to find the one that crashed
+    for index in lost:
+        retried, crashed, _ = runPool([jobs[index]], 1)
+        if crashed:
+            summaries[index] = getFailedSummary(jobs[index], "worker process died")
+        else:
+            summaries[index] = retried[0]
+
+    return summaries
+
+def printSummary(summaries: List[dict]):
+
+    for summary in summaries:
+        if (summary["status"] == "failed"):
+            print(f"{summary['name']}: FAILED {summary['error']}")
+        else:
+            print(f"{summary['name']}: {summary['status']}, {summary['num_students']} students, score {summary['score']:.2f}, {summary['seconds']:.2f}s")
+
+    failed = sum(1 for summary in summaries if summary["status"] != "ok")
+    print(f"{len(summaries) - failed} of {len(summaries)} jobs ok")
+
+# Gets command line arguments
+def parseArguments(argv: List[str] = None):
+
+    parser = argparse.ArgumentParser(description="Solves many sorting jobs from a manifest in parallel.")
+    parser.add_argument("manifest", help="JSON manifest of jobs")
+    parser.add_argument("--workers", type=int, default=None, help="processes to run jobs on (default: one per CPU)")
+    parser.add_argument("--summary", default=None, help=f"summary file to write (default: <output_dir>/{SUMMARY_FILE})")
+    parser.add_argument("--timeout", type=float, default=None, metavar="SECONDS", help="fails a job that runs longer than this, for jobs whose manifest entry has no timeout")
+
+    return parser.parse_args(argv)
+
+def main(argv: List[str] = None):
+
+    args = parseArguments(argv)
+    output_dir, jobs = readManifest(args.manifest)
+
+    start = time.perf_counter()
+    summaries = runBatch(jobs, args.workers, args.timeout)
+
+    summary_file = args.summary if (args.summary is not None) else os.path.join(output_dir, SUMMARY_FILE)
+    os.makedirs(os.path.dirname(os.path.abspath(summary_file)), exist_ok=True)
+    with open(summary_file, "w") as file:
+        json.dump({"manifest": os.path.abspath(args.manifest), "seconds": time.perf_counter() - start, "jobs": summaries}, file, indent=2)
+
+    printSummary(summaries)
+    print(f"Summary written to {summary_file}")
+
+    return 0 if all(summary["status"] == "ok" for summary in summaries) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
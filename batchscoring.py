@@ -0,0 +1,215 @@
+import itertools
+import operator
+
+import numpy as np
+
+from evaluation import scoreFromTotals
+
+# Batch scoring of every student at once
+#
+# Builds a students x sessions rank table once, where ranks[s, c] is the
+# position (1 = first choice) session column c has in student s's
+# preferences and 0 if they did not list it. Scores, per-grade averages,
+# rank histograms and report priorities are then all read from the table
+# with array operations instead of walking preference lists per student.
+#
+# Scores are evaluation.scoreFromTotals of the value and hit totals read from
+# the table. The table is built from plain lists (preferences, attended
+# session ids and grades per student), so it serves evaluation.Student lists
+# (scoreStudents) and supersorter's in-memory schedules
+# (evaluation.evaluateSchedule) alike.
+#
+# The table is filled from one flat array of every listed session id through a
+# dense id -> column lookup. It is kept between calls (RankTable) and reused
+# while the students are the same, so scoring a schedule again only reads what
+# each student attends.
+
+NOT_CHOSEN = 0
+MISSING = -1
+
+cached_rank_table = None # Last RankTable built, see getRankTable
+
+# CUSTOM TYPES
+
+class RankTable:
+
+    # Builds the rank table of these preference lists, session_ids are the table columns
+    def __init__(self, preferences: list, session_ids: list):
+
+        self.session_ids = list(session_ids)
+        self.columns = {session_id: column for column, session_id in enumerate(self.session_ids)}
+
+        # Dense session id -> column lookup, ids outside it are unknown sessions
+        self.lookup = np.full(max(self.session_ids, default=-1) + 1, MISSING, dtype=np.int32)
+        self.lookup[np.array(self.session_ids, dtype=np.int64)] = np.arange(len(self.session_ids), dtype=np.int32)
+
+        # Kept so the ids of the lists stay theirs while the table is cached
+        self.preferences = preferences
+        self.rows = {id(selections): row for row, selections in enumerate(preferences)}
+
+        self.lengths = np.fromiter(map(len, preferences), dtype=np.int32, count=len(preferences))
+        preference_columns = self.getColumnMatrix(preferences, self.lengths, int(self.lengths.max(initial=0)))
+
+        # Filled last choice first so a session listed twice keeps its first position
+        self.ranks = np.zeros((len(preferences), len(self.session_ids)), dtype=np.int16)
+        rows = np.arange(len(preferences))
+        for position in range(preference_columns.shape[1] - 1, -1, -1):
+            listed = preference_columns[:, position] != MISSING
+            self.ranks[rows[listed], preference_columns[listed, position]] = position + 1
+
+    # Gets the table columns of lists of session ids as a matrix padded with MISSING, from one flat
+    # array of every id. Unknown sessions and None are MISSING, ids past width are left out
+    def getColumnMatrix(self, id_lists: list, lengths: np.ndarray, width: int):
+
+        total = int(lengths.sum())
+        try:
+            ids = np.fromiter(itertools.chain.from_iterable(id_lists), dtype=np.int64, count=total)
+        except TypeError:
+            # Schedules read from files have None for missing periods
+            ids = np.fromiter((MISSING if (session_id is None) else session_id for session_id in itertools.chain.from_iterable(id_lists)), dtype=np.int64, count=total)
+
+        known = (ids >= 0) & (ids < len(self.lookup))
+        columns = np.full(total, MISSING, dtype=np.int32)
+        columns[known] = self.lookup[ids[known]]
+
+        rows = np.repeat(np.arange(len(id_lists)), lengths)
+        positions = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        inside = positions < width
+
+        matrix = np.full((len(id_lists), width), MISSING, dtype=np.int32)
+        matrix[rows[inside], positions[inside]] = columns[inside]
+
+        return matrix
+
+    # Gets the table row of each preference list, None when one of them is not in the table and
+    # a slice of every row when they are the lists the table was built from, in the same order
+    def getRows(self, preferences: list):
+
+        if (len(preferences) == len(self.preferences)) and all(map(operator.is_, preferences, self.preferences)):
+            return slice(None)
+
+        rows = [self.rows.get(id(selections)) for selections in preferences]
+        if (None in rows):
+            return None
+
+        return np.array(rows, dtype=np.int64)
+
+class BatchScores:
+
+    # schedules holds each student's attended session id per period, None when missing;
+    # keys are the objects getRank and getAttendingRanks are later asked about, one per student
+    def __init__(self, preferences: list, schedules: list, grades: list, session_ids: list, num_periods: int, keys: list = None):
+
+        table, table_rows = getRankTable(preferences, session_ids)
+
+        self.num_periods = num_periods
+        self.columns = table.columns
+        self.keys = keys
+        self.key_rows = None
+
+        self.lengths = table.lengths[table_rows]
+        self.ranks = table.ranks[table_rows]
+        self.grades = np.array(grades, dtype=np.int32).reshape(len(preferences))
+
+        # Attended session columns per period
+        schedule_lengths = np.fromiter(map(len, schedules), dtype=np.int32, count=len(schedules))
+        self.attending = table.getColumnMatrix(schedules, schedule_lengths, num_periods)
+
+        self.attended_ranks = self.getAttendedRanks()
+        self.scores = self.getScores()
+
+    # Gets the rank of each attended session, a session attended twice only counts once
+    def getAttendedRanks(self):
+
+        attended = self.attending >= 0
+        ranks = np.where(attended, self.ranks[np.arange(len(self.attending))[:, None], np.maximum(self.attending, 0)], NOT_CHOSEN)
+
+        for period in range(1, self.num_periods):
+            repeated = (self.attending[:, :period] == self.attending[:, period:period + 1]).any(axis=1)
+            ranks[repeated & attended[:, period], period] = NOT_CHOSEN
+
+        return ranks
+
+    # Gets every student's score, same values as evaluation.scoreSelectionList
+    def getScores(self):
+
+        hit = self.attended_ranks > 0
+        hits = hit.sum(axis=1)
+        values = np.where(hit, self.lengths[:, None] - (self.attended_ranks - 1), 0).sum(axis=1)
+
+        # Students without preferences have no hits and score 0
+        return scoreFromTotals(values, hits, np.maximum(self.num_periods * self.lengths, 1))
+
+    def getAverage(self):
+        return float(self.scores.mean()) if len(self.scores) else 0.0
+
+    # Gets the average score of each grade, grades in the order they first appear
+    def getGradeAverages(self):
+
+        grades, first_index, codes = np.unique(self.grades, return_index=True, return_inverse=True)
+        sums = np.bincount(codes, weights=self.scores, minlength=len(grades))
+        counts = np.bincount(codes, minlength=len(grades))
+
+        return {int(grades[code]): float(sums[code] / counts[code]) for code in np.argsort(first_index, kind="stable")}
+
+    # Gets how many attended classes were each choice rank, index 0 counts classes nobody chose
+    def getRankHistogram(self):
+        attended = self.attending >= 0
+        return np.bincount(self.attended_ranks[attended].ravel(), minlength=int(self.lengths.max(initial=0)) + 1)
+
+    # Gets the rank histogram of each grade
+    def getGradeRankHistograms(self):
+
+        attended = self.attending >= 0
+        num_ranks = int(self.lengths.max(initial=0)) + 1
+        grades = np.broadcast_to(self.grades[:, None], self.attending.shape)[attended]
+        ranks = self.attended_ranks[attended]
+
+        return {int(grade): np.bincount(ranks[grades == grade], minlength=num_ranks) for grade in np.unique(self.grades)}
+
+    # Gets the rank each student gave the session they attend in each period, repeats included
+    def getAttendingRanks(self, students: list = None):
+
+        rows = np.arange(len(self.attending)) if (students is None) else np.array([self.getRow(student) for student in students], dtype=np.int64)
+        attending = self.attending[rows]
+
+        return np.where(attending >= 0, self.ranks[rows[:, None], np.maximum(attending, 0)], NOT_CHOSEN)
+
+    # Gets the rank a student gave a session, 0 if they did not list it
+    def getRank(self, student, session_id: int):
+        column = self.columns.get(session_id)
+        return int(self.ranks[self.getRow(student), column]) if (column is not None) else NOT_CHOSEN
+
+    # Gets the row of one of the keys, the lookup is only built once a key is asked about
+    def getRow(self, key):
+
+        if (self.key_rows is None):
+            self.key_rows = {id(each_key): row for row, each_key in enumerate(self.keys)} if (self.keys is not None) else {}
+
+        return self.key_rows[id(key)]
+
+# FUNCTIONS
+
+# Gets the rank table of these preference lists and the table row of each of them. The last table
+# is reused while every list is one it was built from, only what the students attend changes
+# between evaluations of the same students
+def getRankTable(preferences: list, session_ids: list):
+    global cached_rank_table
+
+    table = cached_rank_table
+    if (table is not None) and (table.session_ids == list(session_ids)):
+        rows = table.getRows(preferences)
+        if (rows is not None):
+            return table, rows
+
+    cached_rank_table = RankTable(preferences, session_ids)
+
+    return cached_rank_table, slice(None)
+
+# Scores every evaluation.Student against the sessions they attend
+def scoreStudents(students: list, session_ids: list, num_periods: int):
+
+    preferences = [student.selections for student in students]
+    schedules = [[session.id if (session is not None) else None for session in student.selections_attending] for student in students]
+
+    return BatchScores(preferences, schedules, [student.grade for student in students], list(session_ids), num_periods, keys=students)
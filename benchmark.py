@@ -0,0 +1,251 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import evaluation
+import supersorter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_data"))
+from craft_chal_data import generate
+
+# Benchmark suite for the sort and evaluate pipeline
+#
+# Generates synthetic datasets (sample_data/craft_chal_data.py) at several
+# student counts and times each phase of a run on its own:
+#
+#   parse     getSessionData + getStudentData, snapshots off
+#   assign    the assignment engine, without fillClasses for greedy
+#   fill      fillClasses (greedy only)
+#   write     writeStudentSelectionFile + writeSessionSelectionFile
+#   evaluate_memory  evaluation.evaluateSchedule on the schedule in memory
+#   evaluate  evaluation.main on the written schedule
+#
+# Each size runs in its own process so peak RSS belongs to that size alone;
+# --memory also records the peak traced allocation of every phase, at the
+# cost of slower timings. Results are saved as JSON and compared against a
+# baseline file, any phase slower than the baseline by more than the
+# threshold is reported as a regression and the exit status is 1. A baseline
+# made with another engine or dataset seed is not compared against.
+
+# CONSTANTS
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DATA_DIR = ".benchmark_data"
+RESULTS_FILE = "benchmark_results.json"
+BASELINE_FILE = "benchmark_baseline.json"
+REGRESSION_THRESHOLD = 0.25 # Fraction a phase may slow down before it counts as a regression
+MIN_REGRESSION_SECONDS = 0.05 # Phases faster than this are too noisy to flag
+SEED = 0
+
+# FUNCTIONS
+
+# Gets the dataset files for a size, generating them the first time
+def getDataset(data_dir: str, num_students: int, seed: int):
+
+    os.makedirs(data_dir, exist_ok=True)
+    students_file = os.path.join(data_dir, f"students_{num_students}_{seed}.csv")
+    sessions_file = os.path.join(data_dir, f"sessions_{num_students}_{seed}.csv")
+
+    if not (os.path.exists(students_file) and os.path.exists(sessions_file)):
+        generate(students_file, sessions_file, num_students, seed=seed)
+
+    return students_file, sessions_file
+
+# Times a phase, recording its peak traced memory when memory tracing is on
+def timePhase(phases: dict, name: str, memory: bool, function, *args, **kwargs):
+
+    if memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        result = function(*args, **kwargs)
+    phases[name] = {"seconds": time.perf_counter() - start}
+
+    if memory:
+        phases[name]["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result
+
+# Runs every phase once on one dataset size
+def benchmarkSize(num_students: int, engine: str, data_dir: str, seed: int, memory: bool, evaluate: bool):
+
+    students_file, sessions_file = getDataset(data_dir, num_students, seed)
+    schedule_file = os.path.join(data_dir, f"schedule_{num_students}_{seed}.csv")
+    updated_sessions_file = os.path.join(data_dir, f"updated_sessions_{num_students}_{seed}.csv")
+
+    phases: dict = {}
+
+    def parse():
+        sessions = supersorter.getSessionData(filename=sessions_file, use_snapshot=False)
+        students = supersorter.getStudentData(filename=students_file, session_ids=set(sessions.keys()), use_snapshot=False)
+        return students, sessions
+
+    students, sessions = timePhase(phases, "parse", memory, parse)
+
+    if (engine == "greedy"):
+        students = timePhase(phases, "assign", memory, supersorter.assignStudents, students, sessions, prioritize_small_classes=True, account_for_special_sessions=True, fill=False)
+        students = timePhase(phases, "fill", memory, supersorter.fillClasses, students, sessions)
+    else:
+        students = timePhase(phases, "assign", memory, lambda: supersorter.run(students, sessions, supersorter.SortConfig(engine=engine)).students)
+
+    def write():
+        supersorter.writeStudentSelectionFile(filename=schedule_file, students=students, sessions=sessions)
+        supersorter.writeSessionSelectionFile(filename=updated_sessions_file, sessions=sessions)
+
+    timePhase(phases, "write", memory, write)
+
+    report = timePhase(phases, "evaluate_memory", memory, evaluation.evaluateSchedule, students, sessions, supersorter.SPECIAL_SESSIONS)
+    score, feasible = report.average_score, report.passed
+
+    if evaluate:
+        evaluation.USE_SNAPSHOTS = False
+        timePhase(phases, "evaluate", memory, evaluation.main, sessions_file, students_file, schedule_file, data_dir)
+
+    return {
+        "students": num_students,
+        "phases": phases,
+        "total_seconds": sum(phase["seconds"] for phase in phases.values()),
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "score": score,
+        "feasible": feasible,
+    }
+
+# Runs every size, each in a fresh process
+def runBenchmarks(sizes: List[int], engine: str, data_dir: str, seed: int, memory: bool, evaluate: bool):
+
+    results = []
+
+    for num_students in sizes:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(benchmarkSize, num_students, engine, data_dir, seed, memory, evaluate).result()
+        results.append(result)
+        printResult(result)
+
+    return {
+        "engine": engine,
+        "seed": seed,
+        "memory_traced": memory,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+def printResult(result: dict):
+
+    phases = ", ".join(f"{name} {phase['seconds']:.3f}s" for name, phase in result["phases"].items())
+    print(f"{result['students']} students: {phases}, peak RSS {result['peak_rss_bytes'] / 2**20:.1f} MB, score {result['score']:.2f}{'' if result['feasible'] else ' (infeasible)'}")
+
+# Gets why a report cannot be compared with a baseline, None when it can
+def getBaselineMismatch(report: dict, baseline: dict):
+
+    for key in ("engine", "seed"):
+        if (report.get(key) != baseline.get(key)):
+            return f"{key} is {baseline.get(key)} in the baseline and {report.get(key)} in this run"
+
+    return None
+
+# Gets every phase that got slower (or used more memory) than the baseline by more than the threshold
+def findRegressions(report: dict, baseline: dict, threshold: float):
+
+    mismatch = getBaselineMismatch(report, baseline)
+    if (mismatch is not None):
+        raise ValueError(f"Cannot compare against the baseline, {mismatch}")
+
+    regressions = []
+    baseline_sizes = {result["students"]: result for result in baseline["results"]}
+
+    # Memory tracing slows every phase down, so timings are only compared between like runs
+    metrics = [("peak_bytes", 0)]
+    if (report["memory_traced"] == baseline.get("memory_traced")):
+        metrics.append(("seconds", MIN_REGRESSION_SECONDS))
+
+    for result in report["results"]:
+        base = baseline_sizes.get(result["students"])
+        if (base is None):
+            continue
+
+        for name, phase in result["phases"].items():
+            base_phase = base["phases"].get(name)
+            if (base_phase is None):
+                continue
+
+            for metric, floor in metrics:
+                if (metric not in phase) or (metric not in base_phase):
+                    continue
+                if (phase[metric] > floor) and (phase[metric] > base_phase[metric] * (1 + threshold)):
+                    regressions.append({
+                        "students": result["students"],
+                        "phase": name,
+                        "metric": metric,
+                        "baseline": base_phase[metric],
+                        "current": phase[metric],
+                        "ratio": phase[metric] / base_phase[metric] if base_phase[metric] else None,
+                    })
+
+    return regressions
+
+# Gets command line arguments
+def parseArguments(argv: List[str] = None):
+
+    parser = argparse.ArgumentParser(description="Benchmarks the sort and evaluate pipeline on synthetic datasets.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="student counts to benchmark")
+    parser.add_argument("--engine", default="greedy", choices=supersorter.ENGINES, help="assignment engine")
+    parser.add_argument("--seed", type=int, default=SEED, help="dataset generator seed")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where generated datasets and outputs are kept")
+    parser.add_argument("--output", default=RESULTS_FILE, help="results file to write")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="writes the results to the baseline file as well")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="allowed slowdown over the baseline, 0.25 is 25%%")
+    parser.add_argument("--memory", action="store_true", help="records peak traced memory per phase (slows timings)")
+    parser.add_argument("--no-evaluate", action="store_true", help="skips the evaluate phase")
+
+    return parser.parse_args(argv)
+
+def main(argv: List[str] = None):
+
+    args = parseArguments(argv)
+
+    report = runBenchmarks(args.sizes, args.engine, args.data_dir, args.seed, args.memory, not args.no_evaluate)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        report["baseline"] = args.baseline
+
+        mismatch = getBaselineMismatch(report, baseline)
+        if (mismatch is not None):
+            report["baseline_mismatch"] = mismatch
+            print(f"Not comparing against {args.baseline}: {mismatch}")
+        else:
+            regressions = findRegressions(report, baseline, args.threshold)
+            report["regressions"] = regressions
+
+            for regression in regressions:
+                print(f"REGRESSION {regression['students']} students, {regression['phase']} {regression['metric']}: {regression['baseline']:.3f} -> {regression['current']:.3f}")
+            if not regressions:
+                print(f"No regressions against {args.baseline}")
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Saved baseline {args.baseline}")
+
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+# Upper bound on the average evaluation score
+#
+# The score of a student with L preferences who attends preferences at
+# positions j (0 based), h of them, is
+#
+#   (sum(L - j) + h * (h - 1) / 2) / (periods * L) * 100
+#
+# h * (h - 1) / 2 is convex, so on 0 <= h <= H (H = min(periods, eligible
+# preferences)) it stays under the chord h * (H - 1) / 2. Giving every listed
+# session the weight L - j + (H - 1) / 2 makes the score linear and never
+# lower, and dropping the per-period structure and class minimums leaves a
+# relaxed problem every real schedule fits in:
+#
+#   max  sum w[s, c] * x[s, c]
+#   sum over c of x[s, c] <= periods            every student
+#   sum over s of x[s, c] <= session capacity   every session (sum of class maximums)
+#   0 <= x[s, c] <= 1, only sessions the student listed and may attend
+#
+# Its optimum is an upper bound on any schedule's average score, so the gap
+# between a schedule and the bound is at least how far it is from the best
+# possible schedule. Two solvers are offered:
+#
+#   lagrangian  prices each session's capacity and moves the prices with
+#               subgradient steps, every set of prices gives a valid bound and
+#               each step is a few array passes over the students x choices
+#               table (the default, NumPy only)
+#   lp          solves the relaxation exactly with scipy.optimize.linprog,
+#               slower but the tightest bound this relaxation gives
+#
+# Students and sessions are lists here, so the bound serves supersorter's
+# students and evaluation's alike.
+
+LAGRANGIAN_ITERATIONS = 300
+LAGRANGIAN_TOLERANCE = 1e-4 # Relative bound improvement over STALL_ITERATIONS steps that counts as converged
+STALL_ITERATIONS = 25
+METHODS = ["lagrangian", "lp"]
+
+# CUSTOM TYPES
+
+class Bound(NamedTuple):
+    value: float # Upper bound on the average score
+    method: str
+    iterations: int
+    seconds: float
+
+class Relaxation:
+
+    # preferences holds each student's listed session ids, capacities the most students each session can take over all periods
+    def __init__(self, preferences: list, grades: list, session_ids: list, capacities: list, num_periods: int, special_sessions: list = (), special_grade: int = 9):
+
+        self.num_periods = num_periods
+        self.num_students = len(preferences)
+        self.capacities = np.array(capacities, dtype=np.float64)
+
+        columns = {session_id: column for column, session_id in enumerate(session_ids)}
+        special = np.isin(np.array(list(session_ids), dtype=np.int64), list(special_sessions))
+        lengths = np.array([len(selections) for selections in preferences], dtype=np.int64)
+        num_choices = int(lengths.max(initial=0))
+
+        # Students x choices table of session columns, -1 past the end of a student's list
+        get_column = columns.get
+        self.columns = np.array([[get_column(session_id, -1) for session_id in selections] + [-1] * (num_choices - len(selections)) for selections in preferences], dtype=np.int64).reshape(self.num_students, num_choices)
+
+        # Special sessions are only allowed from the special grade up
+        grades = np.array(grades, dtype=np.int64).reshape(self.num_students)
+        listed = self.columns >= 0
+        self.columns[listed & special[np.maximum(self.columns, 0)] & (grades[:, None] < special_grade)] = -1
+
+        hits = np.minimum((self.columns >= 0).sum(axis=1), num_periods)
+        scales = 100.0 / (num_periods * np.maximum(lengths, 1))
+        positions = np.arange(num_choices)
+        self.weights = np.where(self.columns >= 0, (lengths[:, None] - positions + (hits[:, None] - 1) / 2) * scales[:, None], 0.0)
+
+        self.allowed = self.columns >= 0
+        self.safe_columns = np.maximum(self.columns, 0)
+
+    # Gets the bound for a set of session prices and the seats each session would be asked for
+    def getDual(self, prices: np.ndarray):
+
+        reduced = np.where(self.allowed, self.weights - prices[self.safe_columns], 0.0)
+        reduced = np.maximum(reduced, 0.0)
+
+        # Every student takes their best periods choices with a positive reduced weight
+        if (reduced.shape[1] > self.num_periods):
+            cutoff = -np.partition(-reduced, self.num_periods - 1, axis=1)[:, self.num_periods - 1:self.num_periods]
+            taken = (reduced > 0) & (reduced >= cutoff)
+
+            # Ties at the cutoff may take more than periods choices, the extras are dropped left to right
+            taken &= np.cumsum(taken, axis=1) <= self.num_periods
+        else:
+            taken = reduced > 0
+
+        value = float((reduced * taken).sum() + self.capacities @ prices)
+        demand = np.bincount(self.columns[taken], minlength=len(self.capacities)).astype(np.float64)
+
+        return value, demand
+
+    # Gets the bound by subgradient steps on the session prices
+    def solveLagrangian(self, iterations: int = LAGRANGIAN_ITERATIONS, lower: float = None):
+
+        prices = np.zeros(len(self.capacities))
+        best, history = np.inf, []
+        step_scale = 1.0
+
+        for iteration in range(1, iterations + 1):
+            value, demand = self.getDual(prices)
+            best = min(best, value)
+            history.append(best)
+
+            subgradient = self.capacities - demand
+            norm = float(subgradient @ subgradient)
+            if (norm == 0) or ((prices == 0) & (subgradient >= 0)).all():
+                break # Prices are optimal, no capacity is overused and every priced one is full
+
+            if (len(history) > STALL_ITERATIONS) and (history[-STALL_ITERATIONS - 1] - best <= LAGRANGIAN_TOLERANCE * abs(best)):
+                break
+
+            # Polyak step towards the best known schedule, or a tenth below the bound when none is known
+            target = lower * self.num_students if (lower is not None) else 0.9 * best
+            if (len(history) > 10) and (history[-11] - best <= 0):
+                step_scale /= 2
+            prices = np.maximum(prices - step_scale * (value - min(target, value)) / norm * subgradient, 0.0)
+
+        return best, iteration
+
+    # Gets the bound from the exact relaxation with scipy's linprog
+    def solveLP(self):
+        from scipy.optimize import linprog # SciPy is only needed for the exact bound
+        from scipy.sparse import csr_matrix
+
+        rows, positions = np.nonzero(self.allowed)
+        columns = self.columns[rows, positions]
+        num_variables = len(rows)
+
+        # One row per student then one per session
+        constraint_rows = np.concatenate([rows, self.num_students + columns])
+        constraint_columns = np.concatenate([np.arange(num_variables), np.arange(num_variables)])
+        constraints = csr_matrix((np.ones(2 * num_variables), (constraint_rows, constraint_columns)), shape=(self.num_students + len(self.capacities), num_variables))
+        limits = np.concatenate([np.full(self.num_students, self.num_periods, dtype=np.float64), self.capacities])
+
+        result = linprog(-self.weights[rows, positions], A_ub=constraints, b_ub=limits, bounds=(0, 1), method="highs")
+        if (result.status != 0):
+            raise RuntimeError(f"linprog could not solve the relaxation: {result.message}")
+
+        return -result.fun, result.nit
+
+# FUNCTIONS
+
+# Gets an upper bound on the average score any schedule can reach, lower is a known schedule's average that speeds up the lagrangian
+def getUpperBound(preferences: list, grades: list, session_ids: list, capacities: list, num_periods: int, special_sessions: list = (), method: str = "lagrangian", lower: float = None, iterations: int = LAGRANGIAN_ITERATIONS):
+
+    start = time.perf_counter()
+    relaxation = Relaxation(preferences, grades, session_ids, capacities, num_periods, special_sessions)
+
+    if (method == "lagrangian"):
+        total, steps = relaxation.solveLagrangian(iterations, lower)
+    elif (method == "lp"):
+        total, steps = relaxation.solveLP()
+    else:
+        raise ValueError(f"Unknown bound method: {method}")
+
+    return Bound(value=min(total / max(relaxation.num_students, 1), 100.0), method=method, iterations=steps, seconds=time.perf_counter() - start)
+
+# Gets how far a score is below the bound, as a fraction of the bound
+def getGap(score: float, bound: Bound):
+    return max(bound.value - score, 0.0) / bound.value if bound.value else 0.0
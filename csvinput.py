@@ -0,0 +1,221 @@
+import csv
+from typing import Iterable, Iterator, List, NamedTuple
+
+from snapshot import loadSnapshot
+
+# Shared reader for the input and schedule CSV files
+#
+# supersorter and evaluation both read their files through here. Student and
+# schedule files are streamed row by row and read once, the rows are not held
+# in memory. Memory still grows with the file: the student ids seen so far are
+# kept to catch duplicates, a set entry per student instead of the whole row.
+# Every problem is raised as an InputError naming the file and line, when the
+# stream reaches it. With use_snapshot on, the read* functions load the whole
+# file and keep a binary snapshot of the records (see snapshot.py) so
+# unchanged files are not parsed twice. Only the command line runs turn
+# snapshots on.
+
+# CUSTOM TYPES
+
+class InputError(ValueError):
+
+    def __init__(self, filename: str, line: int, message: str):
+        super().__init__(f"{filename}, line {line}: {message}")
+        self.filename = filename
+        self.line = line
+
+class SessionHeader(NamedTuple):
+    num_sessions: int
+    min_students: int
+    max_students: int
+
+class SessionRecord(NamedTuple):
+    id: int
+    subject: str
+    teacher: str
+    presenter: str
+
+class StudentRecord(NamedTuple):
+    timestamp: int
+    first_name: str
+    last_name: str
+    homeroom: str
+    first_period: str
+    id: int
+    grade: int
+    choices: tuple
+
+class SelectionRecord(NamedTuple):
+    first_name: str
+    last_name: str
+    homeroom: str
+    first_period: str
+    id: int
+    grade: int
+    session_ids: tuple
+
+# FUNCTIONS
+
+# Checks whether a row has nothing in it, blank lines are skipped anywhere in a file
+def isBlankRow(row: List[str]):
+    return not any(value.strip() for value in row)
+
+# Gets an integer from a field
+def parseInt(filename: str, line: int, value: str, name: str):
+    try:
+        return int(value)
+    except ValueError:
+        raise InputError(filename, line, f"{name} is not a number: {value!r}")
+
+# Gets the value of a "NAME, value" metadata row
+def parseHeaderValue(filename: str, line: int, row: List[str], name: str):
+    if (len(row) < 2) or (row[0].strip() != name):
+        raise InputError(filename, line, f"expected {name} line, got {','.join(row)!r}")
+    return parseInt(filename, line, row[1].strip(), name)
+
+# Gets the metadata values at the top of a file and skips the column header after them
+def readHeader(filename: str, reader, names: List[str]):
+    try:
+        values = [parseHeaderValue(filename, index + 1, next(reader), name) for index, name in enumerate(names)]
+        next(reader) # Skips column header
+    except StopIteration:
+        raise InputError(filename, reader.line_num, "file ends inside the header")
+    return values
+
+# Gets the metadata and sessions of a session file, sessions are few so they are returned as a list
+def readSessionRecords(filename: str):
+
+    with open(filename, mode="r", newline="") as file:
+        reader = csv.reader(file)
+
+        num_sessions, min_students, max_students = readHeader(filename, reader, ["NUM_SESSIONS", "MIN_STUDENTS", "MAX_STUDENTS"])
+
+        if (min_students > max_students):
+            raise InputError(filename, 2, f"MIN_STUDENTS {min_students} is above MAX_STUDENTS {max_students}")
+
+        sessions: List[SessionRecord] = []
+        seen_ids = set()
+
+        for row in reader:
+            if isBlankRow(row):
+                continue
+            if (len(row) < 4):
+                raise InputError(filename, reader.line_num, f"expected 4 columns, got {len(row)}")
+
+            session_id = parseInt(filename, reader.line_num, row[0].strip(), "session id")
+            if session_id in seen_ids:
+                raise InputError(filename, reader.line_num, f"duplicate session id {session_id}")
+            seen_ids.add(session_id)
+
+            sessions.append(SessionRecord(id=session_id, subject=row[1].strip(), teacher=row[2].strip(), presenter=row[3].strip()))
+
+    if (len(sessions) != num_sessions):
+        raise InputError(filename, 1, f"NUM_SESSIONS is {num_sessions} but the file has {len(sessions)} sessions")
+
+    return SessionHeader(num_sessions=num_sessions, min_students=min_students, max_students=max_students), sessions
+
+# Streams the students of a student file, choices are checked against session_ids when given
+def iterStudentRecords(filename: str, session_ids: set = None, max_choices: int = None) -> Iterator[StudentRecord]:
+
+    with open(filename, mode="r", newline="") as file:
+        reader = csv.reader(file)
+
+        num_students, = readHeader(filename, reader, ["NUM_STUDENTS"])
+
+        seen_ids = set()
+
+        for row in reader:
+            line = reader.line_num
+            if isBlankRow(row):
+                continue
+            if (len(row) < 8):
+                raise InputError(filename, line, f"expected at least 8 columns, got {len(row)}")
+
+            student_id = parseInt(filename, line, row[5].strip(), "student id")
+            if student_id in seen_ids:
+                raise InputError(filename, line, f"duplicate student id {student_id}")
+            seen_ids.add(student_id)
+
+            choices = tuple(parseInt(filename, line, value.strip(), "choice") for value in row[7:] if value.strip())
+            if (max_choices is not None) and (len(choices) > max_choices):
+                raise InputError(filename, line, f"{len(choices)} choices, at most {max_choices} allowed")
+            if len(set(choices)) != len(choices):
+                raise InputError(filename, line, f"student {student_id} chose the same session twice")
+            if (session_ids is not None):
+                for choice in choices:
+                    if choice not in session_ids:
+                        raise InputError(filename, line, f"student {student_id} chose unknown session {choice}")
+
+            yield StudentRecord(
+                timestamp=parseInt(filename, line, row[0].strip(), "timestamp"),
+                first_name=row[1].strip(),
+                last_name=row[2].strip(),
+                homeroom=row[3].strip(),
+                first_period=row[4].strip(),
+                id=student_id,
+                grade=parseInt(filename, line, row[6].strip(), "grade"),
+                choices=choices
+            )
+
+    if (len(seen_ids) != num_students):
+        raise InputError(filename, 1, f"NUM_STUDENTS is {num_students} but the file has {len(seen_ids)} students")
+
+# Streams the rows of a schedule file written by writeStudentSelectionFile
+def iterSelectionRecords(filename: str, num_periods: int, session_ids: set = None) -> Iterator[SelectionRecord]:
+
+    with open(filename, mode="r", newline="") as file:
+        reader = csv.reader(file)
+
+        num_students, = readHeader(filename, reader, ["NUM_STUDENTS"])
+
+        num_rows = 0
+
+        for row in reader:
+            line = reader.line_num
+            if isBlankRow(row):
+                continue
+            if (len(row) < 6 + 2 * num_periods):
+                raise InputError(filename, line, f"expected {6 + 2 * num_periods} columns, got {len(row)}")
+
+            session_ids_attending = tuple(parseInt(filename, line, row[6 + 2 * period].strip(), "session id") for period in range(num_periods))
+            if (session_ids is not None):
+                for session_id in session_ids_attending:
+                    if session_id not in session_ids:
+                        raise InputError(filename, line, f"unknown session {session_id}")
+
+            num_rows += 1
+
+            yield SelectionRecord(
+                first_name=row[0].strip(),
+                last_name=row[1].strip(),
+                homeroom=row[2].strip(),
+                first_period=row[3].strip(),
+                id=parseInt(filename, line, row[4].strip(), "student id"),
+                grade=parseInt(filename, line, row[5].strip(), "grade"),
+                session_ids=session_ids_attending
+            )
+
+    if (num_rows != num_students):
+        raise InputError(filename, 1, f"NUM_STUDENTS is {num_students} but the file has {num_rows} rows")
+
+# Gets the metadata and sessions of a session file, from its snapshot when the file has not changed
+def readSessionFileRecords(filename: str, use_snapshot: bool = False):
+
+    if not use_snapshot:
+        return readSessionRecords(filename)
+
+    return loadSnapshot(filename, "sessions", lambda: readSessionRecords(filename))
+
+# Gets the students of a student file, streamed from the file or loaded whole from its snapshot when
+# the file has not changed
+def readStudentRecords(filename: str, session_ids: set = None, max_choices: int = None, use_snapshot: bool = False) -> Iterable[StudentRecord]:
+
+    if not use_snapshot:
+        return iterStudentRecords(filename, session_ids=session_ids, max_choices=max_choices)
+
+    build = lambda: list(iterStudentRecords(filename, session_ids=session_ids, max_choices=max_choices))
+
+    # Validation options are part of the key, a snapshot checked against other sessions is not reused
+    options = (sorted(session_ids) if (session_ids is not None) else None, max_choices)
+
+    return loadSnapshot(filename, "students", build, options)
@@ -11,11 +11,23 @@
 # This script started with the code from the sample solution and then 
 # was changed / will likely end up with unused code in it
 
+import os
 import random
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from csvinput import iterSelectionRecords, readSessionFileRecords, readStudentRecords
+from symbols import names
 
 NUM_PERIODS = 4
 DETAILED_REPORT_OUTPUT = True
+REPORT_BUFFER_SIZE = 1 << 20 # Bytes buffered by each report writer
+USE_SNAPSHOTS = False # Loads parsed input from .snapshots/ when the CSV files have not changed, on when run as a script
+
+# Report headers, the detailed output adds the selection priority column
+SCHEDULE_HEADER = "SESS, SUBJECT, TEACHER / ROOM, PRESENTER" + (", PRIORITY\n" if (DETAILED_REPORT_OUTPUT) else "\n")
+SESSION_REPORT_HEADER = "PERIOD, STUDENT LAST, STUDENT FIRST" + (", SELECTION_LEVEL" if (DETAILED_REPORT_OUTPUT) else "") + ", FOLLOWING_SESSION, FOLLOWING_SESS_TEADCHER\n"
 
 def read_file_into_list(filename):
 	f = open(filename, "r")
@@ -29,13 +41,69 @@ def read_file_into_list(filename):
 	
 	return ret_list
 
+# Scores how well a list of attended session ids matches the selections a
+# student wanted, 100 is every period in order of preference
+def scoreSelectionList(selections, attending_ids):
+	perfect_period_score = len(selections)
+	perfect_score = NUM_PERIODS * perfect_period_score
+
+	cur_period_score = perfect_period_score
+
+	cur_score = 0
+	periods_evaluated = 0
+	want_list_position = 0
+	while( (want_list_position < len(selections)) and (periods_evaluated < NUM_PERIODS) ):
+		session_wanted = selections[want_list_position]
+		want_list_position += 1
+
+		#print(f"Debug: wants to attend sess id {session_wanted})")
+
+		if (session_wanted in attending_ids):
+			#print(f"  Debug: Attending")
+			periods_evaluated += 1
+			cur_score += cur_period_score
+		else:
+			#print(f"  Debug: not attending")
+			# Student get this choice, score goes down
+			cur_period_score -= 1
+
+		#print(f"  Debug: cur_period_score = {cur_period_score} and cur_score = {cur_score}")
+
+	if (cur_score == 0):
+		return 0
+	else:
+		return cur_score / perfect_score * 100.0
+
+# Scores students from totals instead of walking their selections, the same
+# value as scoreSelectionList: a student with L selections who attends h of them,
+# at positions j (0 based), scores (sum(L - j) + h * (h - 1) / 2) / (periods * L) * 100.
+# value_sums is sum(L - j), perfect_scores is periods * L (at least 1); takes
+# single numbers or NumPy arrays alike
+def scoreFromTotals(value_sums, hits, perfect_scores):
+	return (value_sums + hits * (hits - 1) // 2) / perfect_scores * 100.0
+
+# Formats a selection priority, 1st / 2nd / 3rd / 4th..., N/A when not selected
+def formatPriority(priority):
+	if ( (priority == None) or (priority == 0) ):
+		return "N/A"
+	
+	if (priority == 1):
+		return "1st"
+	elif (priority == 2):
+		return "2nd"
+	elif (priority == 3):
+		return "3rd"
+	else:
+		return str(priority) + "th"
+
+# hr and first_period are codes in the symbols.names table, looked up when written
 class Student:
 	def __init__(self, student_id, first, last, teacherHr, teacherFirst, grade, timestamp):
 		self.first_name = first
 		self.last_name = last
 		self.id = student_id
-		self.hr = teacherHr
-		self.first_period = teacherFirst
+		self.hr = names.getCode(teacherHr)
+		self.first_period = names.getCode(teacherFirst)
 		self.grade = grade
 		self.timestamp = timestamp
 		self.selections = []
@@ -47,7 +115,7 @@ class Student:
 		self.selections = selections
 
 	def __str__(self):
-		return f"({self.first_name} {self.last_name}, id={self.id}, hr={self.hr}, 1st={self.first_period} {self.grade}th)"
+		return f"({self.first_name} {self.last_name}, id={self.id}, hr={names.getName(self.hr)}, 1st={names.getName(self.first_period)} {self.grade}th)"
 
 	def __repr__(self):
 		return str(self)
@@ -57,8 +125,8 @@ class Student:
 		retval += f"{self.timestamp}, "
 		retval += f"{self.first_name}, "
 		retval += f"{self.last_name}, "
-		retval += f"{self.hr}, "
-		retval += f"{self.first_period}, "
+		retval += f"{names.getName(self.hr)}, "
+		retval += f"{names.getName(self.first_period)}, "
 		retval += f"{self.id}, "
 		retval += f"{self.grade}, "
 
@@ -76,7 +144,7 @@ class Student:
 		self.selections_attending[period] = session
 
 	def writeSelectionLine(self, f):
-		f.write(f"{self.first_name}, {self.last_name}, {self.hr}, {self.first_period}, ")
+		f.write(f"{self.first_name}, {self.last_name}, {names.getName(self.hr)}, {names.getName(self.first_period)}, ")
 		f.write(f"{self.id}, {self.grade}")
 		for i in range(4):
 			f.write(f", {self.selections_attending[i].id}")
@@ -94,35 +162,8 @@ class Student:
 
 	def scoreSelections(self):
 		#self.debugDump()
-		perfect_period_score = len(self.selections)
-		perfect_score = NUM_PERIODS * perfect_period_score
-
-		cur_period_score = perfect_period_score
-
-		cur_score = 0
-		periods_evaluated = 0
-		want_list_position = 0
-		while( (want_list_position < len(self.selections)) and (periods_evaluated < NUM_PERIODS) ):
-			session_wanted = self.selections[want_list_position]
-			want_list_position += 1
-
-			#print(f"Debug: {self.first_name} {self.last_name} wants to attend sess id {session_wanted})")
-
-			if (self.isAttending(session_wanted)):
-				#print(f"  Debug: Attending")
-				periods_evaluated += 1
-				cur_score += cur_period_score
-			else:
-				#print(f"  Debug: not attending")
-				# Student get this choice, score goes down
-				cur_period_score -= 1
-
-			#print(f"  Debug: cur_period_score = {cur_period_score} and cur_score = {cur_score}")
-
-		if (cur_score == 0):
-			return 0
-		else:
-			return cur_score / perfect_score * 100.0
+		attending_ids = [ s.id for s in self.selections_attending if (s != None) ]
+		return scoreSelectionList(self.selections, attending_ids)
 			
 	def debugDump(self):
 		print(self)
@@ -133,29 +174,31 @@ class Student:
 		print(f"Attending: {attend_list}")
 
 
-	def write_student_schedule(self, f):
-		f.write(f"{self.last_name}, {self.first_name}  ID={self.id}      1st Period Teacher={self.first_period}\n")
-		f.write(f"SESS, SUBJECT, TEACHER / ROOM, PRESENTER")
+	def write_student_schedule(self, f, scores = None):
+		f.write(self.render_student_schedule(getPriorityLabels([ self ], scores)[0]))
 
-		if (DETAILED_REPORT_OUTPUT):
-			f.write(", PRIORITY\n")
-		else:
-			f.write("\n")
+	# Gets the schedule report of the student as one string, labels are the
+	# priorities of the sessions attended in each period
+	def render_student_schedule(self, labels):
+		parts = [ f"{self.last_name}, {self.first_name}  ID={self.id}      1st Period Teacher={names.getName(self.first_period)}\n", SCHEDULE_HEADER ]
 
 		for i in range(NUM_PERIODS):
 			cur_sel = self.selections_attending[i]
 			if (cur_sel == None):
-				f.write(f"{i + 1}, N/A, N/A, N/A\n")
+				parts.append(f"{i + 1}, N/A, N/A, N/A\n")
+			elif (DETAILED_REPORT_OUTPUT):
+				parts.append(f"{i + 1}, {cur_sel.subject}, {cur_sel.teacher}, {cur_sel.presenter}, {labels[i]}\n")
 			else:
-				f.write(f"{i + 1}, {self.selections_attending[i].subject}, {self.selections_attending[i].teacher}, {self.selections_attending[i].presenter}")
+				parts.append(f"{i + 1}, {cur_sel.subject}, {cur_sel.teacher}, {cur_sel.presenter}\n")
+		parts.append("\n\n")
+
+		return "".join(parts)
 
-				if (DETAILED_REPORT_OUTPUT):
-					f.write(f", {self.sessionPriorityLookup(cur_sel.id)}\n")
-				else:
-					f.write("\n")
-		f.write("\n\n")
+	# Uses the batch scores rank table when given instead of searching the selections
+	def sessionPriorityLookup(self, sid, scores = None):
+		if (scores != None):
+			return formatPriority(scores.getRank(self, sid))
 
-	def sessionPriorityLookup(self, sid):
 		selPri = 1
 		retPri = None
 		for curId in self.selections:
@@ -163,17 +206,7 @@ class Student:
 				retPri = selPri
 			selPri += 1
 		
-		if (retPri == None):
-			return "N/A"
-		
-		if (retPri == 1):
-			return "1st"
-		elif (retPri == 2):
-			return "2nd"
-		elif (retPri == 3):
-			return "3rd"
-		else:
-			return str(retPri) + "th"
+		return formatPriority(retPri)
 
 
 class Session:
@@ -217,31 +250,21 @@ class Session:
 	def get_student_list_period(self, period):
 		return self.attendees[period]
 	
-	def write_student_report(self, f):
-		f.write(f"SUBJECT, {self.subject}\n")
-		f.write(f"{self.teacher} by {self.presenter}\n")
-		f.write("PERIOD, STUDENT LAST, STUDENT FIRST")
+	def write_student_report(self, f, scores = None):
+		students = [ s for per in self.attendees for s in per ]
+		f.write(self.render_student_report(getSessionReportRows(students, scores)))
 
-		if (DETAILED_REPORT_OUTPUT):
-			f.write(", SELECTION_LEVEL")
-		
-		f.write(", FOLLOWING_SESSION, FOLLOWING_SESS_TEADCHER\n")
+	# Gets the attendance report of the session as one string, session_rows
+	# holds each student's report row per period (see getSessionReportRows)
+	def render_student_report(self, session_rows):
+		parts = [ f"SUBJECT, {self.subject}\n", f"{self.teacher} by {self.presenter}\n", SESSION_REPORT_HEADER ]
 
 		for i in range(len(self.attendees)):
-			for s in self.attendees[i]:
-				f.write(f"{i+1}, {s.last_name}, {s.first_name}")
+			parts.extend([ session_rows[id(s)][i] for s in self.attendees[i] ])
 
-				if (DETAILED_REPORT_OUTPUT):
-					f.write(f",{s.sessionPriorityLookup(self.id)}")
-	
-				if (i == 3):
-					# Last session
-					f.write(",N/A, N/A\n")
-				else:
-					next_sess = s.selections_attending[i+1]
-					f.write(f",{next_sess.subject}, {next_sess.teacher}\n")
+		parts.append("\n\n")
 
-		f.write("\n\n")
+		return "".join(parts)
 
 
 
@@ -257,78 +280,20 @@ def writeSessionFile(filename, sessionList, minNum, maxNum):
 
 	f.close()
 
-def parseLineFromFile(f, line_name):
-	single_line = f.readline().strip()
-	line_parts = single_line.split(",")
-	if (len(line_parts) < 2):
-		print(f"Line for {line_name} invalid: {single_line}")
-		return None
-
-	if (line_parts[0] != line_name):
-		print(f"Line for {line_name} invalid: {single_line}")
-		return None
-
-	value = int(line_parts[1])
-	return value
-
 def readSessionFile(filename):
-	f = open(filename, "r")
-
-	num_sessions = parseLineFromFile(f, "NUM_SESSIONS")
-	min_students = parseLineFromFile(f, "MIN_STUDENTS")
-	max_students = parseLineFromFile(f, "MAX_STUDENTS")
-
-	if ( (num_sessions == None) or (min_students == None) or (max_students == None) ):
-		return None
-
-	# discard the next line
-	cur_line = f.readline()
+	(header, records) = readSessionFileRecords(filename, USE_SNAPSHOTS)
 
 	sess_list = dict()
-	for i in range(num_sessions):
-		cur_line = f.readline().strip()
-		cur_line_parts = cur_line.split(",")
-		if (len(cur_line_parts) < 4):
-			print(f"Error reading line {i+5}: {cur_line}")
-			continue
-
-		cur_id = int(cur_line_parts[0])
-		cur_sess = Session(cur_id, cur_line_parts[1], cur_line_parts[2], cur_line_parts[3])
-
-		sess_list[cur_id] = cur_sess
-
-	return (num_sessions, min_students, max_students, sess_list)
-
-def readStudentFile(filename):
-	f = open(filename, "r")
+	for record in records:
+		sess_list[record.id] = Session(record.id, record.subject, record.teacher, record.presenter)
 
-	num_students = parseLineFromFile(f, "NUM_STUDENTS")
-
-	# discard the next line
-	cur_line = f.readline()
+	return (header.num_sessions, header.min_students, header.max_students, sess_list)
 
+def readStudentFile(filename, session_ids = None):
 	s_list = []
-	for i in range(num_students):
-		cur_line = f.readline().strip()
-		cur_line_parts = cur_line.split(",")
-		if (len(cur_line_parts) < 8):
-			print(f"Error reading line {i+5}: {cur_line}")
-			continue
-
-		timestamp = int(cur_line_parts[0])
-		first = cur_line_parts[1].strip()
-		last = cur_line_parts[2].strip()
-		hr_teach = cur_line_parts[3].strip()
-		first_teach = cur_line_parts[4].strip()
-		student_id = int(cur_line_parts[5])
-		grade = int(cur_line_parts[6])
-
-		selections = []
-		for sid in cur_line_parts[7:]:
-			selections.append(int(sid))
-
-		cur_student = Student(student_id, first, last, hr_teach, first_teach, grade, timestamp)
-		cur_student.setSelectionsWanted(selections)
+	for record in readStudentRecords(filename, session_ids, use_snapshot = USE_SNAPSHOTS):
+		cur_student = Student(record.id, record.first_name, record.last_name, record.homeroom, record.first_period, record.grade, record.timestamp)
+		cur_student.setSelectionsWanted(list(record.choices))
 
 		s_list.append(cur_student)
 
@@ -355,189 +320,322 @@ def writeStudentSelectionFile(filename, studentList):
 
 	f.close()
 
+# Gets the key a student is matched on between the student and schedule files
+def studentKey(student_id, first, last):
+	return (student_id, first, last)
+
+# Reads the schedule into the students and sessions, returns the rows that
+# matched no student, the rows that repeated a student and the students with
+# no row, all found in one pass over the file
 def readSelectionFile(filename, student_data, sess_dict):
-	f = open(filename, "r")
+	# Index of the students, built once so each row is found in constant time. A
+	# repeated id would leave one of the students out of the index, so it is
+	# refused the way csvinput refuses it in the student file
+	student_index = dict()
+	student_ids = set()
+	for s in student_data:
+		if (s.id in student_ids):
+			raise ValueError(f"duplicate student id {s.id} ({s.first_name} {s.last_name})")
+		student_ids.add(s.id)
+		student_index[studentKey(s.id, s.first_name, s.last_name)] = s
 
-	num_students = parseLineFromFile(f, "NUM_STUDENTS")
-
-	# discard the next line
-	cur_line = f.readline()
-
-	for i in range(num_students):
-		cur_line = f.readline().strip()
-		line_parts = cur_line.split(",")
-
-		if (len(line_parts) < 7):
-			print(f"Not enough columns {len(line_parts)} in line: {cur_line}")
-			return None
-
-		first_name = line_parts[0].strip()
-		last_name = line_parts[1].strip()
-		hr_teacher = line_parts[2].strip()
-		first_period = line_parts[3].strip()
-		student_id = int(line_parts[4])
-		grade = int(line_parts[5])
-
-		sel_num = 0
-		selections_id_list = []
-		selection_parts = line_parts[6:]
-		while(sel_num < 4):
-			#print(f"sel_num = {sel_num}, {selection_parts[sel_num * 2]}")
-			selections_id_list.append(int(selection_parts[sel_num * 2]))
-			sel_num += 1
-
-		# Find the student in the student list
-		student_obj = None
-		for s in student_data:
-			if ( (student_id == s.id) and (first_name == s.first_name) and (last_name == s.last_name) ):
-				student_obj = s
-				break
+	unknown_records = []
+	duplicate_records = []
+	seen_keys = set()
+
+	for record in iterSelectionRecords(filename, NUM_PERIODS, set(sess_dict.keys())):
+		key = studentKey(record.id, record.first_name, record.last_name)
+		student_obj = student_index.get(key)
 
 		if (student_obj == None):
-			print(f"Couldn't find a matching student in recoreds for {cur_line}")
-			print(f"First={first_name}, Last={last_name}, ID={student_id}")
-			return None
+			print(f"Couldn't find a matching student in recoreds for {record}")
+			print(f"First={record.first_name}, Last={record.last_name}, ID={record.id}")
+			unknown_records.append(record)
+			continue
+
+		if (key in seen_keys):
+			print(f"Student {record.first_name} {record.last_name} (ID={record.id}) is in the schedule more than once, keeping the first row")
+			duplicate_records.append(record)
+			continue
+		seen_keys.add(key)
 
 		# Add the session information to the student object and sesssion objects
-		for i in range(len(selections_id_list)):
-			cur_session_id = selections_id_list[i]
-			if (cur_session_id not in sess_dict):
-				print(f"Can't find a matching sesssion for period {i} for student {first_name} {last_name}")
-				return None
+		for i in range(len(record.session_ids)):
+			cur_session_id = record.session_ids[i]
 
-			#print(f"Debug: Adding {first_name} {last_name} to period {i} of session {sess_dict[cur_session_id]}")
+			#print(f"Debug: Adding {record.first_name} {record.last_name} to period {i} of session {sess_dict[cur_session_id]}")
 
 			student_obj.attendSession(i, sess_dict[cur_session_id])
 			sess_dict[cur_session_id].addStudent(student_obj, i)
 
-	f.close()
+	missing_students = [ s for (key, s) in student_index.items() if (key not in seen_keys) ]
+	for s in missing_students:
+		print(f"Student {s.first_name} {s.last_name} (ID={s.id}) is not in the schedule")
+
 	print(f"Done reading file {filename}")
 
-# Returns true if evaluation fails
-def evaluateSessions(sess_dict, min_students, max_students):
-	failed_evaluation = False
-	for id in sess_dict.keys():
-		s = sess_dict[id]
+	return (unknown_records, duplicate_records, missing_students)
 
-		# Make sure each session isn't too small or too large
-		if (s.smallest_session() < min_students):
-			print(f"One of the sessions on subject {s.subject} has too few students ({s.smallest_session()})")
-			failed_evaluation = True
-		if (s.largest_session() > max_students):
-			print(f"One of the sessions on subject {s.subject} has too many students ({s.largest_session()})")
-			failed_evaluation = True
+# Checks the schedule against every rule in one pass (verifier.py), returns
+# the violations found, an empty list means the schedule is valid
+def verifySchedule(studentList, sess_dict, min_students, max_students, special_sessions):
+	from verifier import Verifier, getAssignmentMatrix
 
-		# Make sure a student is signed up for more than 1 period
-		for verifying_period in range(NUM_PERIODS):
-			for other_period in range(NUM_PERIODS):
-				if (verifying_period == other_period):
-					# Can't check the period against itself
-					continue;
+	schedules = [ [ (sess.id if (sess != None) else None) for sess in s.selections_attending ] for s in studentList ]
+	verifier = Verifier(sess_dict.keys(), min_students, max_students, NUM_PERIODS, special_sessions)
 
-				vp = set(s.get_student_list_period(verifying_period))
-				op = set(s.get_student_list_period(other_period))
+	return verifier.verify(getAssignmentMatrix(schedules, NUM_PERIODS), [ s.grade for s in studentList ], [ s.id for s in studentList ])
 
-				if (len(vp.intersection(op)) > 0):
-					print(f"We have some students signed up for different periods of same session:")
-					print(f"  Period {verifying_period} has dupes of students from {other_period}")
-					print(f"  Students in both: {vp.intersection(op)}")
-					failed_evaluation = True
+# Result of evaluating a schedule in memory, violations are verifier.Violation
+# records and scores is a batchscoring.BatchScores
+class ScheduleEvaluation:
+	def __init__(self, violations, scores):
+		self.violations = violations
+		self.scores = scores
+		self.passed = (len(violations) == 0)
+		self.average_score = scores.getAverage()
 
-	return failed_evaluation
+	def gradeAverages(self):
+		return self.scores.getGradeAverages()
 
-def evaluateStudents(studentList):
-	# Make sure the students have NUM_PERIOD unique sessions they are signed up for
-	failed_evaluation = False	
-	for s in studentList:
-		unique_sess = set(s.selections_attending)
-		if (len(unique_sess) != NUM_PERIODS):
-			print(f"Student {s.first_name} {s.last_name} is only signed up for {len(unique_sess)} sessions!")
+# Evaluates a schedule handed over in memory by supersorter, nothing is written
+# or read back. students need id, grade, preferences (choices as submitted) and
+# assigned (the session id of each period), sessions maps ids to sessions whose
+# classes have min_limit and max_limit and special_sessions are the ids only
+# the special grade may attend, as the caller sorted with
+def evaluateSchedule(students, sessions, special_sessions):
+	from batchscoring import BatchScores
+
+	schedules = [ list(s.assigned) for s in students ]
+
+	violations = verifyAssignment(students, sessions, special_sessions, schedules)
+	scores = BatchScores([ s.preferences for s in students ], schedules, [ s.grade for s in students ], [ sess.id for sess in sessions.values() ], NUM_PERIODS, keys = students)
+
+	return ScheduleEvaluation(violations, scores)
+
+# Checks a schedule handed over in memory against every rule without scoring
+# it, takes the same arguments as evaluateSchedule and returns the violations.
+# schedules are the students' assigned lists when the caller already has them
+def verifyAssignment(students, sessions, special_sessions, schedules = None):
+	from verifier import Verifier, getAssignmentMatrix
+
+	session_list = list(sessions.values())
+	min_limits = [ [ c.min_limit for c in sess.classes[:NUM_PERIODS] ] for sess in session_list ]
+	max_limits = [ [ c.max_limit for c in sess.classes[:NUM_PERIODS] ] for sess in session_list ]
+
+	if (schedules == None):
+		schedules = [ list(s.assigned) for s in students ]
+
+	verifier = Verifier([ sess.id for sess in session_list ], min_limits, max_limits, NUM_PERIODS, special_sessions)
+
+	return verifier.verify(getAssignmentMatrix(schedules, NUM_PERIODS), [ s.grade for s in students ], [ s.id for s in students ])
+
+# Prints the session violations, returns true if evaluation fails
+def evaluateSessions(violations, sess_dict):
+	failed_evaluation = False
+	for v in violations:
+		if (v.kind == "below_min"):
+			print(f"One of the sessions on subject {sess_dict[v.session_id].subject} has too few students ({v.value}) in period {v.period + 1}")
 			failed_evaluation = True
-	
+		elif (v.kind == "above_max"):
+			print(f"One of the sessions on subject {sess_dict[v.session_id].subject} has too many students ({v.value}) in period {v.period + 1}")
+			failed_evaluation = True
+		elif (v.kind == "duplicate_session"):
+			print(f"We have some students signed up for different periods of same session:")
+			print(f"  Student {v.student_id} is in session {sess_dict[v.session_id].subject} again in period {v.period + 1}")
+			failed_evaluation = True
+
 	return failed_evaluation
 
-def gen_first_period_reports(students, sess_dict):
-	# Create a list of all the first period teachers
-	f = open("first_period_reports.csv", "w")
+# Prints the student violations, returns true if evaluation fails
+def evaluateStudents(violations, studentList):
+	failed_evaluation = False
+	students_by_id = None
+	for v in violations:
+		if (v.kind not in ("duplicate_session", "missing_period", "ineligible", "unknown_session")):
+			continue
+
+		if (students_by_id == None):
+			students_by_id = { s.id: s for s in studentList }
+		s = students_by_id[v.student_id]
+
+		if (v.kind == "duplicate_session"):
+			print(f"Student {s.first_name} {s.last_name} is signed up for session {v.session_id} more than once!")
+		elif (v.kind == "missing_period"):
+			print(f"Student {s.first_name} {s.last_name} has no session in period {v.period + 1}!")
+		elif (v.kind == "ineligible"):
+			print(f"Student {s.first_name} {s.last_name} in grade {s.grade} is signed up for special session {v.session_id}!")
+		else:
+			print(f"Student {s.first_name} {s.last_name} is signed up for unknown session {v.session_id}!")
+		failed_evaluation = True
 	
-	fp_teachers = set()
-	for s in students:
-		fp_teachers.add(s.first_period)
+	return failed_evaluation
 
-	fp_list = list(fp_teachers)
-	fp_list.sort()
+# Gets each student's priority labels per period, in the order of students,
+# read from the batch scores rank table when given instead of searching every
+# student's selections
+def getPriorityLabels(students, scores = None):
+	if (scores == None):
+		return [ [ (s.sessionPriorityLookup(sess.id) if (sess != None) else "N/A") for sess in s.selections_attending ] for s in students ]
+
+	ranks = scores.getAttendingRanks(students)
+	labels = [ formatPriority(r) for r in range(int(ranks.max(initial=0)) + 1) ]
+
+	return [ [ labels[r] for r in row ] for row in ranks.tolist() ]
+
+# Gets each student's session report row for every period, built once per
+# student so every session report only joins finished rows
+def getSessionReportRows(students, scores = None):
+	session_rows = dict()
+	for (s, labels) in zip(students, getPriorityLabels(students, scores)):
+		name = f"{s.last_name}, {s.first_name}"
+		rows = []
+		for i in range(NUM_PERIODS):
+			level = f",{labels[i]}" if (DETAILED_REPORT_OUTPUT) else ""
+			next_sess = s.selections_attending[i + 1] if (i + 1 < NUM_PERIODS) else None
+			if (next_sess == None):
+				# Last session
+				rows.append(f"{i+1}, {name}{level},N/A, N/A\n")
+			else:
+				rows.append(f"{i+1}, {name}{level},{next_sess.subject}, {next_sess.teacher}\n")
+		session_rows[id(s)] = rows
 
-	for fp in fp_list:
-		for s in students:
-			if (fp == s.first_period):
-				s.write_student_schedule(f)
+	return session_rows
 
-	f.close()
-				
-def gen_session_reports(sess_dict):
-	f = open("session_reports.csv", "w")
+# Gets a file name for a report shard that is safe on every file system and not used yet
+def getShardFilename(shard_dir, prefix, name, used):
+	safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(name)).strip("_") or "unnamed"
+	filename = os.path.join(shard_dir, f"{prefix}_{safe_name}.csv")
 
-	for id in sess_dict.keys():
-		sess = sess_dict[id]
+	count = 1
+	while (filename in used):
+		count += 1
+		filename = os.path.join(shard_dir, f"{prefix}_{safe_name}_{count}.csv")
+	used.add(filename)
 
-		sess.write_student_report(f)
+	return filename
 
+def writeReportFile(filename, parts):
+	f = open(filename, "w", buffering = REPORT_BUFFER_SIZE)
+	f.write("".join(parts))
 	f.close()
 
-		
-
-def main():
-	(num_sessions, min_students, max_students, sess_dict) = readSessionFile("real_data/sessions.csv")
+# Writes the report groups (name, rendered parts) to one file, or to one file
+# per group in shard_dir written by a pool of threads
+def writeReportGroups(groups, filename, shard_dir, prefix, workers):
+	if (shard_dir == None):
+		f = open(filename, "w", buffering = REPORT_BUFFER_SIZE)
+		for (name, parts) in groups:
+			f.write("".join(parts))
+		f.close()
+		return [ filename ]
+
+	os.makedirs(shard_dir, exist_ok = True)
+	used = set()
+	jobs = [ (getShardFilename(shard_dir, prefix, name, used), parts) for (name, parts) in groups ]
+
+	with ThreadPoolExecutor(max_workers = workers) as executor:
+		list(executor.map(lambda job: writeReportFile(*job), jobs))
+
+	return [ path for (path, parts) in jobs ]
+
+# Writes every student's schedule grouped by first period teacher, students are
+# grouped in one pass on the teacher's name code and keep their order within a
+# teacher, teachers are written in order of name
+def gen_first_period_reports(students, sess_dict, filename = "first_period_reports.csv", scores = None, shard_dir = None, workers = None):
+	fp_groups = [ [] for i in range(len(names)) ]
+	for (s, labels) in zip(students, getPriorityLabels(students, scores)):
+		fp_groups[s.first_period].append(s.render_student_schedule(labels))
+
+	groups = []
+	for fp in names.getSortedCodes(range(len(fp_groups))):
+		if (len(fp_groups[fp]) > 0):
+			groups.append((names.getName(fp), fp_groups[fp]))
+
+	return writeReportGroups(groups, filename, shard_dir, "first_period", workers)
+
+# Writes every session's attendance report, to one file or one file per session
+def gen_session_reports(sess_dict, filename = "session_reports.csv", scores = None, shard_dir = None, workers = None):
+	students = dict()
+	for sess in sess_dict.values():
+		for per in sess.attendees:
+			for s in per:
+				students[id(s)] = s
+
+	session_rows = getSessionReportRows(list(students.values()), scores)
+
+	groups = []
+	for sess_id in sess_dict.keys():
+		groups.append((sess_id, [ sess_dict[sess_id].render_student_report(session_rows) ]))
+
+	return writeReportGroups(groups, filename, shard_dir, "session", workers)
+
+# shard_reports writes one report file per first period teacher and per
+# session into report_dir/first_period_reports and report_dir/session_reports,
+# report_bound also solves and prints the upper bound on the average score and
+# the gap to it, which takes longer than the evaluation itself on big rosters
+def main(sessions_file = "real_data/sessions.csv", students_file = "real_data/students.csv", selection_file = "output/schedule.csv", report_dir = ".", shard_reports = False, report_workers = None, report_bound = False):
+	# The special sessions are the ones the schedule was sorted with, imported here as supersorter imports this module
+	from supersorter import SPECIAL_SESSIONS
+
+	(num_sessions, min_students, max_students, sess_dict) = readSessionFile(sessions_file)
 
 	#sess_list = list(sess_dict.values())
 
-	student_data = readStudentFile("real_data/students.csv")
-	selection_data = readSelectionFile("output/schedule.csv", student_data, sess_dict)
+	student_data = readStudentFile(students_file, set(sess_dict.keys()))
+	selection_data = readSelectionFile(selection_file, student_data, sess_dict)
 
 
 	print("Beginning evaulations")
 	eval_fail = False
-	sess_fail = evaluateSessions(sess_dict, min_students, max_students)
+	violations = verifySchedule(student_data, sess_dict, min_students, max_students, SPECIAL_SESSIONS)
+	sess_fail = evaluateSessions(violations, sess_dict)
 	if (sess_fail):
 		print("Session evaluation FAILED")
 		eval_fail = True
 	else:
 		print("Session evaluation passed")
 
-	studentList_fail = evaluateStudents(student_data)
+	studentList_fail = evaluateStudents(violations, student_data)
 	if (studentList_fail):
 		print("Student evaluation FAILED")
 		eval_fail = True
 	else:
 		print("Student evaluation passed")
 
-	sum_all_scores = 0
-	students_per_grade_level = dict()
-	sum_score_per_grade_level = dict()
+	# Every student is scored at once from a rank table (batchscoring.py)
+	from batchscoring import scoreStudents
+	scores = scoreStudents(student_data, sess_dict.keys(), NUM_PERIODS)
 
-	for s in student_data:
-		s_score = s.scoreSelections()
+	for (s, s_score) in zip(student_data, scores.scores.tolist()):
+		# scoreSelectionList gives an integer 0 when nothing matched
+		s_score = 0 if (s_score == 0) else s_score
 		print(f"Student {s.first_name} {s.last_name} in grade {s.grade} scored selections {s_score}")
-		sum_all_scores += s_score
-
-		cur_students_in_grade = students_per_grade_level.get(s.grade, 0)
-		cur_students_in_grade += 1
-		students_per_grade_level[s.grade] = cur_students_in_grade
-
-		cur_sum_for_grade = sum_score_per_grade_level.get(s.grade, 0)
-		cur_sum_for_grade += s_score
-		sum_score_per_grade_level[s.grade] = cur_sum_for_grade
 	
-	avg_score = sum_all_scores / len(student_data)
+	avg_score = scores.getAverage()
 	print(f"Average score all students: {avg_score}")
 
 	# Average scores per grade
-	for g in sum_score_per_grade_level.keys():
-		score = sum_score_per_grade_level[g] / students_per_grade_level[g]
+	for (g, score) in scores.getGradeAverages().items():
 		print(f"Average score {g}th grade: {score}")
 
-	gen_first_period_reports(student_data, sess_dict)
-	gen_session_reports(sess_dict)
+	# How far the schedule is from the best any schedule could do (bounds.py)
+	if (report_bound):
+		from bounds import getGap, getUpperBound
+		bound = getUpperBound([ s.selections for s in student_data ], [ s.grade for s in student_data ], list(sess_dict.keys()), [ NUM_PERIODS * max_students ] * len(sess_dict), NUM_PERIODS, SPECIAL_SESSIONS, lower = avg_score)
+		print(f"Upper bound all students: {bound.value}, gap: {getGap(avg_score, bound) * 100:.2f}%")
+
+	# How many classes were each choice, 0 is a class the student did not choose
+	histogram = scores.getRankHistogram().tolist()
+	print(f"Classes per choice rank: " + ", ".join(f"{formatPriority(rank)}={count}" for (rank, count) in enumerate(histogram)))
+
+	if (shard_reports):
+		gen_first_period_reports(student_data, sess_dict, None, scores, os.path.join(report_dir, "first_period_reports"), report_workers)
+		gen_session_reports(sess_dict, None, scores, os.path.join(report_dir, "session_reports"), report_workers)
+	else:
+		gen_first_period_reports(student_data, sess_dict, os.path.join(report_dir, "first_period_reports.csv"), scores)
+		gen_session_reports(sess_dict, os.path.join(report_dir, "session_reports.csv"), scores)
 
 if __name__ == "__main__":
+	USE_SNAPSHOTS = True
 	main()
@@ -0,0 +1,385 @@
+import heapq
+from collections import deque
+from typing import List
+
+from instrumentation import log
+
+# Min-cost flow assignment engine
+#
+# Alternative to the greedy supersorter.assignStudents. The assignment is
+# solved in two min-cost flow stages:
+#
+#   1. Which sessions: source -> student (cap = periods) -> session (cap 1,
+#      cost = choice rank) -> sink. The session -> sink edges carry the class
+#      minimums at no cost and the rest of the capacity at MIN_LIMIT_PENALTY,
+#      so minimums are filled before anybody gets an extra preferred seat.
+#      Students only have edges to the sessions they listed; seats outside
+#      their choices go student -> overflow (cost = number of choices) ->
+#      session, through one overflow node shared by every student who may
+#      attend the same sessions, so the graph grows with students x choices
+#      instead of students x sessions. The overflow seats are then handed out
+#      per student so nobody gets the same session twice.
+#   2. Which periods: one flow per period that gives every student one of their
+#      remaining sessions while keeping each session's remaining students
+#      evenly spread over the remaining periods (floor/ceil of the average).
+#      An even spread always exists for bipartite graphs, so a session that got
+#      between periods * min and periods * max students in stage 1 ends up
+#      with every class inside its limits. A student left without a session
+#      in a period gets None there, so later periods keep their place.
+#
+# The flow is solved in plain Python, so this engine is for school sized
+# inputs: about 7s for 10,000 students and 28s for 30,000 on one core, most of
+# it in the shortest path searches of stage 1. Past that the NumPy engine
+# (arraysorter.py) is the one to use.
+#
+# Only sessions and students are touched through their own methods, so this
+# module does not import supersorter.
+
+MIN_LIMIT_PENALTY = 1000 # Cost of a seat above a class minimum, must outweigh any choice rank
+
+# CUSTOM TYPES
+
+class FlowNetwork:
+
+    def __init__(self, num_nodes: int):
+        self.num_nodes = num_nodes
+        self.edges_from: List[List[int]] = [[] for _ in range(num_nodes)]
+        self.edge_to: List[int] = []
+        self.edge_cap: List[int] = []
+        self.edge_cost: List[int] = []
+
+    # Adds an edge and its residual edge, returns the index of the edge
+    def addEdge(self, start: int, end: int, cap: int, cost: int):
+
+        index = len(self.edge_to)
+
+        self.edges_from[start].append(index)
+        self.edge_to.append(end)
+        self.edge_cap.append(cap)
+        self.edge_cost.append(cost)
+
+        self.edges_from[end].append(index + 1)
+        self.edge_to.append(start)
+        self.edge_cap.append(0)
+        self.edge_cost.append(-cost)
+
+        return index
+
+    # Gets amount of flow sent through an edge
+    def getFlow(self, index: int):
+        return self.edge_cap[index + 1]
+
+    # Gets shortest reduced cost distances from source, costs must start non negative
+    def getDistances(self, source: int, potential: List[int]):
+
+        edges_from, edge_to, edge_cap, edge_cost = self.edges_from, self.edge_to, self.edge_cap, self.edge_cost
+        unreached = float("inf")
+
+        distance = [unreached] * self.num_nodes
+        distance[source] = 0
+        heap = [(0, source)]
+
+        while heap:
+            node_distance, node = heapq.heappop(heap)
+            if node_distance > distance[node]:
+                continue
+            node_potential = potential[node]
+            for edge in edges_from[node]:
+                if edge_cap[edge] > 0:
+                    end = edge_to[edge]
+                    new_distance = node_distance + edge_cost[edge] + node_potential - potential[end]
+                    if new_distance < distance[end]:
+                        distance[end] = new_distance
+                        heapq.heappush(heap, (new_distance, end))
+
+        return distance
+
+    # Gets the zero reduced cost edges that lead one BFS level closer to the sink, None if sink unreachable
+    def getAdmissibleEdges(self, source: int, sink: int, potential: List[int]):
+
+        edges_from, edge_to, edge_cap, edge_cost = self.edges_from, self.edge_to, self.edge_cap, self.edge_cost
+
+        level = [-1] * self.num_nodes
+        level[source] = 0
+        admissible: List[List[int]] = [[] for _ in range(self.num_nodes)]
+        queue = deque([source])
+
+        while queue:
+            node = queue.popleft()
+            if node == sink:
+                continue
+            next_level = level[node] + 1
+            if (level[sink] >= 0) and (next_level > level[sink]):
+                break
+            node_potential = potential[node]
+            node_admissible = admissible[node]
+            for edge in edges_from[node]:
+                if (edge_cap[edge] > 0):
+                    end = edge_to[edge]
+                    if (edge_cost[edge] + node_potential - potential[end] == 0):
+                        if level[end] < 0:
+                            level[end] = next_level
+                            queue.append(end)
+                        if level[end] == next_level:
+                            node_admissible.append(edge)
+
+        if level[sink] < 0:
+            return None
+
+        return admissible
+
+    # Sends a blocking flow over the admissible edges, returns amount sent
+    def sendBlockingFlow(self, source: int, sink: int, admissible: List[List[int]], limit: int):
+
+        edge_to, edge_cap = self.edge_to, self.edge_cap
+
+        next_edge = [0] * self.num_nodes
+        sent = 0
+
+        while sent < limit:
+
+            path: List[int] = []
+            node = source
+
+            # Walks forward along admissible edges, retreating from dead ends
+            while node != sink:
+                adjacent = admissible[node]
+                position = next_edge[node]
+                while (position < len(adjacent)) and (edge_cap[adjacent[position]] == 0):
+                    position += 1
+                next_edge[node] = position
+                if position < len(adjacent):
+                    edge = adjacent[position]
+                    path.append(edge)
+                    node = edge_to[edge]
+                else:
+                    if not path:
+                        return sent
+                    node = edge_to[path.pop() ^ 1]
+                    next_edge[node] += 1
+
+            amount = limit - sent
+            for edge in path:
+                amount = min(amount, edge_cap[edge])
+
+            for edge in path:
+                edge_cap[edge] -= amount
+                edge_cap[edge ^ 1] += amount
+
+            sent += amount
+
+        return sent
+
+    # Sends up to max_flow units at minimum cost, returns amount sent
+    def solve(self, source: int, sink: int, max_flow: int):
+
+        potential = [0] * self.num_nodes
+        sent = 0
+
+        while sent < max_flow:
+
+            distance = self.getDistances(source, potential)
+            if distance[sink] == float("inf"):
+                break
+
+            for node in range(self.num_nodes):
+                if distance[node] != float("inf"):
+                    potential[node] += distance[node]
+
+            # Uses every shortest path of the current length before searching again
+            while sent < max_flow:
+                admissible = self.getAdmissibleEdges(source, sink, potential)
+                if admissible is None:
+                    break
+                sent += self.sendBlockingFlow(source, sink, admissible, max_flow - sent)
+
+        return sent
+
+# FUNCTIONS
+
+# Gets the sessions each student may attend as an eligibility group, students with the same eligible sessions share a group
+def getEligibilityGroups(students: list, session_list: list):
+
+    # Eligibility only depends on grade, so it is asked once per grade
+    group_of_grade: dict = {}
+    groups: List[tuple] = []
+    group_index: dict = {}
+    student_groups: List[int] = []
+
+    for student in students:
+        if student.grade not in group_of_grade:
+            eligible = tuple(session_index for session_index, session in enumerate(session_list) if session.checkStudent(student))
+            group_of_grade[student.grade] = group_index.setdefault(eligible, len(groups))
+            if group_of_grade[student.grade] == len(groups):
+                groups.append(eligible)
+        student_groups.append(group_of_grade[student.grade])
+
+    return groups, student_groups
+
+# Hands out the overflow seats of an eligibility group, each student gets sessions they do not have yet,
+# taken from the sessions with the most overflow seats left. Returns the students who could not be given
+# all their seats that way
+def splitOverflow(chosen: List[List[int]], requests: List[tuple], supply: dict):
+
+    order = sorted(supply, key=supply.__getitem__, reverse=True)
+    short: List[int] = []
+
+    # Students needing the most seats go first while the choice of sessions is widest
+    for student_index, count in sorted(requests, key=lambda request: -request[1]):
+        taken = chosen[student_index]
+        picked = [session_id for session_id in order if (session_id not in taken) and (supply[session_id] > 0)][:count]
+        if len(picked) < count:
+            short.append(student_index)
+
+        for session_id in picked:
+            taken.append(session_id)
+            supply[session_id] -= 1
+        order.sort(key=supply.__getitem__, reverse=True)
+
+    return short
+
+# Builds the network and solves which sessions every student attends. Students in direct get an edge to
+# every session they may attend, the rest only to their choices and their group's overflow node
+def solveSessions(students: list, session_list: list, num_periods: int, groups: List[tuple], student_groups: List[int], direct: set):
+
+    num_choices = max((len(student.choices) for student in students), default=0)
+    group_sets = [set(eligible) for eligible in groups]
+
+    source, sink = 0, 1
+    student_offset = 2
+    session_offset = student_offset + len(students)
+    overflow_offset = session_offset + len(session_list)
+    network = FlowNetwork(overflow_offset + len(groups))
+
+    positions = {session.id: session_index for session_index, session in enumerate(session_list)}
+    student_edges: List[list] = []
+    overflow_edges: List[int] = []
+
+    for student_index, student in enumerate(students):
+        student_node = student_offset + student_index
+        network.addEdge(source, student_node, num_periods, 0)
+
+        rank = {session_id: choice_index for choice_index, session_id in enumerate(student.choices)}
+        eligible = group_sets[student_groups[student_index]]
+        if student_index in direct:
+            targets = [(session_index, rank.get(session_list[session_index].id, num_choices)) for session_index in groups[student_groups[student_index]]]
+        else:
+            targets = [(positions[session_id], choice_index) for session_id, choice_index in rank.items() if positions.get(session_id) in eligible]
+
+        student_edges.append([(session_list[session_index].id, network.addEdge(student_node, session_offset + session_index, 1, cost)) for session_index, cost in targets])
+        overflow_edges.append(None if (student_index in direct) else network.addEdge(student_node, overflow_offset + student_groups[student_index], num_periods, num_choices))
+
+    # Every seat outside a student's choices goes through their group's overflow node
+    group_edges: List[list] = []
+    for group, eligible in enumerate(groups):
+        group_edges.append([(session_list[session_index].id, network.addEdge(overflow_offset + group, session_offset + session_index, num_periods * len(students), 0)) for session_index in eligible])
+
+    for session_index, session in enumerate(session_list):
+        session_node = session_offset + session_index
+        min_total = sum(session_class.min_limit for session_class in session.classes[:num_periods])
+        max_total = sum(session_class.max_limit for session_class in session.classes[:num_periods])
+        network.addEdge(session_node, sink, min_total, 0)
+        network.addEdge(session_node, sink, max(max_total - min_total, 0), MIN_LIMIT_PENALTY)
+
+    placed = network.solve(source, sink, num_periods * len(students))
+
+    chosen = [[session_id for session_id, edge in edges if network.getFlow(edge) > 0] for edges in student_edges]
+    short: List[int] = []
+
+    for group, edges in enumerate(group_edges):
+        requests = [(student_index, network.getFlow(edge)) for student_index, edge in enumerate(overflow_edges) if (edge is not None) and (student_groups[student_index] == group) and (network.getFlow(edge) > 0)]
+        if requests:
+            short += splitOverflow(chosen, requests, {session_id: network.getFlow(edge) for session_id, edge in edges})
+
+    return chosen, placed, short
+
+# Picks which sessions every student attends
+def chooseSessions(students: list, sessions: dict, num_periods: int):
+
+    session_list = list(sessions.values())
+    groups, student_groups = getEligibilityGroups(students, session_list)
+
+    # A student whose overflow seats cannot all go to sessions they do not have yet is solved again
+    # with an edge to every session, which can never repeat one
+    direct: set = set()
+    while True:
+        chosen, placed, short = solveSessions(students, session_list, num_periods, groups, student_groups, direct)
+        if not short:
+            break
+        direct.update(short)
+
+    if placed < num_periods * len(students):
+        log.warning("Only %s of %s seats could be placed, sessions are too small", placed, num_periods * len(students))
+
+    return chosen
+
+# Spreads every student's sessions over the periods, the session id of each period or None when the student has none then
+def choosePeriods(chosen: List[List[int]], sessions: dict, num_periods: int):
+
+    session_ids = list(sessions.keys())
+    session_position = {session_id: index for index, session_id in enumerate(session_ids)}
+
+    remaining = [list(student_sessions) for student_sessions in chosen]
+    schedule: List[list] = [[None] * num_periods for _ in chosen]
+
+    for period in range(num_periods):
+
+        periods_left = num_periods - period
+
+        source, sink = 0, 1
+        student_offset = 2
+        session_offset = student_offset + len(remaining)
+        network = FlowNetwork(session_offset + len(session_ids))
+
+        remaining_count = [0] * len(session_ids)
+        for student_sessions in remaining:
+            for session_id in student_sessions:
+                remaining_count[session_position[session_id]] += 1
+
+        student_edges: List[list] = []
+        for student_index, student_sessions in enumerate(remaining):
+            student_node = student_offset + student_index
+            network.addEdge(source, student_node, 1, 0)
+            student_edges.append([
+                (session_id, network.addEdge(student_node, session_offset + session_position[session_id], 1, 0))
+                for session_id in student_sessions
+            ])
+
+        for session_index, session_id in enumerate(session_ids):
+            max_limit = sessions[session_id].classes[period].max_limit
+            low = min(remaining_count[session_index] // periods_left, max_limit)
+            high = min(-(-remaining_count[session_index] // periods_left), max_limit)
+            network.addEdge(session_offset + session_index, sink, low, 0)
+            network.addEdge(session_offset + session_index, sink, high - low, 1)
+
+        network.solve(source, sink, len(remaining))
+
+        for student_index, edges in enumerate(student_edges):
+            for session_id, edge in edges:
+                if network.getFlow(edge) > 0:
+                    schedule[student_index][period] = session_id
+                    remaining[student_index].remove(session_id)
+                    break
+
+    return schedule
+
+# Assigns students to classes with min-cost flow, same result structures as assignStudents
+def assignStudentsFlow(students: list, sessions: dict):
+
+    num_periods = min(len(session.classes) for session in sessions.values())
+
+    chosen = chooseSessions(students, sessions, num_periods)
+    schedule = choosePeriods(chosen, sessions, num_periods)
+
+    for student, student_schedule in zip(students, schedule):
+
+        # A student's schedule is one session per period in order, so it stops at the first period without a class
+        if None in student_schedule:
+            student_schedule = student_schedule[:student_schedule.index(None)]
+            log.warning("Student (Id: %s) could only be given %s of %s classes", student.id, len(student_schedule), num_periods)
+
+        for period, session_id in enumerate(student_schedule):
+            sessions[session_id].classes[period].addStudent(student=student)
+            student.assignSession(session_id=session_id, sessions=sessions)
+
+    return students
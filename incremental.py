@@ -0,0 +1,391 @@
+import argparse
+import json
+import sys
+import time
+from typing import List, NamedTuple
+
+import evaluation
+import supersorter
+from csvinput import StudentRecord, iterSelectionRecords, readStudentRecords
+from instrumentation import log, stats
+
+# Incremental re-solve for late registrations, drop-outs and choice edits
+#
+# Starts from a previous schedule.csv instead of sorting the whole roster
+# again. Students who did not change keep their schedule; the changes are
+# applied on top of it:
+#
+#   drop  the student's seats are given up
+#   edit  the student keeps the sessions still in their new choices and the
+#         other periods are placed again
+#   add   the student is placed from their choices
+#
+# Placing a student tries their choices first, any period that has room, then
+# the smallest classes. When every class a student can take in a period is
+# full, one student in that period is moved to a class with room to make a
+# seat. Classes that lost students and fell below their minimum are refilled
+# from the same period: changed students first, then students who listed the
+# session, then students who lose no choice by moving. Unchanged students are
+# loaded as they were and only the classes touched by a change are repaired,
+# so apart from reading the files the work grows with the number of changes.
+#
+# Changes come from the roster and an optional changes file. Students in the
+# students file but not in the schedule are adds and students in the schedule
+# but not in the students file are drops; with --previous-students, students
+# whose choices differ between the two files are edits. The changes file is
+# JSON:
+#
+#   {
+#     "add": [{"id": 1, "first_name": "A", "last_name": "B", "grade": 9, "choices": [4, 2, 7]}],
+#     "drop": [123420],
+#     "edit": [{"id": 153733, "choices": [2, 42, 1, 14, 5]}]
+#   }
+
+# CONSTANTS
+
+NUM_PERIODS = supersorter.NUM_ASSIGNED_CLASSES
+
+# CUSTOM TYPES
+
+class Changes(NamedTuple):
+    adds: List[StudentRecord]
+    drops: set # Student ids
+    edits: dict # Student id -> new choices
+
+class Repair:
+
+    def __init__(self, sessions: supersorter.SessionTable):
+
+        self.sessions = sessions
+        self.changed_students: list = [] # Added and edited students, moved first when making room or filling
+        self.changed: set = set() # id() of the changed students
+        self.wanted_by: dict = {} # Session id -> value -> students who listed it with that value, see addWanted
+        self.moved: set = set() # Ids of unchanged students moved to make room or fill a class
+        self.affected: set = set() # (session id, period) of classes that lost students
+        self.short_classes: list = []
+
+    # Gets how much a student wants a session, 0 when it is not one of their choices
+    def getValue(self, student: supersorter.Student, session_id: int):
+        if session_id in student.preferences:
+            return len(student.preferences) - student.preferences.index(session_id)
+        return 0
+
+    def hasRoom(self, session_id: int, period: int):
+        session_class = self.sessions[session_id].classes[period]
+        return len(session_class.students) < session_class.max_limit
+
+    # Moves a student already in the period to another class with room, freeing a seat in session_id
+    def makeRoom(self, session_id: int, period: int):
+
+        session_class = self.sessions[session_id].classes[period]
+
+        # Changed students go first, then whoever minds the move least
+        candidates = [student for student in session_class.students if len(student.assigned) == NUM_PERIODS]
+        candidates.sort(key=lambda student: (id(student) not in self.changed, self.getValue(student, session_id)))
+
+        for student in candidates:
+            targets = [session for session in self.sessions.size_index.iterSessions(period) if (session.id != session_id) and self.hasRoom(session.id, period)]
+            targets.sort(key=lambda session: -self.getValue(student, session.id))
+
+            for session in targets:
+                if supersorter.moveStudent(student, self.sessions, period, session):
+                    if id(student) not in self.changed:
+                        self.moved.add(student.id)
+                    return True
+
+        return False
+
+    # Places a student in every period not in fixed (period -> session id), fixed seats are already taken
+    def placeStudent(self, student: supersorter.Student, fixed: dict):
+
+        plan = dict(fixed)
+        self.changed_students.append(student)
+        self.changed.add(id(student))
+
+        # Choices first, each in the free period whose class is smallest
+        for session_id in student.preferences:
+            if (len(plan) == NUM_PERIODS):
+                break
+            if (session_id in plan.values()) or (not self.sessions[session_id].checkStudent(student)):
+                continue
+
+            periods = [period for period in range(NUM_PERIODS) if (period not in plan) and self.hasRoom(session_id, period)]
+            if periods:
+                plan[min(periods, key=lambda period: len(self.sessions[session_id].classes[period].students))] = session_id
+
+        # Then the smallest classes, making room when they are all full
+        for period in range(NUM_PERIODS):
+            if period in plan:
+                continue
+
+            eligible = [session for session in self.sessions.size_index.iterSessions(period) if (session.id not in plan.values()) and session.checkStudent(student)]
+            open_sessions = [session for session in eligible if self.hasRoom(session.id, period)]
+
+            if open_sessions:
+                plan[period] = open_sessions[0].id
+            else:
+                for session in eligible:
+                    if self.makeRoom(session.id, period):
+                        plan[period] = session.id
+                        break
+                else:
+                    raise IndexError(f"No session left for student (Id: {student.id}) in class #{period}")
+
+        # Assigned in period order, the way the engines leave it
+        for period in range(NUM_PERIODS):
+            student.assignSession(plan[period], self.sessions)
+            if period not in fixed:
+                self.sessions[plan[period]].classes[period].addStudent(student=student)
+
+    # Records the sessions a student listed, done as each student is loaded or added so the index is
+    # never built in one pass over the whole schedule
+    def addWanted(self, student: supersorter.Student):
+        for session_id in dict.fromkeys(student.preferences):
+            self.wanted_by.setdefault(session_id, {}).setdefault(self.getValue(student, session_id), []).append(student)
+
+    # Gets the student to move into a class below its minimum, None if nobody in the period can move
+    def getFillCandidate(self, session_id: int, period: int):
+
+        target = self.sessions[session_id]
+
+        def canMove(student: supersorter.Student):
+            current_id = student.assigned[period]
+            return (current_id != session_id) and self.sessions[current_id].classes[period].hasSurplus() and student.checkChosen(session_id) and target.checkStudent(student)
+
+        def getGain(student: supersorter.Student):
+            return self.getValue(student, session_id) - self.getValue(student, student.assigned[period])
+
+        # Changed students first
+        changed = [student for student in self.changed_students if canMove(student)]
+        if changed:
+            return max(changed, key=getGain)
+
+        # Then whoever listed the session and gains most. Nobody gains more than the session is worth to
+        # them, so the students who value it less are only asked while they could still do better
+        best, best_gain = None, None
+        wanted_by = self.wanted_by.get(session_id, {})
+        for value in sorted(wanted_by, reverse=True):
+            if (best is not None) and (value <= best_gain):
+                break
+            for student in wanted_by[value]:
+                if canMove(student) and ((best is None) or (getGain(student) > best_gain)):
+                    best, best_gain = student, getGain(student)
+
+        if (best is not None) and (best_gain >= 0):
+            return best
+
+        # Then a student from the largest classes who does not lose a choice by moving
+        fallback = best
+        for session in reversed(list(self.sessions.size_index.iterSessions(period))):
+            for student in session.classes[period].students if (session.id != session_id) and session.classes[period].hasSurplus() else ():
+                if canMove(student):
+                    if (self.getValue(student, session.id) == 0):
+                        return student
+                    fallback = fallback if (fallback is not None) else student
+
+        return fallback
+
+    # Refills the classes that lost students and fell below their minimum
+    def fillAffected(self):
+
+        for session_id, period in sorted(self.affected):
+            session_class = self.sessions[session_id].classes[period]
+
+            while (session_class.needsStudents() != 0):
+                student = self.getFillCandidate(session_id, period)
+                if (student is None) or (not supersorter.moveStudent(student, self.sessions, period, self.sessions[session_id])):
+                    break
+                if id(student) not in self.changed:
+                    self.moved.add(student.id)
+
+            if (session_class.needsStudents() != 0):
+                self.short_classes.append((session_id, period, session_class.needsStudents()))
+
+        for session_id, period, needed in self.short_classes:
+            log.warning("Session %s class #%s could not be filled, still needs %s students", session_id, period, needed)
+
+# FUNCTIONS
+
+# Checks the choices of an added or edited student
+def checkChoices(student_id: int, choices: list, session_ids: set):
+
+    if (len(choices) > supersorter.NUM_CHOICES):
+        raise ValueError(f"student {student_id} has {len(choices)} choices, at most {supersorter.NUM_CHOICES} allowed")
+    if len(set(choices)) != len(choices):
+        raise ValueError(f"student {student_id} chose the same session twice")
+    for choice in choices:
+        if choice not in session_ids:
+            raise ValueError(f"student {student_id} chose unknown session {choice}")
+
+    return tuple(choices)
+
+# Gets the changes in a changes file
+def readChangesFile(filename: str, session_ids: set):
+
+    with open(filename) as file:
+        entries = json.load(file)
+
+    adds = [
+        StudentRecord(
+            timestamp=int(entry.get("timestamp", 0)),
+            first_name=entry["first_name"],
+            last_name=entry["last_name"],
+            homeroom=entry.get("homeroom", "N/A"),
+            first_period=entry.get("first_period", "N/A"),
+            id=int(entry["id"]),
+            grade=int(entry["grade"]),
+            choices=checkChoices(entry["id"], entry["choices"], session_ids)
+        )
+        for entry in entries.get("add", [])
+    ]
+    drops = {int(student_id) for student_id in entries.get("drop", [])}
+    edits = {int(entry["id"]): checkChoices(entry["id"], entry["choices"], session_ids) for entry in entries.get("edit", [])}
+
+    return Changes(adds=adds, drops=drops, edits=edits)
+
+# Gets the changes between the roster a schedule was made for and the current one
+def getRosterChanges(roster: dict, scheduled_ids: set, previous_roster: dict = None):
+
+    adds = [record for student_id, record in roster.items() if student_id not in scheduled_ids]
+    drops = scheduled_ids - roster.keys()
+    edits = {}
+
+    if (previous_roster is not None):
+        edits = {student_id: record.choices for student_id, record in roster.items() if (student_id in previous_roster) and (student_id in scheduled_ids) and (previous_roster[student_id].choices != record.choices)}
+
+    return Changes(adds=adds, drops=drops, edits=edits)
+
+# Gets the roster and the changes file together as one set of changes
+def mergeChanges(roster_changes: Changes, file_changes: Changes, roster: dict):
+
+    for record in file_changes.adds:
+        if record.id in roster:
+            raise ValueError(f"student {record.id} is added but already on the roster")
+    for student_id in file_changes.drops:
+        if (student_id not in roster) and (student_id not in roster_changes.drops):
+            raise ValueError(f"student {student_id} is dropped but not on the roster")
+    for student_id in file_changes.edits:
+        if student_id not in roster:
+            raise ValueError(f"student {student_id} is not on the roster")
+
+    # A student added on the roster and edited in the file is added with the new choices
+    adds = [record._replace(choices=file_changes.edits.get(record.id, record.choices)) for record in roster_changes.adds if record.id not in file_changes.drops] + file_changes.adds
+    added_ids = {record.id for record in adds}
+    edits = {student_id: choices for student_id, choices in {**roster_changes.edits, **file_changes.edits}.items() if (student_id not in added_ids) and (student_id not in file_changes.drops)}
+
+    return Changes(adds=adds, drops=roster_changes.drops | file_changes.drops, edits=edits)
+
+# Gets the unchanged students back into the classes of a previous schedule, returns the students
+# in schedule order and the edited ones with the seats they keep
+def loadSchedule(previous: list, roster: dict, sessions: supersorter.SessionTable, changes: Changes, repair: Repair):
+
+    students: List[supersorter.Student] = []
+    edited: list = []
+    placements: list = []
+
+    for record in previous:
+        if record.id in changes.drops:
+            repair.affected.update((session_id, period) for period, session_id in enumerate(record.session_ids))
+            continue
+        if record.id not in roster:
+            continue
+
+        if record.id in changes.edits:
+            student = supersorter.getStudent(roster[record.id]._replace(choices=changes.edits[record.id]))
+            fixed = {period: session_id for period, session_id in enumerate(record.session_ids) if session_id in student.preferences}
+            repair.affected.update((session_id, period) for period, session_id in enumerate(record.session_ids) if period not in fixed)
+            placements.append((student, fixed, False)) # Placed in full by the repair
+            edited.append((student, fixed))
+        else:
+            student = supersorter.getStudent(roster[record.id])
+            placements.append((student, dict(enumerate(record.session_ids)), True))
+
+        students.append(student)
+        repair.addWanted(student)
+
+    supersorter.loadClasses(sessions, placements)
+
+    return students, edited
+
+# Applies changes to a previous schedule (csvinput.SelectionRecord rows), returns the students in schedule order (adds last) and a summary
+def resolveChanges(previous: list, roster: dict, sessions: supersorter.SessionTable, changes: Changes):
+
+    repair = Repair(sessions)
+
+    with stats.phase("load") as load_timer:
+        students, pending = loadSchedule(previous, roster, sessions, changes, repair)
+
+    with stats.phase("repair") as repair_timer:
+        added = [supersorter.getStudent(record) for record in changes.adds]
+        students += added
+        pending += [(student, {}) for student in added]
+        for student in added:
+            repair.addWanted(student)
+
+        # Older grades first, they are the only ones who can take special sessions
+        for student, fixed in sorted(pending, key=lambda entry: -entry[0].grade):
+            repair.placeStudent(student, fixed)
+
+        repair.fillAffected()
+
+    return students, {
+        "added": len(changes.adds),
+        "dropped": len(changes.drops),
+        "edited": len(changes.edits),
+        "affected_classes": len(repair.affected),
+        "moved_students": sorted(repair.moved),
+        "short_classes": repair.short_classes,
+        "timings": {"load": load_timer.seconds, "repair": repair_timer.seconds},
+    }
+
+# Gets command line arguments
+def parseArguments(argv: List[str] = None):
+
+    parser = argparse.ArgumentParser(description="Updates a previous schedule for added, dropped and edited students.")
+    parser.add_argument("--schedule", default="output/schedule.csv", help="previous student schedule file")
+    parser.add_argument("--students", default="real_data/students.csv", help="current student choices file")
+    parser.add_argument("--sessions", default="real_data/sessions.csv", help="sessions file")
+    parser.add_argument("--previous-students", default=None, help="student file the previous schedule was made from, finds choice edits")
+    parser.add_argument("--changes", default=None, help="JSON file of adds, drops and choice edits")
+    parser.add_argument("--output", default=None, help="student schedule file to write (default: --schedule)")
+    parser.add_argument("--updated-sessions", default="output/updated_sessions.csv", help="session enrolment file to write")
+    parser.add_argument("--evaluate", action="store_true", help="checks and scores the schedule in memory and prints the result")
+    parser.add_argument("--no-snapshots", action="store_true", help="parses the input files without reading or writing .snapshots/")
+
+    return parser.parse_args(argv)
+
+def main(argv: List[str] = None):
+
+    args = parseArguments(argv)
+    start = time.perf_counter()
+
+    use_snapshot = not args.no_snapshots
+
+    sessions = supersorter.getSessionData(filename=args.sessions, use_snapshot=use_snapshot)
+    session_ids = set(sessions.keys())
+
+    roster = {record.id: record for record in readStudentRecords(args.students, session_ids=session_ids, max_choices=supersorter.NUM_CHOICES, use_snapshot=use_snapshot)}
+    previous_roster = {record.id: record for record in readStudentRecords(args.previous_students, session_ids=session_ids, max_choices=supersorter.NUM_CHOICES, use_snapshot=use_snapshot)} if (args.previous_students is not None) else None
+
+    # Read once here, the schedule file may be the one written at the end
+    previous = list(iterSelectionRecords(args.schedule, NUM_PERIODS, session_ids))
+
+    changes = getRosterChanges(roster, {record.id for record in previous}, previous_roster)
+    if (args.changes is not None):
+        changes = mergeChanges(changes, readChangesFile(args.changes, session_ids), roster)
+
+    students, summary = resolveChanges(previous, roster, sessions, changes)
+
+    supersorter.writeStudentSelectionFile(filename=args.output if (args.output is not None) else args.schedule, students=students, sessions=sessions)
+    supersorter.writeSessionSelectionFile(filename=args.updated_sessions, sessions=sessions)
+
+    print(f"Added {summary['added']}, dropped {summary['dropped']}, edited {summary['edited']} students")
+    print(f"Repaired {summary['affected_classes']} classes, moved {len(summary['moved_students'])} other students in {summary['timings']['repair']:.3f}s ({time.perf_counter() - start:.3f}s in all)")
+
+    if (args.evaluate):
+        supersorter.printEvaluation(evaluation.evaluateSchedule(students, sessions, supersorter.SPECIAL_SESSIONS))
+
+    return 0 if not summary["short_classes"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
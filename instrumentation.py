@@ -0,0 +1,105 @@
+import contextlib
+import json
+import logging
+import time
+from collections import Counter
+
+# Run instrumentation: logging, phase timers and counters
+#
+# Logging goes through the standard logging module under the "supersorter"
+# logger. Messages are passed as a format string and arguments, so a
+# disabled level costs a call but no string building. Problems a run works
+# around, such as classes left short, are warnings, so callers running many
+# sorts silence or collect them through the logger instead of stdout. Phase timers and
+# counters are kept in one module-level Stats object, which a run exports as
+# a JSON summary at the end. The counters are:
+#
+#   choice_attempts        choices looked at by assignStudents
+#   full_class_rejections  choices and fallbacks skipped because the class was full
+#   small_class_fallbacks  times a student got a class from the smallest classes
+#   fill_moves             students moved by fillClasses
+#
+# Hot loops add to local totals and hand them over once, see count().
+
+log = logging.getLogger("supersorter")
+
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+LOG_FORMAT = "%(levelname)s %(name)s: %(message)s"
+
+# CUSTOM TYPES
+
+class PhaseTimer:
+
+    def __init__(self, stats: "Stats", name: str):
+        self.stats = stats
+        self.name = name
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+        self.stats.addTime(self.name, self.seconds)
+        log.info("%s took %.3fs", self.name, self.seconds)
+        return False
+
+class Stats:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counters = Counter()
+        self.timings: dict = {} # Seconds per phase, summed over repeats
+        self.calls = Counter() # Times each phase ran
+
+    # Times a block as a phase: with stats.phase("assign") as timer: ...
+    def phase(self, name: str):
+        return PhaseTimer(self, name)
+
+    def addTime(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        self.calls[name] += 1
+
+    def count(self, name: str, amount: int = 1):
+        if amount:
+            self.counters[name] += amount
+
+    def getSummary(self):
+        return {
+            "timings": self.timings,
+            "phase_calls": dict(self.calls),
+            "counters": dict(self.counters),
+        }
+
+    # Writes the summary as JSON
+    def writeSummary(self, filename: str):
+        with open(filename, "w") as file:
+            json.dump(self.getSummary(), file, indent=2)
+
+stats = Stats()
+
+# FUNCTIONS
+
+# Sets the level messages are shown from, messages go to stderr
+def configureLogging(level: str = "WARNING"):
+    logging.basicConfig(format=LOG_FORMAT)
+    log.setLevel(level)
+
+# Sends log messages to a file instead of stderr while the block runs: with logToFile("run.log"): ...
+@contextlib.contextmanager
+def logToFile(filename: str):
+
+    handler = logging.FileHandler(filename, mode="w")
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    log.addHandler(handler)
+    propagate, log.propagate = log.propagate, False
+
+    try:
+        yield handler
+    finally:
+        log.propagate = propagate
+        log.removeHandler(handler)
+        handler.close()
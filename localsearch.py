@@ -0,0 +1,261 @@
+import random
+import time
+from typing import List
+
+from evaluation import scoreFromTotals
+
+# Local search improvement pass
+#
+# Runs after any assignment engine and only accepts moves that raise the total
+# evaluation score while keeping every class inside its limits, special
+# session eligibility and the no-repeat rule. Moves tried for a student:
+#
+#   move         swap one of their sessions for a wanted one that has room
+#   swap         trade sessions with a student in a wanted class
+#   period move  shift one session to another period to make room for a
+#                wanted one
+#
+# A student's evaluation score only depends on the sum of L - j over the
+# preferences they attend (L preferences, j the 0 based position) and how many
+# they attend (evaluation.scoreFromTotals), so every move is scored in O(1)
+# from a per-student table of L - j and the running sum and hit count. Moves go
+# through Class.addStudent / removeStudent and Student.replaceAssigned, so the
+# size index and shortfall counts of a supersorter.SessionTable stay current.
+
+PROGRESS_INTERVAL = 64 # Iterations between on_progress calls, the clock is checked every iteration
+SWAP_CANDIDATES = 32 # Students of a wanted class a swap is tried with, sampled when the class is bigger
+
+# CUSTOM TYPES
+
+class ScoreTable:
+
+    def __init__(self, students: list, num_periods: int):
+
+        self.num_periods = num_periods
+
+        # Value of each wanted session, first listing wins like scoreSelectionList
+        self.values: List[dict] = []
+        self.value_sums: List[int] = []
+        self.hits: List[int] = []
+        self.perfect_scores: List[int] = []
+
+        for student in students:
+            values: dict = {}
+            for position, session_id in enumerate(student.preferences):
+                values.setdefault(session_id, len(student.preferences) - position)
+            self.values.append(values)
+
+            attended = [values.get(session_id, 0) for session_id in student.assigned]
+            self.value_sums.append(sum(attended))
+            self.hits.append(sum(1 for value in attended if value > 0))
+            self.perfect_scores.append(max(num_periods * len(student.preferences), 1))
+
+        self.total = self.getTotal() # Kept up to date by apply
+
+    # Gets a student's score from their running totals
+    def getScore(self, student_index: int, value_sum: int, hits: int):
+        return scoreFromTotals(value_sum, hits, self.perfect_scores[student_index])
+
+    # Gets the change in a student's score from dropping one session for another
+    def getDelta(self, student_index: int, old_session_id: int, new_session_id: int):
+
+        values = self.values[student_index]
+        old_value, new_value = values.get(old_session_id, 0), values.get(new_session_id, 0)
+
+        value_sum, hits = self.value_sums[student_index], self.hits[student_index]
+        new_hits = hits - (old_value > 0) + (new_value > 0)
+
+        return self.getScore(student_index, value_sum - old_value + new_value, new_hits) - self.getScore(student_index, value_sum, hits)
+
+    # Records that a student dropped one session for another
+    def apply(self, student_index: int, old_session_id: int, new_session_id: int):
+
+        values = self.values[student_index]
+        old_value, new_value = values.get(old_session_id, 0), values.get(new_session_id, 0)
+
+        self.total += self.getDelta(student_index, old_session_id, new_session_id)
+        self.value_sums[student_index] += new_value - old_value
+        self.hits[student_index] += (new_value > 0) - (old_value > 0)
+
+    # Gets the total score of every student
+    def getTotal(self):
+        return sum(self.getScore(index, self.value_sums[index], self.hits[index]) for index in range(len(self.values)))
+
+class LocalSearch:
+
+    def __init__(self, students: list, sessions: dict, seed: int = None):
+
+        self.students = students
+        self.sessions = sessions
+        self.num_periods = min(len(session.classes) for session in sessions.values())
+        self.scores = ScoreTable(students, self.num_periods)
+        self.student_index = {id(student): index for index, student in enumerate(students)}
+        self.rng = random.Random(seed if (seed is not None) else 0) # Unseeded runs still sweep in a fixed order, so a schedule can be rebuilt
+        self.moves = {"move": 0, "swap": 0, "period_move": 0}
+
+    def getClass(self, session_id: int, period: int):
+        return self.sessions[session_id].classes[period]
+
+    def hasRoom(self, session_id: int, period: int):
+        session_class = self.getClass(session_id, period)
+        return len(session_class.students) < session_class.max_limit
+
+    def hasSurplus(self, session_id: int, period: int):
+        session_class = self.getClass(session_id, period)
+        return len(session_class.students) > session_class.min_limit
+
+    # Checks whether a student may take a session they do not have yet
+    def canTake(self, student, session_id: int):
+        return student.checkChosen(session_id) and self.sessions[session_id].checkStudent(student)
+
+    # Puts a student in a different session for one period
+    def reassign(self, student, period: int, new_session_id: int):
+
+        old_session_id = student.assigned[period]
+
+        self.getClass(old_session_id, period).removeStudent(student=student)
+        student.replaceAssigned(period, self.sessions[new_session_id])
+        self.getClass(new_session_id, period).addStudent(student=student)
+        self.scores.apply(self.student_index[id(student)], old_session_id, new_session_id)
+
+    # Moves a student into a wanted session with room in the same period
+    def tryMove(self, student, period: int, session_id: int):
+
+        old_session_id = student.assigned[period]
+
+        if not (self.hasRoom(session_id, period) and self.hasSurplus(old_session_id, period)):
+            return False
+        if self.scores.getDelta(self.student_index[id(student)], old_session_id, session_id) <= 0:
+            return False
+
+        self.reassign(student, period, session_id)
+        self.moves["move"] += 1
+
+        return True
+
+    # Trades sessions with a student in the wanted class, big classes are sampled so one try costs
+    # at most SWAP_CANDIDATES checks
+    def trySwap(self, student, period: int, session_id: int):
+
+        student_index = self.student_index[id(student)]
+        old_session_id = student.assigned[period]
+        gain = self.scores.getDelta(student_index, old_session_id, session_id)
+
+        if gain <= 0:
+            return False
+
+        others = self.getClass(session_id, period).students
+        if len(others) > SWAP_CANDIDATES:
+            others = self.rng.sample(others, SWAP_CANDIDATES)
+
+        for other in others:
+            if not self.canTake(other, old_session_id):
+                continue
+            if gain + self.scores.getDelta(self.student_index[id(other)], session_id, old_session_id) <= 0:
+                continue
+
+            self.reassign(other, period, old_session_id)
+            self.reassign(student, period, session_id)
+            self.moves["swap"] += 1
+
+            return True
+
+        return False
+
+    # Takes a wanted session in period p by shifting the session held there to period q,
+    # where it replaces the session given up
+    def tryPeriodMove(self, student, period: int, session_id: int):
+
+        if not self.hasRoom(session_id, period):
+            return False
+
+        student_index = self.student_index[id(student)]
+        kept_session_id = student.assigned[period]
+
+        for other_period in range(self.num_periods):
+            if other_period == period:
+                continue
+
+            dropped_session_id = student.assigned[other_period]
+            if self.scores.getDelta(student_index, dropped_session_id, session_id) <= 0:
+                continue
+            if not (self.hasSurplus(kept_session_id, period) and self.hasSurplus(dropped_session_id, other_period) and self.hasRoom(kept_session_id, other_period)):
+                continue
+
+            self.getClass(kept_session_id, period).removeStudent(student=student)
+            self.getClass(dropped_session_id, other_period).removeStudent(student=student)
+            student.replaceAssigned(period, self.sessions[session_id])
+            student.replaceAssigned(other_period, self.sessions[kept_session_id])
+            self.getClass(session_id, period).addStudent(student=student)
+            self.getClass(kept_session_id, other_period).addStudent(student=student)
+            self.scores.apply(student_index, dropped_session_id, session_id)
+            self.moves["period_move"] += 1
+
+            return True
+
+        return False
+
+    # Tries to give a student one of their unattended preferences
+    def improveStudent(self, student):
+
+        if len(student.assigned) < self.num_periods:
+            return False
+
+        for session_id in student.preferences:
+            if not self.canTake(student, session_id):
+                continue
+            for period in range(self.num_periods):
+                if self.tryMove(student, period, session_id) or self.trySwap(student, period, session_id) or self.tryPeriodMove(student, period, session_id):
+                    return True
+
+        return False
+
+# FUNCTIONS
+
+# Improves a finished schedule in place until no student improves, the budget runs out or the
+# average score reaches target_score. time_limit includes building the score table. on_progress is
+# called with the average score every PROGRESS_INTERVAL iterations and stops the search by returning True
+def improveSchedule(students: list, sessions: dict, time_limit: float = None, max_iterations: int = None, seed: int = None, target_score: float = None, on_progress=None):
+
+    start = time.perf_counter()
+    search = LocalSearch(students, sessions, seed=seed)
+    score_before = search.scores.getTotal()
+
+    iterations = 0
+    order = list(range(len(students)))
+    improved, out_of_budget = True, False
+    target_total = target_score * len(students) if (target_score is not None) else None
+
+    # Sweeps over every student in random order until a sweep changes nothing
+    while improved and not out_of_budget:
+        improved = False
+        search.rng.shuffle(order)
+
+        for student_index in order:
+
+            if (max_iterations is not None) and (iterations >= max_iterations):
+                out_of_budget = True
+            elif (time_limit is not None) and (time.perf_counter() - start >= time_limit):
+                out_of_budget = True
+            elif (target_total is not None) and (search.scores.total >= target_total):
+                out_of_budget = True
+            elif (on_progress is not None) and (iterations % PROGRESS_INTERVAL == 0) and on_progress(search.scores.total / len(students)):
+                out_of_budget = True
+            if out_of_budget:
+                break
+
+            iterations += 1
+            if search.improveStudent(students[student_index]):
+                improved = True
+
+    num_students = max(len(students), 1)
+
+    return {
+        "iterations": iterations,
+        "moves": search.moves,
+        "score_before": score_before / num_students,
+        "score_after": search.scores.getTotal() / num_students,
+        "reached_target": (target_total is not None) and (search.scores.total >= target_total),
+        "converged": not out_of_budget, # A whole sweep found nothing to improve
+        "seconds": time.perf_counter() - start,
+    }
@@ -1,19 +1,46 @@
 #!/usr/bin/env python3
 
+# Generates synthetic sessions.csv / students.csv files in the formats that
+# supersorter.getSessionData and supersorter.getStudentData read.
+#
+# Everything comes from one seeded random generator, so the same arguments
+# always give the same files. Students are written as they are generated, so
+# memory stays flat no matter how many students are asked for. The sorter
+# knows special sessions only by id, so the generator refuses session counts
+# whose special sessions would not be those ids.
+
+import argparse
+import bisect
+import itertools
 import random
-import time
 
-def read_file_into_list(filename):
-	f = open(filename, "r")
-	full_file = f.read()
-	f.close()
-
-	ret_list = []
-	for each_line in full_file.split("\n"):
-		if (len(each_line.strip()) >= 1):
-			ret_list.append(each_line.strip())
-	
-	return ret_list
+STUDENT_FIRST_NAMES = [
+	"AVA", "LIAM", "NOAH", "EMMA", "OLIVIA", "ELIJAH", "MIA", "LUCAS", "AMELIA", "MASON",
+	"HARPER", "ETHAN", "EVELYN", "LOGAN", "ABIGAIL", "JAMES", "ELLA", "AIDEN", "SCARLETT", "JACKSON",
+	"GRACE", "LEO", "CHLOE", "MATEO", "ZOE", "HENRY", "NORA", "OWEN", "LILY", "WYATT",
+]
+STUDENT_LAST_NAMES = [
+	"Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+	"Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+	"Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+]
+TEACHER_LAST_NAMES = [
+	"BLACKWOOD", "RAVENSCROFT", "GLEZEN", "BRAMLETT", "PIETRZAK", "RICHARDSON", "DASILVA", "GREGOR", "SNIVELY", "NERY",
+	"RAHEB", "RAMOS", "CALDERON", "WHITFIELD", "OKAFOR", "NAKAMURA", "LINDQVIST", "MORENO", "HOLLOWAY", "PRICE",
+]
+CAREERS = [
+	"ARCHITECTURE", "ACCOUNTING", "NURSING", "SOFTWARE ENGINEERING", "LAW ENFORCEMENT", "MARKETING",
+	"CULINARY ARTS", "AEROSPACE", "VETERINARY MEDICINE", "JOURNALISM", "CIVIL ENGINEERING", "FILM PRODUCTION",
+	"PHARMACY", "FINANCE", "EDUCATION", "GRAPHIC DESIGN", "ELECTRICAL TRADES", "PHYSICAL THERAPY",
+]
+
+FIRST_ID = 100000
+ID_PRIME = 1000003 # Prime that does not divide any id range, so stepping by it never repeats an id
+START_TIMESTAMP = 1728000000
+REGISTRATION_SECONDS = 60 * 60 * 24 * 14
+HIGH_SCHOOL_GRADE = 9
+SORTER_SPECIAL_SESSIONS = [44, 45, 46] # supersorter.SPECIAL_SESSIONS, the sorter only knows special sessions by id
+WRITE_BATCH = 10000 # Rows joined per write call
 
 class Teacher:
 	def __init__(self, first, last, location):
@@ -22,47 +49,11 @@ class Teacher:
 		self.location = location
 
 	def shortName(self):
-		#print(f"Short name for {self.first_name} {self.last_name}")
 		fi = self.first_name[0]
-		return f"{self.last_name} {fi}"
-	
-	def __str__(self):
-		return f"({self.shortName()}, room={self.location})"
-
-class Student:
-	def __init__(self, first, last, teacherHr, teacherFirst, grade, timestamp):
-		self.first_name = first
-		self.last_name = last
-		self.id = random.randint(100000, 200000)
-		self.hr = teacherHr
-		self.first_period = teacherFirst
-		self.grade = grade
-		self.timestamp = timestamp
-		self.selections = set()
-
-	def setSelections(self, selections):
-		self.selections = selections
+		return f"{fi} {self.last_name}"
 
 	def __str__(self):
-		return f"({self.first_name} {self.last_name}, id={self.id}, hr={self.hr}, 1st={self.first_period} {self.grade}th)"
-
-	def csvData(self):
-		retval = ""
-		retval += f"{self.timestamp}, "
-		retval += f"{self.first_name}, "
-		retval += f"{self.last_name}, "
-		retval += f"{self.hr.shortName()}, "
-		retval += f"{self.first_period.shortName()}, "
-		retval += f"{self.id}, "
-		retval += f"{self.grade}, "
-
-		for sel in self.selections:
-			retval += f"{sel}, "
-
-		retval = retval [:-2]
-		return retval
-
-
+		return f"({self.shortName()}, room={self.location})"
 
 class Session:
 	def __init__(self, id, subject, teacher, presenter):
@@ -72,13 +63,74 @@ class Session:
 		self.presenter = presenter
 
 	def __str__(self):
-		print(f"For Session {self.id}, teacher={self.teacher}")
-		tsn = self.teacher.shortName()
-		return f"({self.id}, {self.subject}, {tsn}, {self.presenter})"
+		return f"({self.id}, {self.subject}, {self.teacher}, {self.presenter})"
 
 	def csvData(self):
-		return f"{self.id}, {self.subject}, {self.teacher.shortName()}, {self.presenter}"
-
+		return f"{self.id}, [{self.subject}], {self.teacher}, {self.presenter}"
+
+# Picks distinct sessions by popularity weight, without replacement
+class ChoicePicker:
+	def __init__(self, session_ids, weights, rng):
+		self.session_ids = session_ids
+		self.weights = list(weights)
+		self.cum_weights = list(itertools.accumulate(self.weights))
+		self.rng = rng
+
+	def pick(self, count):
+		count = min(count, len(self.session_ids))
+		total = self.cum_weights[-1]
+		chosen = []
+		picked = [] # Positions chosen so far, kept sorted
+		for _ in range(count):
+			# Draws over the weight left and steps over the chosen sessions' shares
+			x = self.rng.random() * total
+			for position in picked:
+				if (self.cum_weights[position] - self.weights[position] <= x):
+					x += self.weights[position]
+			position = min(bisect.bisect(self.cum_weights, x), len(self.session_ids) - 1)
+			while (position in picked): # Rounding at the very end of the range
+				position -= 1
+			bisect.insort(picked, position)
+			total -= self.weights[position]
+			chosen.append(self.session_ids[position])
+		return chosen
+
+def makeTeachers(num_teachers, rng):
+	teacherList = []
+	for i in range(num_teachers):
+		first = rng.choice(STUDENT_FIRST_NAMES)
+		last = TEACHER_LAST_NAMES[i % len(TEACHER_LAST_NAMES)]
+		if (i >= len(TEACHER_LAST_NAMES)):
+			last += f" {i // len(TEACHER_LAST_NAMES) + 1}"
+		teacherList.append(Teacher(first, last, i + 100))
+	return teacherList
+
+def makeSessions(num_sessions):
+	sessionList = []
+	for i in range(num_sessions):
+		career = CAREERS[i % len(CAREERS)]
+		if (i >= len(CAREERS)):
+			career += f" {i // len(CAREERS) + 1}"
+		sessionList.append(Session(i + 1, career, f"TeacherSession{i + 1}", f"Presenter{i + 1}"))
+	return sessionList
+
+# Gets popularity weights, rank r gets 1 / r^skew and ranks are shuffled over the sessions
+def makePopularity(num_sessions, skew, rng):
+	weights = [1.0 / ((rank + 1) ** skew) for rank in range(num_sessions)]
+	rng.shuffle(weights)
+	return weights
+
+# Gets the smallest power of ten range above 10 times the number of students
+def getIdRange(num_students):
+	id_range = 900000
+	while (id_range < num_students * 10):
+		id_range *= 10
+	return id_range
+
+# Gets the default class limits so every period can seat everybody
+def getDefaultLimits(num_students, num_sessions):
+	average = num_students / num_sessions
+	return (max(1, int(average * 0.65)), max(2, int(average * 1.6) + 1))
 
 def writeSessionFile(filename, sessionList, minNum, maxNum):
 	f = open(filename, "w")
@@ -92,79 +144,112 @@ def writeSessionFile(filename, sessionList, minNum, maxNum):
 
 	f.close()
 
-def writeStudentFile(filename, studentList):
+# Gets the ids of the special sessions, the last num_special ones. They have to be the ids the sorter
+# treats as special, otherwise the files would not mean what the sorter reads them as
+def getSpecialIds(num_sessions, num_special = None):
+	sorter_ids = set(i for i in SORTER_SPECIAL_SESSIONS if (i <= num_sessions))
+	if (num_special == None):
+		num_special = len(sorter_ids)
+
+	special_ids = set(range(num_sessions - num_special + 1, num_sessions + 1))
+	if (special_ids != sorter_ids):
+		raise ValueError(f"the last {num_special} of {num_sessions} sessions are not the ones supersorter treats as special ({', '.join(str(i) for i in sorted(sorter_ids)) or 'none'}), use 46 sessions with 3 special or fewer than 44 sessions with none")
+
+	return special_ids
+
+# Gets student rows one at a time
+def iterStudentRows(num_students, sessionList, num_choices, skew, grade_weights, special_ids, rng):
+	teacherList = makeTeachers(max(1, len(sessionList) // 2), rng)
+	teacher_names = [t.shortName() for t in teacherList]
+
+	popularity = makePopularity(len(sessionList), skew, rng)
+	all_ids = [s.id for s in sessionList]
+	regular_ids = [s.id for s in sessionList if (s.id not in special_ids)]
+	high_school_picker = ChoicePicker(all_ids, popularity, rng)
+	middle_school_picker = ChoicePicker(regular_ids, [popularity[i] for i, s in enumerate(sessionList) if (s.id not in special_ids)], rng)
+
+	grades = sorted(grade_weights)
+	grade_cum_weights = list(itertools.accumulate(grade_weights[g] for g in grades))
+
+	id_range = getIdRange(num_students)
+	id_offset = rng.randrange(id_range)
+
+	for i in range(num_students):
+		first = rng.choice(STUDENT_FIRST_NAMES)
+		last = rng.choice(STUDENT_LAST_NAMES)
+		homeroom = rng.choice(teacher_names)
+		first_period = rng.choice(teacher_names)
+		grade = grades[bisect.bisect(grade_cum_weights, rng.random() * grade_cum_weights[-1])]
+		timestamp = START_TIMESTAMP + rng.randrange(REGISTRATION_SECONDS)
+		student_id = FIRST_ID + (id_offset + i * ID_PRIME) % id_range
+
+		picker = high_school_picker if (grade >= HIGH_SCHOOL_GRADE) else middle_school_picker
+		selections = ", ".join(str(sid) for sid in picker.pick(num_choices))
+
+		yield f"{timestamp}, {first}, {last}, {homeroom}, {first_period}, {student_id}, {grade}, {selections}\n"
+
+def writeStudentFile(filename, num_students, rows, num_choices):
 	f = open(filename, "w")
-	f.write(f"NUM_STUDENTS, {len(studentList)}\n")
+	f.write(f"NUM_STUDENTS, {num_students}\n")
 	f.write("TIMESTAMP, FIRST_NAME, LAST_NAME, HOMEROOM, FIRST_PERIOD, ID, GRADE, ")
-	f.write("CHOICE_1, CHOICE_2, CHOICE_3, CHOICE_4, CHOICE_5, CHOICE_6, CHOICE_7\n")
-	for s in studentList:
-		f.write(f"{s.csvData()}\n")
+	f.write(", ".join(f"CHOICE_{i + 1}" for i in range(num_choices)) + "\n")
+
+	while True:
+		batch = list(itertools.islice(rows, WRITE_BATCH))
+		if (len(batch) == 0):
+			break
+		f.write("".join(batch))
+
 	f.close()
 
+# Writes a sessions file and a students file, returns the class limits used
+def generate(students_file, sessions_file, num_students, num_sessions = 46, num_special = None, num_choices = 7, skew = 1.0, grade_weights = None, min_students = None, max_students = None, seed = 0):
+	special_ids = getSpecialIds(num_sessions, num_special)
+	rng = random.Random(seed)
 
-def main():
-	student_first_names = read_file_into_list("student_first_names.txt")
-	student_last_names = read_file_into_list("student_last_names.txt")
-	teacher_last_names = read_file_into_list("teacher_names.txt")
-	careers = read_file_into_list("subjects.txt")
+	if (grade_weights == None):
+		grade_weights = {grade: 1 for grade in range(7, 13)}
 
-	#print(student_first_names)
+	default_min, default_max = getDefaultLimits(num_students, num_sessions)
+	min_students = default_min if (min_students == None) else min_students
+	max_students = default_max if (max_students == None) else max_students
 
-	teacherList = []
+	sessionList = makeSessions(num_sessions)
 
-	for i in range(len(careers)):
-		first = random.choice(student_first_names)
-		last = random.choice(teacher_last_names)
-		t = Teacher(first, last, i+100)
-		teacherList.append(t)
+	writeSessionFile(sessions_file, sessionList, min_students, max_students)
 
-	MIN_STUDENTS = 5
-	MAX_STUDENTS = 20
+	rows = iterStudentRows(num_students, sessionList, num_choices, skew, grade_weights, special_ids, rng)
+	writeStudentFile(students_file, num_students, rows, num_choices)
 
-	sessionList = []
-	teachersLeft = teacherList[:]
-
-	for i in range(len(careers)):
-		id = i + 1
-		t = random.choice(teachersLeft)
-		teachersLeft.remove(t)
-		s = Session(id, careers[i], t, f"Presenter {(i+1)}")
-		sessionList.append(s)
-
-	writeSessionFile("sessions.csv", sessionList, MIN_STUDENTS, MAX_STUDENTS)
-
-	studentList = []
-	
-	time_now = int(time.time())
-	time_2_weeks = time_now + 60*60 * 24 * 14
-
-	for i in range(600):
-		first = random.choice(student_first_names)
-		last = random.choice(student_last_names)
-		t_homeroom = random.choice(teacherList)
-		t_first = random.choice(teacherList)
-		ts = random.randint(time_now, time_2_weeks)
-		grade = 7 + (i % 6)
-		s = Student(first, last, t_homeroom, t_first, grade, ts)
-
-		selections = set()
-		while(len(selections) < 7):
-			if (i < 100):
-				# Overflow some sessions
-				session_choice = random.choice(sessionList[:10])
-			elif (i < 300):
-				session_choice = random.choice(sessionList[:20])
-			else:
-				session_choice = random.choice(sessionList)
-			selections.add(session_choice.id)
-
-		selection_list = list(selections)
-		random.shuffle(selection_list)
-		s.setSelections(selection_list)
-
-		studentList.append(s)
-
-	writeStudentFile("students.csv", studentList)
+	return (min_students, max_students)
+
+# Gets grade weights from "7:1,8:1,9:2" style text
+def parseGradeWeights(text):
+	grade_weights = {}
+	for part in text.split(","):
+		grade, weight = part.split(":")
+		grade_weights[int(grade)] = float(weight)
+	return grade_weights
+
+def main():
+	parser = argparse.ArgumentParser(description="Generates synthetic career day sessions.csv and students.csv files.")
+	parser.add_argument("--students", type=int, default=600, help="number of students")
+	parser.add_argument("--sessions", type=int, default=46, help="number of sessions")
+	parser.add_argument("--special", type=int, default=None, help="number of special (high school only) sessions, taken from the end; must be the ids in supersorter.SPECIAL_SESSIONS (default: those that exist)")
+	parser.add_argument("--choices", type=int, default=7, help="choices per student")
+	parser.add_argument("--skew", type=float, default=1.0, help="popularity skew, 0 is uniform and larger values crowd the top sessions")
+	parser.add_argument("--grades", type=parseGradeWeights, default=None, help="grade mix as grade:weight pairs, e.g. 7:1,8:1,9:1,10:1,11:1,12:1")
+	parser.add_argument("--min-students", type=int, default=None, help="class minimum (default scales with students per session)")
+	parser.add_argument("--max-students", type=int, default=None, help="class maximum (default scales with students per session)")
+	parser.add_argument("--seed", type=int, default=0, help="random seed")
+	parser.add_argument("--students-file", default="students.csv")
+	parser.add_argument("--sessions-file", default="sessions.csv")
+	args = parser.parse_args()
+
+	try:
+		generate(args.students_file, args.sessions_file, args.students, num_sessions=args.sessions, num_special=args.special, num_choices=args.choices, skew=args.skew, grade_weights=args.grades, min_students=args.min_students, max_students=args.max_students, seed=args.seed)
+	except ValueError as error:
+		parser.error(str(error))
 
 
 if __name__ == "__main__":
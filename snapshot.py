@@ -0,0 +1,75 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+from instrumentation import log
+
+# Binary snapshots of parsed input files
+#
+# Parsed records are pickled next to the code under .snapshots/, named after
+# the source path and keyed by a hash of the file contents, so a run over
+# unchanged input loads the records instead of parsing and validating the
+# CSV again. A changed file gets a new key and replaces its old snapshot.
+# Snapshots are written into the source tree, so they are off unless a
+# command line run asks for them; library callers and tests parse the CSV.
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots")
+SNAPSHOT_VERSION = 1 # Bump when the record layout changes so old snapshots are ignored
+HASH_CHUNK_SIZE = 1 << 20
+
+# FUNCTIONS
+
+# Gets the hash of a file's contents
+def hashFile(filename: str):
+
+    digest = hashlib.sha256()
+
+    with open(filename, mode="rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+# Gets the snapshot file prefix for a source file read with some options, shared by every version of the file
+def getSnapshotPrefix(filename: str, kind: str, options: tuple):
+    source_hash = hashlib.sha256(f"{os.path.abspath(filename)}|{options!r}".encode()).hexdigest()[:12]
+    return f"{kind}-{os.path.basename(filename)}-{source_hash}-"
+
+# Gets parsed data from its snapshot, or builds it and saves a snapshot when the file changed
+def loadSnapshot(filename: str, kind: str, build, options: tuple = ()):
+
+    key = hashlib.sha256(f"{SNAPSHOT_VERSION}|{hashFile(filename)}".encode()).hexdigest()[:24]
+    prefix = getSnapshotPrefix(filename, kind, options)
+    path = os.path.join(SNAPSHOT_DIR, prefix + key + ".pickle")
+
+    if os.path.exists(path):
+        try:
+            with open(path, mode="rb") as file:
+                return pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass # Unreadable snapshot, rebuilt below
+
+    data = build()
+    saveSnapshot(path, prefix, data)
+
+    return data
+
+# Writes a snapshot and removes older ones of the same file
+def saveSnapshot(path: str, prefix: str, data):
+
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+        # Written to a temporary file first so a crash never leaves half a snapshot
+        descriptor, temp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix=".tmp")
+        with os.fdopen(descriptor, mode="wb") as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+        for name in os.listdir(SNAPSHOT_DIR):
+            if name.startswith(prefix) and (os.path.join(SNAPSHOT_DIR, name) != path):
+                os.remove(os.path.join(SNAPSHOT_DIR, name))
+
+    except OSError as error:
+        log.warning("Could not save snapshot %s: %s", path, error)
@@ -1,13 +1,36 @@
-
-import csv
-from dataclasses import dataclass, field
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import time
+from bisect import bisect_left, insort
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
 from typing import List
 
+import evaluation
+from csvinput import SessionHeader, SessionRecord, StudentRecord, readSessionFileRecords, readStudentRecords
+from flowsorter import assignStudentsFlow
+from instrumentation import LOG_LEVELS, configureLogging, log, stats
+from localsearch import improveSchedule
+from symbols import names
+
 # CONSTANTS
 
 NUM_ASSIGNED_CLASSES = 4 # Number of classes to assign to each student
 NUM_CHOICES = 7 # Number of choices for student
-SPECIAL_SESSIONS = [44, 45, 46]
+SPECIAL_SESSIONS = [44, 45, 46] # Session ids only grade 9 and up may attend, the sessions file does not mark them
+ASSIGNMENT_ENGINE = "greedy" # "greedy" for assignStudents, "flow" for assignStudentsFlow, "array" for the NumPy assignStudentsArray
+ENGINES = ["greedy", "flow", "array"]
+USE_SNAPSHOTS = False # Loads parsed input from .snapshots/ when the CSV files have not changed, main turns it on
+ANYTIME_ENGINES = ["array", "greedy", "flow"] # Engines solveAnytime runs, the first one in process for the baseline
+ANYTIME_RESERVE = 0.05 # Fraction of the time limit solveAnytime keeps back for handing over the result
+ANYTIME_POLL = 0.05 # Seconds solveAnytime waits between checks for finished engines
+ANYTIME_MIN_GAIN = 1e-9 # Score increase solveAnytime counts as progress, smaller ones are rounding
+SNAPSHOT_INTERVAL = 0.5 # Seconds between progress snapshots while local search improves the schedule
 
 # CUSTOM TYPES (Source: https://www.datacamp.com/tutorial/python-data-classes)
 
@@ -20,25 +43,28 @@ def getDefaultAssigned():
 def getDefaultClasses(min_limit: int, max_limit: int, num_classes: int = NUM_ASSIGNED_CLASSES):
     return [Class(min_limit=min_limit, max_limit=max_limit) for _ in range(num_classes)]
 
-@dataclass
-class CondensedSession:
-    id: int
-    subject: str
-    teacher: str
-    presenter: str
+# Students, classes and sessions are slotted, a student's schedule is the session id of each
+# period and the subject, teacher and presenter are looked up in the session table when written.
+# Teacher and presenter names are kept as codes in the symbols.names table
 
-@dataclass(order=True)
+@dataclass(order=True, slots=True)
 class Student:
     grade: int
     timestamp: int
     first_name: str
     last_name: str
-    homeroom: str
-    first_period: str
+    homeroom: int # Code in symbols.names
+    first_period: int # Code in symbols.names
     id: int
     choices: List[int]
-    assigned: List[CondensedSession] = field(default_factory=getDefaultAssigned)
+    assigned: List[int] = field(default_factory=getDefaultAssigned) # Session id per period
     choices_given: List[int] = 0
+    assigned_mask: int = field(default=0, repr=False, compare=False) # Bit per assigned session id
+    preferences: tuple = field(default=None, repr=False, compare=False) # Choices as submitted, choices is used up while assigning
+
+    def __post_init__(self):
+        if (self.preferences is None):
+            self.preferences = tuple(self.choices)
     
     # Assigns student choice they chose
     def assignChoice(self, index: int, sessions: dict, wasChosen: bool = True):
@@ -50,24 +76,33 @@ class Student:
         else:
             chosen_session: Session = sessions[index]
 
-        self.assigned.append(
-            CondensedSession(
-                id=chosen_session.id,
-                subject=chosen_session.subject,
-                teacher=chosen_session.teacher,
-                presenter=chosen_session.presenter
-            )
-        )
+        self.assigned.append(chosen_session.id)
+        self.assigned_mask |= 1 << chosen_session.id
 
-        debug(self.assigned)
+        log.debug("Student (Id: %s) assigned %s", self.id, self.assigned)
 
-    # Gets csv formatted row
-    def getCSVRow(self):
+    # Replaces the session assigned for a class with another one
+    def replaceAssigned(self, class_index: int, session: "Session"):
+
+        self.assigned_mask &= ~(1 << self.assigned[class_index])
+        self.assigned[class_index] = session.id
+        self.assigned_mask |= 1 << session.id
+
+    # Assigns student a session by id, counting it as a choice if they chose it
+    def assignSession(self, session_id: int, sessions: dict):
+
+        if (session_id in self.choices):
+            self.assignChoice(index=self.choices.index(session_id), sessions=sessions)
+        else:
+            self.assignChoice(index=session_id, sessions=sessions, wasChosen=False)
+
+    # Gets csv formatted row, teachers are looked up in the session table
+    def getCSVRow(self, sessions: dict):
         
-        row = f"{self.first_name}, {self.last_name}, {self.homeroom}, {self.first_period}, {self.id}, {self.grade}"
+        row = f"{self.first_name}, {self.last_name}, {names.getName(self.homeroom)}, {names.getName(self.first_period)}, {self.id}, {self.grade}"
         
-        for session in self.assigned:
-            row += f", {session.id}, {session.teacher}"
+        for session_id in self.assigned:
+            row += f", {session_id}, {names.getName(sessions[session_id].teacher)}"
 
         row += f"\n"
 
@@ -75,26 +110,43 @@ class Student:
     
     # Checks whether the student has already chosen a session
     def checkChosen(self, session_id: int):
-
-        for session in self.assigned:
-            if session.id == session_id:
-                debug("match")
-                debug(session_id)
-                debug(session.id)
-                return False
-            
-        return True
+        return not (self.assigned_mask >> session_id) & 1
         
 
-@dataclass
+@dataclass(slots=True)
 class Class:
     min_limit: int
     max_limit: int
     students: List[Student] = field(default_factory=getDefaultStudents)
+    session_id: int = None
+    period: int = None
+    size_index: "SessionSizeIndex" = field(default=None, repr=False, compare=False)
+    shortfall_counter: "ShortfallCounter" = field(default=None, repr=False, compare=False)
 
     # Adds a student to class
     def addStudent(self, student: Student):
         self.students.append(student)
+        if (self.size_index is not None):
+            self.size_index.moveSession(self, len(self.students) - 1)
+        if (self.shortfall_counter is not None) and (len(self.students) <= self.min_limit):
+            self.shortfall_counter.changeNeeded(self, -1)
+
+    # Removes a student from class
+    def removeStudent(self, student: Student):
+        for index, class_student in enumerate(self.students):
+            if class_student is student:
+                del self.students[index]
+                break
+        else:
+            return
+        if (self.size_index is not None):
+            self.size_index.moveSession(self, len(self.students) + 1)
+        if (self.shortfall_counter is not None) and (len(self.students) < self.min_limit):
+            self.shortfall_counter.changeNeeded(self, 1)
+
+    # Checks whether a student can leave the class without dropping it below its minimum
+    def hasSurplus(self):
+        return len(self.students) > self.min_limit
 
     # Check how many students are still needed in class
     def needsStudents(self):
@@ -103,12 +155,12 @@ class Class:
         else:
             return 0
 
-@dataclass(order=True)
+@dataclass(order=True, slots=True)
 class Session:
     id: int
     subject: str
-    teacher: str
-    presenter: str
+    teacher: int # Code in symbols.names
+    presenter: int # Code in symbols.names
     classes: List[Class]
 
     # Checks whether student meets requirement for special session
@@ -125,7 +177,7 @@ class Session:
     # Gets csv formatted row
     def getCSVRow(self):
         
-        row = f"{self.id}, {self.subject}, {self.teacher}"
+        row = f"{self.id}, {self.subject}, {names.getName(self.teacher)}"
         
         for session_class in self.classes:
             num_students = len(session_class.students)
@@ -136,144 +188,214 @@ class Session:
 
         return row
 
-# FUNCTIONS
+# Keeps the sessions of each period in buckets by class size (bucket queue)
+class SessionSizeIndex:
 
-# Debug function for logging
-def debug(statement: str):
-    if False:
-        print(statement)
+    def __init__(self, sessions: dict):
 
-# Gets student data and converts to custom defined type
-def getStudentData(filename: str):
+        # Position in the session table breaks ties the same way a stable sort would
+        self.sessions: List[Session] = list(sessions.values())
 
-    # Sort function
-    def sortStudents(student: Student):
-        # return student.timestamp
-        return student.grade + ((student.timestamp / 1000000000) * 2)
+        for session in self.sessions:
+            for period, session_class in enumerate(session.classes):
+                session_class.session_id = session.id
+                session_class.period = period
+                session_class.size_index = self
 
-    student_data: List[Student] = []
-    
-    with open(filename, mode="r") as file:
-        reader = csv.reader(file)
+        self.build()
 
-        # Initializes metadata
-        num_students = 0
+    # Puts every session in the bucket for its current class sizes
+    def build(self):
 
-        # Reads in lines of file
-        for index, row in enumerate(reader):
+        self.positions = {session.id: position for position, session in enumerate(self.sessions)}
+        num_classes = max((len(session.classes) for session in self.sessions), default=0)
 
-            if (index == 0): # Gets number of students
-                num_students = int(row[1])
-                next(reader) # Skips header 
-            else:
-                student_data.append(
-                    Student(
-                        timestamp=int(row[0]),
-                        first_name=row[1].strip(),
-                        last_name=row[2].strip(),
-                        homeroom=row[3].strip(),
-                        first_period=row[4].strip(),
-                        id=int(row[5]),
-                        grade=int(row[6]),
-                        choices=[int(row[choice]) for choice in range(7, len(row))]
-                    )
-                )
-            
-    return sorted(student_data, reverse=True)
+        # buckets[special][period][size] is a sorted list of session positions
+        self.buckets = [[[] for _ in range(num_classes)] for _ in range(2)]
+
+        for session in self.sessions:
+            for period, session_class in enumerate(session.classes):
+                for special in self.getIndexes(session.id):
+                    self.insert(special, period, len(session_class.students), self.positions[session.id])
+
+    # Breaks ties between same size sessions in a random order instead of table order
+    def shuffleTies(self, seed: int):
+        random.Random(seed).shuffle(self.sessions)
+        self.build()
+
+    # Gets which indexes a session belongs to, 0 is all sessions and 1 is special sessions
+    def getIndexes(self, session_id: int):
+        return (0, 1) if session_id in SPECIAL_SESSIONS else (0,)
+
+    def insert(self, special: int, period: int, size: int, position: int):
+        period_buckets = self.buckets[special][period]
+        while len(period_buckets) <= size:
+            period_buckets.append([])
+        insort(period_buckets[size], position)
+
+    def remove(self, special: int, period: int, size: int, position: int):
+        bucket = self.buckets[special][period][size]
+        del bucket[bisect_left(bucket, position)]
+
+    # Moves a class's session to the bucket for its current size
+    def moveSession(self, session_class: Class, old_size: int):
+        position = self.positions[session_class.session_id]
+        for special in self.getIndexes(session_class.session_id):
+            self.remove(special, session_class.period, old_size, position)
+            self.insert(special, session_class.period, len(session_class.students), position)
+
+    # Gets sessions from smallest to largest class for a period
+    def iterSessions(self, period: int, special_only: bool = False):
+        for bucket in self.buckets[1 if special_only else 0][period]:
+            for position in bucket:
+                yield self.sessions[position]
+
+    # Gets the session at a position in the smallest to largest order, None if there are not enough
+    def getSession(self, period: int, index: int, special_only: bool = False):
+        for bucket in self.buckets[1 if special_only else 0][period]:
+            if index < len(bucket):
+                return self.sessions[bucket[index]]
+            index -= len(bucket)
+        return None
+
+# Keeps running totals of how many students each period's classes still need
+class ShortfallCounter:
+
+    def __init__(self, sessions: dict):
+
+        num_classes = max((len(session.classes) for session in sessions.values()), default=0)
+
+        # needed[special][period], special sessions are counted apart from the rest
+        self.needed = [[0] * num_classes for _ in range(2)]
+
+        for session in sessions.values():
+            for period, session_class in enumerate(session.classes):
+                session_class.shortfall_counter = self
+                self.needed[self.getGroup(session.id)][period] += session_class.needsStudents()
+
+    # Gets which total a session counts towards, 1 for special sessions and 0 otherwise
+    def getGroup(self, session_id: int):
+        return 1 if session_id in SPECIAL_SESSIONS else 0
+
+    def changeNeeded(self, session_class: Class, amount: int):
+        self.needed[self.getGroup(session_class.session_id)][session_class.period] += amount
+
+    # Gets how many students the special or regular classes of a period still need
+    def getNeeded(self, period: int, special: bool):
+        return self.needed[1 if special else 0][period]
+
+# Session dictionary keyed by id with its sessions indexed by class size
+class SessionTable(dict):
+
+    def __init__(self, sessions: dict):
+        super().__init__(sessions)
+        self.size_index = SessionSizeIndex(self)
+        self.shortfall = ShortfallCounter(self)
+
+# Options for a sorting run
+@dataclass
+class SortConfig:
+    engine: str = ASSIGNMENT_ENGINE
+    prioritize_small_classes: bool = True
+    account_for_special_sessions: bool = True
+    seed: int = None # Shuffles student order within each grade and ties between same size sessions when set
+    improve: bool = False # Runs the local search pass after assigning
+    improve_time_limit: float = None # Seconds the local search pass may take
+    improve_iterations: int = None # Students the local search pass may examine
+    target_gap: float = None # Stops improving once the score is within this fraction of the upper bound (bounds.py)
+    bound_method: str = "lagrangian" # "lagrangian" or "lp", see bounds.py
+
+# Results of a sorting run
+@dataclass
+class SortResult:
+    students: List[Student]
+    sessions: SessionTable
+    seed: int = None
+    timings: dict = field(default_factory=dict) # Seconds per phase
+    score: float = None # Average evaluation score, set by multiStart
+    improvement: dict = None # Local search summary, set when config.improve is on
+    bound: "Bound" = None # Upper bound on the average score, set when config.target_gap is set
+    gap: float = None # Fraction of the bound the assignment fell short by, before any improvement
+    progress: list = None # Score over time, set by solveAnytime
+
+# FUNCTIONS
 
 # Gets student data and converts to custom defined type
-def getSessionData(filename: str):
-    
-    session_data: dict = {}
-    
-    with open(filename, mode="r") as file:
-        reader = csv.reader(file)
+def getStudentData(filename: str, session_ids: set = None, use_snapshot: bool = None):
+    return getStudentsFromRecords(readStudentRecords(filename, session_ids=session_ids, max_choices=NUM_CHOICES, use_snapshot=USE_SNAPSHOTS if (use_snapshot is None) else use_snapshot))
 
-        # Initializes metadata
-        num_sessions = 0
-        min_students = 0
-        max_students = 0
-        
-        # Reads in lines of file
-        for index, row in enumerate(reader):
-
-            if (index == 0): # Gets number of sessions
-                num_sessions = int(row[1])
-            elif (index == 1): # Gets min students for session
-                min_students = int(row[1])
-            elif (index == 2): # Gets max students for session
-                max_students = int(row[1])
-                next(reader) # Skips header
-            else:
-                session_data[int(row[0])] = Session(
-                    id=int(row[0]),
-                    subject=row[1].replace("[", "").replace("]", ""),
-                    teacher=row[2].strip(),
-                    presenter=row[3].strip(),
-                    classes = getDefaultClasses(min_limit=min_students, max_limit=max_students)
-                )
-            
-    return session_data
+# Gets students from student file records, in the order the engines take them
+def getStudentsFromRecords(records: List[StudentRecord]):
 
-# Gets sorted list of sessions based on class size
-def getSmallClasses(sessions: dict, class_index: int):
+    # Sort function
+    def sortStudents(student: Student):
+        # return student.timestamp
+        return student.grade + ((student.timestamp / 1000000000) * 2)
 
-    sessions: List[Session] = sessions.values()  
+    student_data: List[Student] = []
 
-    def getSortKey(e: Session):
-        return len(e.classes[class_index].students)
+    for record in records:
+        student_data.append(getStudent(record))
 
-    return sorted(sessions, key=getSortKey)
+    # Same order as comparing the dataclasses with names instead of codes, but each key is built once instead of per comparison
+    def getOrderKey(e: Student):
+        return (e.grade, e.timestamp, e.first_name, e.last_name, names.getName(e.homeroom), names.getName(e.first_period), e.id, e.choices)
 
-# Gets sorted list of sessions based on class size
-def getSmallSpecialClasses(sessions: dict, class_index: int):
+    return sorted(student_data, key=getOrderKey, reverse=True)
 
-    sessions: List[Session] = sessions.values()  
-    filtered_sessions: List[Session] = []
+# Gets a student from a student file record, teacher names are interned
+def getStudent(record: StudentRecord):
+    return Student(
+        timestamp=record.timestamp,
+        first_name=record.first_name,
+        last_name=record.last_name,
+        homeroom=names.getCode(record.homeroom),
+        first_period=names.getCode(record.first_period),
+        id=record.id,
+        grade=record.grade,
+        choices=list(record.choices)
+    )
 
-    for session in sessions:
-        if session.id in SPECIAL_SESSIONS:
-            filtered_sessions.append(session)
+# Gets student data and converts to custom defined type
+def getSessionData(filename: str, use_snapshot: bool = None):
+    return getSessionsFromRecords(*readSessionFileRecords(filename, use_snapshot=USE_SNAPSHOTS if (use_snapshot is None) else use_snapshot))
 
-    def getSortKey(e: Session):
-        return len(e.classes[class_index].students)
+# Gets sessions from the header and records of a sessions file
+def getSessionsFromRecords(header: SessionHeader, records: List[SessionRecord]):
 
-    return sorted(filtered_sessions, key=getSortKey)
+    session_data: dict = {}
 
-def getSpecialSessionStudentsRemaining(sessions: List[Session], class_index: int):
+    for record in records:
+        session_data[record.id] = Session(
+            id=record.id,
+            subject=record.subject.replace("[", "").replace("]", ""),
+            teacher=names.getCode(record.teacher),
+            presenter=names.getCode(record.presenter),
+            classes = getDefaultClasses(min_limit=header.min_students, max_limit=header.max_students)
+        )
 
-    students_needed: int = 0
+    return SessionTable(session_data)
 
-    for session in sessions:
-        if session.id in SPECIAL_SESSIONS:
-            chosen_class = session.classes[class_index]
-            students_needed += chosen_class.needsStudents()
+# Gets sorted list of sessions based on class size
+def getSmallClasses(sessions: SessionTable, class_index: int):
+    return list(sessions.size_index.iterSessions(class_index))
 
-    return students_needed
+# Gets sorted list of special sessions based on class size
+def getSmallSpecialClasses(sessions: SessionTable, class_index: int):
+    return list(sessions.size_index.iterSessions(class_index, special_only=True))
+
+def getSpecialSessionStudentsRemaining(sessions: SessionTable, class_index: int):
+    return sessions.shortfall.getNeeded(class_index, special=True)
 
 # Decides whether small classes need to be prioritized
-def prioritizeSmallClasses(sessions: dict, class_index: int, student: Student, middle_school_students_remaining: int, high_school_students_remaining: int, active: bool):
+def prioritizeSmallClasses(sessions: SessionTable, class_index: int, student: Student, middle_school_students_remaining: int, high_school_students_remaining: int, active: bool):
 
     if (active):
         if (student.grade < 9):
-            middle_school_students_needed: int = 0
-            sessions: List[Session] = getSmallClasses(sessions, class_index)
-
-            for session in sessions:
-                chosen_class = session.classes[class_index]
-                if (session.id not in SPECIAL_SESSIONS):
-                    middle_school_students_needed += chosen_class.needsStudents()
-
+            middle_school_students_needed: int = sessions.shortfall.getNeeded(class_index, special=False)
             return (middle_school_students_remaining <= middle_school_students_needed)
         else:
-            high_school_students_needed: int = 0
-            sessions: List[Session] = getSmallClasses(sessions, class_index)
-
-            for session in sessions:
-                chosen_class = session.classes[class_index]
-                if (session.id in SPECIAL_SESSIONS):
-                    high_school_students_needed += chosen_class.needsStudents()
-
+            high_school_students_needed: int = sessions.shortfall.getNeeded(class_index, special=True)
             return (high_school_students_remaining <= high_school_students_needed)
 
     else:
@@ -306,52 +428,111 @@ def getNumHighSchoolStudents(students: List[Student]):
 
     return num_students
 
-def fillClasses(students: List[Student], sessions: List[Session]):
+# Gets the class a student is in for a period, None if they have none
+def getAssignedClass(student: Student, sessions: SessionTable, class_index: int):
 
-    students = getStudentsSortedByChoices(students)
-    
-    for class_index in range(NUM_ASSIGNED_CLASSES):
-        special_sessions = getSmallSpecialClasses(sessions, class_index)
-        for session in special_sessions:
-            chosen_class = session.classes[class_index]
-            while (chosen_class.needsStudents() != 0):
-                # print(session.id)
-                print(chosen_class.needsStudents())
-                for student in students:
-                    if (student.grade >= 9) and (student.checkChosen(session.id)):
-                        student.assigned[class_index] = CondensedSession(
-                            id=session.id,
-                            subject=session.subject,
-                            teacher=session.teacher,
-                            presenter=session.presenter
-                        )
-                        chosen_class.addStudent(student=student)
-                        break
+    if (class_index >= len(student.assigned)):
+        return None
+
+    return sessions[student.assigned[class_index]].classes[class_index]
+
+# Moves a student into a session for a period if the session allows it and their class can spare them
+def moveStudent(student: Student, sessions: SessionTable, class_index: int, session: Session):
+
+    current_class = getAssignedClass(student, sessions, class_index)
+
+    if (current_class is None) or (not current_class.hasSurplus()):
+        return False
+    if (not student.checkChosen(session.id)) or (not session.checkStudent(student)):
+        return False
+
+    current_class.removeStudent(student=student)
+    student.replaceAssigned(class_index, session)
+    session.classes[class_index].addStudent(student=student)
+
+    return True
+
+# Gets the first position at or after this one that is not skipped, skipped positions point further
+# along and the last entry is the end of the walk
+def findNextPosition(next_position: List[int], position: int):
+
+    while (next_position[position] != position):
+        next_position[position] = next_position[next_position[position]]
+        position = next_position[position]
+
+    return position
+
+# Fills classes below their minimum with students from classes above theirs
+def fillClasses(students: List[Student], sessions: SessionTable):
 
     students = getStudentsSortedByChoices(students)
 
+    # Students who still list a session as a choice are asked first, best choice first
+    wanted_by: dict = {}
+    for move_rank, student in enumerate(students):
+        for choice_index, session_id in enumerate(student.choices):
+            wanted_by.setdefault(session_id, []).append((choice_index, move_rank))
+    for candidates in wanted_by.values():
+        candidates.sort()
+
+    # Everybody else is asked in getStudentsSortedByChoices order, cheapest to move first; special
+    # sessions only ask the students who may take them
+    walk_ranks = {False: list(range(len(students))), True: [move_rank for move_rank, student in enumerate(students) if student.grade >= 9]}
+
+    short_classes = []
+    fill_moves = 0
+
     for class_index in range(NUM_ASSIGNED_CLASSES):
-        special_sessions = getSmallClasses(sessions, class_index)
-        for session in special_sessions:
+
+        # Students whose class has no surplus are skipped for the rest of the period, ones a
+        # session will not take stay for the next session
+        skips = {special: list(range(len(ranks) + 1)) for special, ranks in walk_ranks.items()}
+
+        # Special sessions have the fewest eligible students so they are filled first
+        targets = getSmallSpecialClasses(sessions, class_index)
+        targets += [session for session in getSmallClasses(sessions, class_index) if session.id not in SPECIAL_SESSIONS]
+
+        for session in targets:
             chosen_class = session.classes[class_index]
-            while (chosen_class.needsStudents() != 0):
-                # print(session.id)
-                print(chosen_class.needsStudents())
-                for student in students:
-                    if (student.checkChosen(session.id)):
-                        student.assigned[class_index] = CondensedSession(
-                            id=session.id,
-                            subject=session.subject,
-                            teacher=session.teacher,
-                            presenter=session.presenter
-                        )
-                        chosen_class.addStudent(student=student)
-                        break
+            if (chosen_class.needsStudents() == 0):
+                continue
+
+            for _, move_rank in wanted_by.get(session.id, []):
+                if (chosen_class.needsStudents() == 0):
+                    break
+                if moveStudent(students[move_rank], sessions, class_index, session):
+                    fill_moves += 1
+
+            # Every candidate is looked at most once per session, so filling always ends
+            special = session.id in SPECIAL_SESSIONS
+            ranks, next_position = walk_ranks[special], skips[special]
+            position = findNextPosition(next_position, 0)
+            while (chosen_class.needsStudents() != 0) and (position < len(ranks)):
+                student = students[ranks[position]]
+                current_class = getAssignedClass(student, sessions, class_index)
+
+                # Filled classes stop at their minimum and the others only lose students, so a
+                # class without surplus never gets it back
+                if (current_class is None) or (not current_class.hasSurplus()):
+                    next_position[position] = position + 1
+                elif moveStudent(student, sessions, class_index, session):
+                    fill_moves += 1
+                    next_position[position] = position + 1
+
+                position = findNextPosition(next_position, position + 1)
+
+            if (chosen_class.needsStudents() != 0):
+                short_classes.append((session.id, class_index, chosen_class.needsStudents()))
+
+    stats.count("fill_moves", fill_moves)
+
+    for session_id, class_index, needed in short_classes:
+        log.warning("Session %s class #%s could not be filled, still needs %s students", session_id, class_index, needed)
 
     return students
 
 # Assigns students to classes
-def assignStudents(students: List[Student], sessions: List[Session], prioritize_small_classes: bool, account_for_special_sessions: bool):
+def assignStudents(students: List[Student], sessions: List[Session], prioritize_small_classes: bool, account_for_special_sessions: bool, fill: bool = True):
 
     # Goes through the numebr of classes that need to be assigned
     for class_index in range(NUM_ASSIGNED_CLASSES):
@@ -359,6 +540,9 @@ def assignStudents(students: List[Student], sessions: List[Session], prioritize_
         middle_school_students_remaining = getNumMiddleSchoolStudents(students)
         high_school_students_remaining = getNumHighSchoolStudents(students)
 
+        # Counted locally and handed to stats once per class
+        choice_attempts, full_class_rejections, small_class_fallbacks = 0, 0, 0
+
         # Goes through all the students
         for student in students:
 
@@ -375,6 +559,7 @@ def assignStudents(students: List[Student], sessions: List[Session], prioritize_
 
                     # Gets class
                     class_chosen: Class = session_chosen.classes[class_index]
+                    choice_attempts += 1
 
                     # Checks if they have already chose class and if class has room
                     if student.checkChosen(session_chosen.id) and session_chosen.checkStudent(student) and(len(class_chosen.students) < class_chosen.max_limit):
@@ -386,9 +571,11 @@ def assignStudents(students: List[Student], sessions: List[Session], prioritize_
                             middle_school_students_remaining -= 1
                         else:
                             high_school_students_remaining -=1
-                        debug(f"CHOICE - Student (Id: {student.id}) was assigned choice #{choice_index} for class #{class_index}. - {high_school_students_remaining}, {middle_school_students_remaining}")
+                        log.debug("CHOICE - Student (Id: %s) was assigned choice #%s for class #%s. - %s, %s", student.id, choice_index, class_index, high_school_students_remaining, middle_school_students_remaining)
                     else:
                         # Attempts to give them one of other choices
+                        if (len(class_chosen.students) >= class_chosen.max_limit):
+                            full_class_rejections += 1
                         choice_index += 1
 
                 else:
@@ -401,12 +588,10 @@ def assignStudents(students: List[Student], sessions: List[Session], prioritize_
                     else:
                         selection_index = choice_index - len(student.choices)
 
-                    if (student.grade > 8) and (selection_index < len(SPECIAL_SESSIONS)):
-                        small_classes: List[Session] = getSmallSpecialClasses(sessions=sessions, class_index=class_index)
-                    else:
-                        small_classes: List[Session] = getSmallClasses(sessions=sessions, class_index=class_index)
-
-                    session_chosen: Session = small_classes[selection_index]
+                    special_only = (student.grade > 8) and (selection_index < len(SPECIAL_SESSIONS))
+                    session_chosen: Session = sessions.size_index.getSession(class_index, selection_index, special_only=special_only)
+                    if (session_chosen is None):
+                        raise IndexError(f"No session left for student (Id: {student.id}) in class #{class_index}")
                     class_chosen: Class = session_chosen.classes[class_index]
 
                     # Checks if there is room in smallest class and that they havent already taken class
@@ -419,16 +604,27 @@ def assignStudents(students: List[Student], sessions: List[Session], prioritize_
                             middle_school_students_remaining -= 1
                         else:
                             high_school_students_remaining -=1
-                        debug(f"SMALL - Student (Id: {student.id}) was assigned choice #{choice_index} for class #{class_index}.")
+                        small_class_fallbacks += 1
+                        log.debug("SMALL - Student (Id: %s) was assigned choice #%s for class #%s.", student.id, choice_index, class_index)
                     else:
                         # Lets user know all classes have been filled if the smallest class is full
+                        if (len(class_chosen.students) >= class_chosen.max_limit):
+                            full_class_rejections += 1
                         choice_index += 1
-                        debug(f"All sessions for class #{class_index} are full.")
+                        log.debug("All sessions for class #%s are full.", class_index)
+
+        stats.count("choice_attempts", choice_attempts)
+        stats.count("full_class_rejections", full_class_rejections)
+        stats.count("small_class_fallbacks", small_class_fallbacks)
+
+    # Left off to time fillClasses on its own
+    if not fill:
+        return students
 
     return fillClasses(students, sessions)
 
 # Writes the student selection file
-def writeStudentSelectionFile(filename, students: List[Student]):
+def writeStudentSelectionFile(filename, students: List[Student], sessions: dict):
 
     # Opens filename for writing
 	f, average_score = open(filename, "w"), 0
@@ -441,9 +637,9 @@ def writeStudentSelectionFile(filename, students: List[Student]):
 
 	for student in students:
         # Writes row
-		f.write(student.getCSVRow());average_score += NUM_CHOICES - len(student.choices)
+		f.write(student.getCSVRow(sessions));average_score += NUM_CHOICES - len(student.choices)
 
-	f.close();debug(f"Average score: {average_score/len(students)}")
+	f.close();log.debug("Average score: %s", average_score / max(len(students), 1))
 
 # Writes the student session selection file
 def writeSessionSelectionFile(filename, sessions: dict):
@@ -461,17 +657,431 @@ def writeSessionSelectionFile(filename, sessions: dict):
 
 	f.close()
 
-# Sample Data
-# sessions = getSessionData(filename="sample_data/sessions.csv")
-# students = getStudentData(filename="sample_data/students.csv")
+# Shuffles the order students are assigned in, older grades still go first
+def shuffleStudents(students: List[Student], seed: int):
 
-# Real Data
-sessions = getSessionData(filename="real_data/sessions.csv")
-students = getStudentData(filename="real_data/students.csv")
+    rng = random.Random(seed)
+    shuffle_keys = {id(student): rng.random() for student in students}
 
-students = assignStudents(students=students, sessions=sessions, prioritize_small_classes=True, account_for_special_sessions=True)
-writeStudentSelectionFile(filename="output/schedule.csv", students=students)
-writeSessionSelectionFile(filename="output/updated_sessions.csv", sessions=sessions)
-print("Done")
-                
+    def getSortKey(e: Student):
+        return (-e.grade, shuffle_keys[id(e)])
+
+    return sorted(students, key=getSortKey)
+
+# Assigns students with the configured engine and returns the results in memory
+def run(students: List[Student], sessions: SessionTable, config: SortConfig = None):
+
+    config = config if (config is not None) else SortConfig()
+    timings: dict = {}
+
+    if (config.seed is not None):
+        students = shuffleStudents(students, config.seed)
+        sessions.size_index.shuffleTies(config.seed)
+
+    with stats.phase("assign") as timer:
+        students = assign(students, sessions, config)
+
+    timings["assign"] = timer.seconds
+
+    # Nothing is improved once the schedule is close enough to the bound
+    bound, gap, target_score = None, None, None
+    if (config.target_gap is not None):
+        with stats.phase("bound") as timer:
+            score = scoreSchedule(students, sessions)
+            bound = getScheduleBound(students, sessions, method=config.bound_method, lower=score)
+        timings["bound"] = timer.seconds
+
+        from bounds import getGap
+        gap = getGap(score, bound)
+        target_score = bound.value * (1 - config.target_gap)
+        log.info("Score %.3f, upper bound %.3f, gap %.2f%%", score, bound.value, gap * 100)
+
+    improvement = None
+    if (config.improve) and ((gap is None) or (gap > config.target_gap)):
+        with stats.phase("improve"):
+            improvement = improveSchedule(students, sessions, time_limit=config.improve_time_limit, max_iterations=config.improve_iterations, seed=config.seed, target_score=target_score)
+        timings["improve"] = improvement["seconds"]
+
+    return SortResult(students=students, sessions=sessions, seed=config.seed, timings=timings, improvement=improvement, bound=bound, gap=gap)
+
+# Assigns students with the configured engine
+def assign(students: List[Student], sessions: SessionTable, config: SortConfig):
+
+    if (config.engine == "flow"):
+        students = assignStudentsFlow(students=students, sessions=sessions)
+    elif (config.engine == "array"):
+        from arraysorter import assignStudentsArray # NumPy is only needed for this engine
+        students = assignStudentsArray(students=students, sessions=sessions)
+    elif (config.engine == "greedy"):
+        students = assignStudents(students=students, sessions=sessions, prioritize_small_classes=config.prioritize_small_classes, account_for_special_sessions=config.account_for_special_sessions)
+    else:
+        raise ValueError(f"Unknown assignment engine: {config.engine}")
+
+    return students
+
+# Gets an upper bound on the average score any schedule of these students can reach (bounds.py)
+def getScheduleBound(students: List[Student], sessions: SessionTable, method: str = "lagrangian", lower: float = None):
+    from bounds import getUpperBound # NumPy is only needed for the bound
+
+    num_periods = min(len(session.classes) for session in sessions.values())
+    capacities = [sum(session_class.max_limit for session_class in session.classes[:num_periods]) for session in sessions.values()]
+
+    return getUpperBound([student.preferences for student in students], [student.grade for student in students], list(sessions.keys()), capacities, num_periods, SPECIAL_SESSIONS, method=method, lower=lower)
+
+# Gets the average evaluation score of a schedule, same metric as evaluation.Student.scoreSelections
+def scoreSchedule(students: List[Student], sessions: SessionTable):
+    return evaluation.evaluateSchedule(students, sessions, SPECIAL_SESSIONS).average_score
+
+# Gets the average score of a schedule one student at a time, the same score without the batch tables
+# evaluateSchedule builds for its reports
+def getAverageScore(students: List[Student]):
+    return sum(evaluation.scoreSelectionList(student.preferences, student.assigned) for student in students) / max(len(students), 1)
+
+# Gets every rule a schedule breaks (verifier.Violation records), empty when it is valid
+def getViolations(students: List[Student], sessions: SessionTable):
+    return evaluation.verifyAssignment(students, sessions, SPECIAL_SESSIONS)
+
+# Checks every student has a full schedule without repeats and every class is inside its limits
+def checkFeasible(students: List[Student], sessions: SessionTable):
+    return not getViolations(students, sessions)
+
+# Checks whether running a config again gives the same schedule, a time budget for local search does not
+def checkReproducible(config: SortConfig):
+    return not (config.improve and (config.improve_time_limit is not None))
+
+# Runs one seeded sort from files and scores it, used by the multiStart workers. Runs that cannot be
+# rebuilt from their seed also send back their schedule (student id -> session id per period, in
+# result order) and local search summary
+def runSeed(students_file: str, sessions_file: str, config: SortConfig):
+
+    sessions = getSessionData(filename=sessions_file)
+    students = getStudentData(filename=students_file, session_ids=set(sessions.keys()))
+
+    result = run(students, sessions, config)
+
+    # Scored and checked in memory, the schedule is never written out
+    report = evaluation.evaluateSchedule(result.students, result.sessions, SPECIAL_SESSIONS)
+
+    shipped = None
+    if not checkReproducible(config):
+        shipped = ({student.id: list(student.assigned) for student in result.students}, result.improvement)
+
+    return config.seed, report.average_score, report.passed, shipped
+
+# Runs several seeded sorts in parallel and keeps the best scoring feasible one
+def multiStart(students_file: str, sessions_file: str, config: SortConfig, runs: int, workers: int = None):
+
+    with stats.phase("multi_start") as timer:
+
+        # The unshuffled order is always tried so the result is never worse than a single run
+        base_seed = config.seed if (config.seed is not None) else 0
+        seeds = [None] + [base_seed + index for index in range(runs - 1)]
+
+        # With a target gap, runs not started yet are dropped once one gets close enough to the bound
+        target_score = None
+        if (config.target_gap is not None):
+            bound = getScheduleBound(getStudentData(filename=students_file), getSessionData(filename=sessions_file), method=config.bound_method)
+            target_score = bound.value * (1 - config.target_gap)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(runSeed, students_file, sessions_file, replace(config, seed=seed)) for seed in seeds]
+
+            for future in as_completed(futures):
+                _, score, feasible, _ = future.result()
+                if (target_score is not None) and feasible and (score >= target_score):
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+        # Kept in seed order so ties go to the same run whichever finished first
+        outcomes = [future.result() for future in futures if not future.cancelled()]
+
+        feasible = [outcome for outcome in outcomes if outcome[2]]
+        best_seed, best_score, _, shipped = max(feasible if feasible else outcomes, key=lambda outcome: outcome[1])
+        if not feasible:
+            log.warning("No run produced a feasible schedule, keeping the best scoring one")
+
+        # Reproducible runs are rebuilt here from their seed instead of shipping them between processes
+        sessions = getSessionData(filename=sessions_file)
+        students = getStudentData(filename=students_file, session_ids=set(sessions.keys()))
+        if (shipped is None):
+            result = run(students, sessions, replace(config, seed=best_seed))
+        else:
+            schedule, improvement = shipped
+            students_by_id = {student.id: student for student in students}
+            students = [students_by_id[student_id] for student_id in schedule]
+            loadAssignment(students, sessions, schedule)
+            result = SortResult(students=students, sessions=sessions, seed=best_seed, improvement=improvement)
+        result.score = best_score
+
+    result.timings["multi_start"] = timer.seconds
+
+    return result
+
+candidate_input = None # Students and sessions of a solveAnytime worker, set by setCandidateInput
+
+# Builds the students and sessions of a solveAnytime worker from the records the parent parsed, forked
+# workers share the records instead of reading the files again
+def setCandidateInput(student_records: List[StudentRecord], session_header: SessionHeader, session_records: List[SessionRecord]):
+    global candidate_input
+    candidate_input = (getStudentsFromRecords(student_records), getSessionsFromRecords(session_header, session_records))
+
+# Runs one engine on the worker's students and sessions and returns the schedule it made (student id ->
+# session id per period), its score and whether it is feasible. Each worker runs one engine, the
+# engines change the students and sessions they are given
+def runCandidate(config: SortConfig):
+
+    students, sessions = candidate_input
+    result = run(students, sessions, config)
+
+    return {student.id: list(student.assigned) for student in result.students}, getAverageScore(result.students), checkFeasible(result.students, result.sessions)
+
+# Puts students into the classes of a schedule (student id -> session id per period), replacing whatever they had
+def loadAssignment(students: List[Student], sessions: SessionTable, schedule: dict):
+
+    for session in sessions.values():
+        for session_class in session.classes:
+            session_class.students.clear()
+
+    for student in students:
+        student.choices = list(student.preferences)
+        student.choices_given = 0
+        student.assigned = []
+        student.assigned_mask = 0
+
+    loadClasses(sessions, [(student, dict(enumerate(schedule.get(student.id, []))), True) for student in students])
+
+# Puts students into classes from (student, {period: session id}, assign) entries, in class list order.
+# With assign the sessions also go on the student's schedule, otherwise the student only holds the
+# seats. Students go straight into the class lists, the size index and shortfall counts are built once afterwards
+def loadClasses(sessions: SessionTable, placements: list):
+
+    for student, periods, assign in placements:
+        for period, session_id in periods.items():
+            if assign:
+                student.assignSession(session_id, sessions)
+            sessions[session_id].classes[period].students.append(student)
+
+    sessions.size_index.build()
+    sessions.shortfall = ShortfallCounter(sessions)
+
+# Gets the best schedule found within a time limit. The fastest engine runs here first, so there is
+# always a baseline to return, while the other engines run in a pool of workers on the spare CPUs.
+# The best schedule so far is then improved by local search, and swapped for a better one whenever
+# an engine comes back with one, until the time is up. Workers still running at the deadline are
+# stopped; only the baseline itself may take longer than the time limit
+def solveAnytime(students_file: str, sessions_file: str, config: SortConfig, time_limit: float, workers: int = None):
+
+    start = time.perf_counter()
+    deadline = start + time_limit * (1 - ANYTIME_RESERVE)
+    progress: List[dict] = [] # The last entry is the schedule the students hold
+
+    # Keeps a schedule only if it beats the last one kept, feasible ones first. Scores have to go up
+    # by more than rounding, local search and the engines round their totals differently
+    def record(feasible: bool, score: float, source: str):
+        if progress and ((feasible, score) <= (progress[-1]["feasible"], progress[-1]["score"] + ANYTIME_MIN_GAIN)):
+            return False
+        progress.append({"seconds": time.perf_counter() - start, "score": score, "feasible": feasible, "source": source})
+        log.info("%.2fs %s: %.3f", progress[-1]["seconds"], source, score)
+        return True
+
+    with stats.phase("parse"):
+        session_header, session_records = readSessionFileRecords(sessions_file, use_snapshot=USE_SNAPSHOTS)
+        sessions = getSessionsFromRecords(session_header, session_records)
+        student_records = list(readStudentRecords(students_file, session_ids=set(sessions.keys()), max_choices=NUM_CHOICES, use_snapshot=USE_SNAPSHOTS))
+        students = getStudentsFromRecords(student_records)
+
+    # One CPU is left for the baseline and local search here. Forked workers get the parsed records
+    # without copying them, and a fresh worker is started for each engine
+    if (workers is None):
+        workers = min(len(ANYTIME_ENGINES) - 1, (os.cpu_count() or 1) - 1)
+    pool, pending = None, []
+    if (workers > 0):
+        context = multiprocessing.get_context("fork" if ("fork" in multiprocessing.get_all_start_methods()) else None)
+        pool = context.Pool(processes=workers, initializer=setCandidateInput, initargs=(student_records, session_header, session_records), maxtasksperchild=1)
+        pending = [(engine, pool.apply_async(runCandidate, (replace(config, engine=engine, improve=False, target_gap=None),))) for engine in ANYTIME_ENGINES[1:]]
+
+    try:
+        improving = False
+
+        with stats.phase("baseline"):
+            try:
+                students = run(students, sessions, replace(config, engine=ANYTIME_ENGINES[0], improve=False, target_gap=None)).students
+                improving = record(checkFeasible(students, sessions), getAverageScore(students), ANYTIME_ENGINES[0])
+            except Exception as error:
+                log.warning("%s engine failed: %s", ANYTIME_ENGINES[0], error)
+
+        target_score = None
+        if (config.target_gap is not None):
+            with stats.phase("bound"):
+                target_score = getScheduleBound(students, sessions, method=config.bound_method).value * (1 - config.target_gap)
+
+        # Takes the schedules that came back, keeping one only if it beats the current one
+        def collect():
+            nonlocal improving
+            for entry in [entry for entry in pending if entry[1].ready()]:
+                pending.remove(entry)
+                engine, outcome = entry
+                try:
+                    schedule, score, feasible = outcome.get()
+                except Exception as error:
+                    log.warning("%s engine failed: %s", engine, error)
+                    continue
+                if record(feasible, score, engine):
+                    loadAssignment(students, sessions, schedule)
+                    improving = True
+
+        # Local search stops to let collect() look at an engine that finished
+        last_snapshot = [start]
+        def onProgress(score: float):
+            if (time.perf_counter() - last_snapshot[0] >= SNAPSHOT_INTERVAL) and record(progress[-1]["feasible"], score, "local_search"):
+                last_snapshot[0] = time.perf_counter()
+            return any(outcome.ready() for engine, outcome in pending)
+
+        while (time.perf_counter() < deadline):
+            collect()
+
+            if progress and (target_score is not None) and progress[-1]["feasible"] and (progress[-1]["score"] >= target_score):
+                break
+
+            if improving:
+                with stats.phase("improve"):
+                    improvement = improveSchedule(students, sessions, time_limit=deadline - time.perf_counter(), seed=config.seed, target_score=target_score, on_progress=onProgress)
+                record(progress[-1]["feasible"], improvement["score_after"], "local_search")
+                improving = not improvement["converged"]
+            elif pending:
+                pending[0][1].wait(min(ANYTIME_POLL, max(deadline - time.perf_counter(), 0)))
+            else:
+                break # Every engine is back and local search has nothing left to improve
+
+    finally:
+        if (pool is not None):
+            pool.terminate()
+
+    if not progress:
+        raise TimeoutError(f"No engine produced a schedule within {time_limit:g}s")
+
+    return SortResult(students=students, sessions=sessions, seed=config.seed, timings={"anytime": time.perf_counter() - start}, score=progress[-1]["score"], progress=progress)
+
+# Gets seconds from a duration such as 30s, 2m, 500ms or 45 (seconds)
+def parseDuration(text: str):
+
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    match = re.fullmatch(r"\s*(\d+(?:\.\d*)?|\.\d+)\s*(ms|s|m|h)?\s*", text)
+    if (match is None):
+        raise argparse.ArgumentTypeError(f"not a duration: {text!r}, use e.g. 30s, 2m or 500ms")
+
+    return float(match.group(1)) * units[match.group(2) or "s"]
+
+# Prints the checks and scores of an in-memory evaluation
+def printEvaluation(report: "evaluation.ScheduleEvaluation"):
+
+    for violation in report.violations:
+        print(f"Violation: {violation}")
+    print(f"Evaluation {'passed' if report.passed else 'FAILED'}, average score: {report.average_score}")
+
+    for grade, score in report.gradeAverages().items():
+        print(f"Average score {grade}th grade: {score}")
+
+# Gets command line arguments
+def parseArguments(argv: List[str] = None):
+
+    parser = argparse.ArgumentParser(description="Assigns students to career day sessions.")
+    parser.add_argument("--students", default="real_data/students.csv", help="student choices file (sample: sample_data/students.csv)")
+    parser.add_argument("--sessions", default="real_data/sessions.csv", help="sessions file (sample: sample_data/sessions.csv)")
+    parser.add_argument("--schedule", default="output/schedule.csv", help="student schedule file to write")
+    parser.add_argument("--updated-sessions", default="output/updated_sessions.csv", help="session enrolment file to write")
+    parser.add_argument("--engine", default=ASSIGNMENT_ENGINE, choices=ENGINES, help="assignment engine")
+    parser.add_argument("--seed", type=int, default=None, help="shuffles student order within each grade")
+    parser.add_argument("--timing", action="store_true", help="prints how long each phase took")
+    parser.add_argument("--evaluate", action="store_true", help="checks and scores the schedule in memory and prints the result")
+    parser.add_argument("--no-csv", action="store_true", help="skips writing the schedule and session files")
+    parser.add_argument("--no-snapshots", action="store_true", help="parses the input files without reading or writing .snapshots/")
+    parser.add_argument("--improve", action="store_true", help="runs the local search pass after assigning")
+    parser.add_argument("--improve-time-limit", type=float, default=None, metavar="SECONDS", help="time budget for --improve")
+    parser.add_argument("--improve-iterations", type=int, default=None, help="iteration budget for --improve")
+    parser.add_argument("--multi-start", type=int, default=0, metavar="RUNS", help="runs this many seeded sorts in parallel and keeps the best one")
+    parser.add_argument("--workers", type=int, default=None, help="processes for --multi-start and --time-limit (default: one per CPU, --time-limit keeps one for itself)")
+    parser.add_argument("--time-limit", type=parseDuration, default=None, metavar="DURATION", help="runs every engine and improves the best schedule until the time is up, e.g. 30s or 2m")
+    parser.add_argument("--progress", default=None, metavar="FILE", help="writes the --time-limit score over time as JSON")
+    parser.add_argument("--log-level", default="WARNING", choices=LOG_LEVELS, help="level of log messages shown on stderr")
+    parser.add_argument("--stats", default=None, metavar="FILE", help="writes phase timings and counters as JSON at the end of the run")
+    parser.add_argument("--bound", action="store_true", help="prints an upper bound on the average score and the schedule's gap to it")
+    parser.add_argument("--bound-method", default="lagrangian", choices=["lagrangian", "lp"], help="how the upper bound is solved, lp needs SciPy")
+    parser.add_argument("--target-gap", type=float, default=None, metavar="FRACTION", help="stops improving and multi-start runs once the score is within this fraction of the bound, 0.01 is 1%%")
+
+    return parser.parse_args(argv)
+
+def main(argv: List[str] = None):
+
+    global USE_SNAPSHOTS
+
+    args = parseArguments(argv)
+    configureLogging(args.log_level)
+    stats.reset()
+
+    # Snapshots are for repeated command line runs over the same files, library callers read the CSV
+    USE_SNAPSHOTS = not args.no_snapshots
+
+    config = SortConfig(engine=args.engine, seed=args.seed, improve=args.improve, improve_time_limit=args.improve_time_limit, improve_iterations=args.improve_iterations, target_gap=args.target_gap, bound_method=args.bound_method)
+
+    if (args.time_limit is not None):
+        try:
+            result = solveAnytime(args.students, args.sessions, config, args.time_limit, workers=args.workers)
+        except TimeoutError as error:
+            log.error("%s", error)
+            sys.exit(1)
+        print(f"Best score: {result.score} after {result.progress[-1]['seconds']:.2f}s ({result.progress[-1]['source']}), {len(result.progress)} improvements in {result.timings['anytime']:.2f}s")
+        if (args.progress is not None):
+            with open(args.progress, "w") as file:
+                json.dump(result.progress, file, indent=2)
+    elif (args.multi_start > 1):
+        result = multiStart(args.students, args.sessions, config, runs=args.multi_start, workers=args.workers)
+        print(f"Best seed: {result.seed}, score: {result.score}")
+    else:
+        with stats.phase("parse") as timer:
+            sessions = getSessionData(filename=args.sessions)
+            students = getStudentData(filename=args.students, session_ids=set(sessions.keys()))
+
+        result = run(students, sessions, config)
+        result.timings["parse"] = timer.seconds
+
+    # The CSV files are only one place results can go, evaluation takes them in memory
+    if not args.no_csv:
+        with stats.phase("write") as timer:
+            writeStudentSelectionFile(filename=args.schedule, students=result.students, sessions=result.sessions)
+            writeSessionSelectionFile(filename=args.updated_sessions, sessions=result.sessions)
+        result.timings["write"] = timer.seconds
+
+    if (args.evaluate):
+        with stats.phase("evaluate") as timer:
+            report = evaluation.evaluateSchedule(result.students, result.sessions, SPECIAL_SESSIONS)
+        result.timings["evaluate"] = timer.seconds
+        printEvaluation(report)
+
+    if (result.improvement is not None):
+        print(f"Local search: {result.improvement['score_before']:.2f} -> {result.improvement['score_after']:.2f} ({result.improvement['moves']})")
+
+    if (args.bound) or (result.bound is not None):
+        from bounds import getGap
+
+        # The bound only depends on the students' choices, so one made during the run is reused
+        with stats.phase("bound") as timer:
+            score = scoreSchedule(result.students, result.sessions)
+            bound = result.bound if (result.bound is not None) else getScheduleBound(result.students, result.sessions, method=args.bound_method, lower=score)
+        result.timings["bound"] = result.timings.get("bound", 0.0) + timer.seconds
+        print(f"Upper bound: {bound.value:.3f} ({bound.method}, {bound.iterations} iterations), score: {score:.3f}, gap: {getGap(score, bound) * 100:.2f}%")
+
+    if (args.timing):
+        for phase, seconds in result.timings.items():
+            print(f"{phase}: {seconds:.3f}s")
+
+    if (args.stats is not None):
+        stats.writeSummary(args.stats)
+
+    print("Done")
+
+    return result
 
+if __name__ == "__main__":
+    main()
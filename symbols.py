@@ -0,0 +1,45 @@
+from typing import List
+
+# Symbol table for names repeated across many records
+#
+# Homeroom and first period teachers repeat across thousands of students, and
+# session teachers and presenters are the same kind of name. Students and
+# sessions keep the integer code of a name instead of their own copy of the
+# string, and the name is looked up when a row or report is written. Codes are
+# handed out in the order names are first seen, so a group-by over codes is a
+# list index; getSortedCodes gives the alphabetical order of the names when
+# output has to be sorted.
+#
+# Codes only mean something inside the process that made them, anything
+# written out or handed to another process carries the names.
+
+# CUSTOM TYPES
+
+class SymbolTable:
+
+    def __init__(self):
+        self.codes: dict = {}
+        self.names: List[str] = []
+
+    # Gets the code of a name, adding the name the first time it is seen
+    def getCode(self, name: str):
+
+        code = self.codes.get(name)
+        if (code is None):
+            code = len(self.names)
+            self.codes[name] = code
+            self.names.append(name)
+
+        return code
+
+    def getName(self, code: int):
+        return self.names[code]
+
+    # Gets codes in the alphabetical order of their names
+    def getSortedCodes(self, codes):
+        return sorted(codes, key=self.names.__getitem__)
+
+    def __len__(self):
+        return len(self.names)
+
+names = SymbolTable()
@@ -0,0 +1,73 @@
+import os
+import sys
+
+import pytest
+
+# Tests run against the flat modules in the repository root, the data generator lives in sample_data
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "sample_data"))
+
+import evaluation
+import snapshot
+import supersorter
+from craft_chal_data import generate
+
+# Keeps snapshots out of the source tree, and undoes main() turning them on for the tests after it
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(supersorter, "USE_SNAPSHOTS", False)
+    return snapshot.SNAPSHOT_DIR
+
+# Gets the files of a tight generated dataset: 7 sessions of 7 to 20 students, so every student has to
+# take nearly all the sessions they may attend
+@pytest.fixture
+def tight_files(tmp_path):
+
+    def makeFiles(num_students: int, seed: int):
+        students_file, sessions_file = str(tmp_path / f"students_{num_students}_{seed}.csv"), str(tmp_path / f"sessions_{num_students}_{seed}.csv")
+        generate(students_file, sessions_file, num_students, num_sessions=7, min_students=7, max_students=20, seed=seed)
+        return students_file, sessions_file
+
+    return makeFiles
+
+# Gets students and sessions for a tight generated dataset
+@pytest.fixture
+def tight_data(tight_files):
+
+    def makeData(num_students: int, seed: int):
+        students_file, sessions_file = tight_files(num_students, seed)
+
+        sessions = supersorter.getSessionData(filename=sessions_file, use_snapshot=False)
+        students = supersorter.getStudentData(filename=students_file, session_ids=set(sessions.keys()), use_snapshot=False)
+
+        return students, sessions
+
+    return makeData
+
+# Checks every student sits in the class of each period their schedule names and in no other class
+def checkAligned(students, sessions):
+
+    for student in students:
+        for period, session_id in enumerate(student.assigned):
+            assert any(class_student is student for class_student in sessions[session_id].classes[period].students), f"student {student.id} is not in session {session_id} class #{period}"
+
+    seats = sum(len(session_class.students) for session in sessions.values() for session_class in session.classes)
+    assert seats == sum(len(student.assigned) for student in students)
+
+# Checks the schedule is aligned with the class lists and passes evaluation
+def checkSchedule(students, sessions):
+
+    checkAligned(students, sessions)
+
+    report = evaluation.evaluateSchedule(students, sessions, supersorter.SPECIAL_SESSIONS)
+    assert report.passed, report.violations
+
+@pytest.fixture
+def check_aligned():
+    return checkAligned
+
+@pytest.fixture
+def check_schedule():
+    return checkSchedule
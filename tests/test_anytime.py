@@ -0,0 +1,43 @@
+import logging
+import os
+
+import pytest
+
+import evaluation
+import supersorter
+from conftest import ROOT
+
+STUDENTS_FILE = os.path.join(ROOT, "real_data", "students.csv")
+SESSIONS_FILE = os.path.join(ROOT, "real_data", "sessions.csv")
+
+# The baseline is made before the time is checked, so even a limit no engine could meet gets a schedule
+def testAnytimeAlwaysReturnsBaseline(check_schedule):
+
+    result = supersorter.solveAnytime(STUDENTS_FILE, SESSIONS_FILE, supersorter.SortConfig(), 0.001, workers=0)
+
+    assert result.progress[0]["source"] == supersorter.ANYTIME_ENGINES[0]
+    check_schedule(result.students, result.sessions)
+
+@pytest.mark.parametrize("workers", [0, 2])
+def testAnytimeProgressOnlyGoesUp(check_schedule, workers):
+
+    result = supersorter.solveAnytime(STUDENTS_FILE, SESSIONS_FILE, supersorter.SortConfig(), 3, workers=workers)
+    kept = [(entry["feasible"], entry["score"]) for entry in result.progress]
+
+    assert all(later > earlier for earlier, later in zip(kept, kept[1:]))
+    assert result.score == result.progress[-1]["score"]
+    assert result.score == pytest.approx(evaluation.evaluateSchedule(result.students, result.sessions, supersorter.SPECIAL_SESSIONS).average_score)
+    check_schedule(result.students, result.sessions)
+
+def testTimeLimitReportsTimeout(monkeypatch, caplog):
+
+    def solveAnytime(*args, **kwargs):
+        raise TimeoutError("No engine produced a schedule within 1s")
+
+    monkeypatch.setattr(supersorter, "solveAnytime", solveAnytime)
+
+    with caplog.at_level(logging.ERROR), pytest.raises(SystemExit) as exit_info:
+        supersorter.main(["--time-limit", "1s", "--no-csv"])
+
+    assert exit_info.value.code == 1
+    assert "No engine produced a schedule" in caplog.text
@@ -0,0 +1,37 @@
+import logging
+import random
+
+import pytest
+
+import supersorter
+
+def runArray(students, sessions):
+    return supersorter.run(students, sessions, supersorter.SortConfig(engine="array"))
+
+# A student left without a class in a period used to shift their later periods down one
+def testArrayKeepsPeriodsAligned(tight_data, check_schedule):
+
+    students, sessions = tight_data(134, 59)
+    result = runArray(students, sessions)
+
+    check_schedule(result.students, result.sessions)
+
+# Periods left empty are filled by moving a student out of a full class
+@pytest.mark.parametrize("seed", range(20))
+def testArrayFillsTightInstances(tight_data, check_schedule, seed):
+
+    students, sessions = tight_data(random.Random(seed).randint(100, 140), seed)
+    result = runArray(students, sessions)
+
+    check_schedule(result.students, result.sessions)
+
+# More students than seats, some schedules stop early but stay in step with the class lists
+def testArrayShortSchedulesStayAligned(tight_data, check_aligned, caplog):
+
+    students, sessions = tight_data(150, 3)
+    with caplog.at_level(logging.WARNING, logger="supersorter"):
+        result = runArray(students, sessions)
+
+    assert any(len(student.assigned) < supersorter.NUM_ASSIGNED_CLASSES for student in result.students)
+    assert any("could only be given" in record.getMessage() for record in caplog.records)
+    check_aligned(result.students, result.sessions)
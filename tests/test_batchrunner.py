@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+import batchrunner
+import supersorter
+from conftest import ROOT
+
+REAL_DATA = os.path.join(ROOT, "real_data")
+SLOW_SEED = 901 # Seeds the patched run() below stalls or dies on
+CRASH_SEED = 902
+
+# Writes a manifest of jobs into tmp_path, returns its path
+def writeManifest(tmp_path, jobs: list):
+
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({"output_dir": str(tmp_path / "out"), "jobs": jobs}))
+
+    return str(manifest)
+
+def runManifest(tmp_path, manifest: str, *args: str):
+
+    summary_file = str(tmp_path / "summary.json")
+    code = batchrunner.main([manifest, "--summary", summary_file, *args])
+
+    with open(summary_file) as file:
+        return code, {job["name"]: job for job in json.load(file)["jobs"]}
+
+# Workers are forked, so they run the patched sort: one seed never finishes and another kills its worker
+def patchRun(monkeypatch):
+
+    run = supersorter.run
+
+    def patchedRun(students, sessions, config=None):
+        if (config is not None) and (config.seed == SLOW_SEED):
+            time.sleep(60)
+        if (config is not None) and (config.seed == CRASH_SEED):
+            os._exit(1)
+        return run(students, sessions, config)
+
+    monkeypatch.setattr(supersorter, "run", patchedRun)
+
+def testMalformedJobsFailAlone(tmp_path):
+
+    bad_students = tmp_path / "bad" / "students.csv"
+    bad_students.parent.mkdir()
+    bad_students.write_text("NUM_STUDENTS, 1\nheader\n1, A, B, N/A, C, 5, 9, 1, 1\n")
+
+    manifest = writeManifest(tmp_path, [
+        {"name": "good", "input_dir": REAL_DATA},
+        {"name": "missing", "input_dir": str(tmp_path / "nowhere")},
+        {"name": "bad_option", "input_dir": REAL_DATA, "config": {"colour": "red"}},
+        {"name": "bad_csv", "students": str(bad_students), "sessions": os.path.join(REAL_DATA, "sessions.csv")},
+    ])
+    code, jobs = runManifest(tmp_path, manifest, "--workers", "2")
+
+    assert code == 1
+    assert jobs["good"]["status"] == "ok"
+    assert os.path.exists(jobs["good"]["outputs"][0])
+    assert jobs["missing"]["error"].startswith("FileNotFoundError")
+    assert "unknown config options: colour" in jobs["bad_option"]["error"]
+    assert jobs["bad_csv"]["error"].startswith("InputError")
+
+def testSlowJobTimesOut(tmp_path, monkeypatch):
+
+    patchRun(monkeypatch)
+    manifest = writeManifest(tmp_path, [
+        {"name": "slow", "input_dir": REAL_DATA, "config": {"seed": SLOW_SEED}},
+        {"name": "first", "input_dir": REAL_DATA},
+        {"name": "second", "input_dir": REAL_DATA, "config": {"seed": 1}},
+        {"name": "patient", "input_dir": REAL_DATA, "timeout": 30},
+    ])
+
+    start = time.perf_counter()
+    code, jobs = runManifest(tmp_path, manifest, "--workers", "2", "--timeout", "2")
+
+    assert time.perf_counter() - start < 30
+    assert code == 1
+    assert jobs["slow"]["status"] == "failed"
+    assert jobs["slow"]["error"] == "timed out after 2.0s"
+    assert [jobs[name]["status"] for name in ("first", "second", "patient")] == ["ok", "ok", "ok"]
+
+def testCrashedWorkerFailsOneJob(tmp_path, monkeypatch):
+
+    patchRun(monkeypatch)
+    manifest = writeManifest(tmp_path, [
+        {"name": "crash", "input_dir": REAL_DATA, "config": {"seed": CRASH_SEED}},
+        {"name": "other", "input_dir": REAL_DATA},
+    ])
+    code, jobs = runManifest(tmp_path, manifest, "--workers", "2")
+
+    assert code == 1
+    assert jobs["crash"] == {"name": "crash", "output_dir": jobs["crash"]["output_dir"], "status": "failed", "error": "worker process died"}
+    assert jobs["other"]["status"] == "ok"
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+import batchscoring
+import evaluation
+
+SESSION_IDS = list(range(1, 21))
+
+# Random students, some list a session that does not exist and some miss a period or attend a session twice
+def makeStudents(num_students: int, seed: int):
+
+    rng = random.Random(seed)
+    preferences, schedules = [], []
+    for _ in range(num_students):
+        selections = tuple(rng.sample(SESSION_IDS, rng.randint(0, 7)) + rng.choice([[], [99]]))
+        schedule = [rng.choice(SESSION_IDS + [None]) for _ in range(rng.randint(3, 4))]
+        preferences.append(selections)
+        schedules.append(schedule)
+
+    return preferences, schedules
+
+def getExpectedScores(preferences: list, schedules: list):
+    return [evaluation.scoreSelectionList(list(selections), [session_id for session_id in schedule if (session_id is not None)]) for selections, schedule in zip(preferences, schedules)]
+
+def testBatchScoresMatchPerStudentScores():
+
+    preferences, schedules = makeStudents(500, 1)
+    scores = batchscoring.BatchScores(preferences, schedules, [9] * len(preferences), SESSION_IDS, 4)
+
+    assert scores.scores.tolist() == pytest.approx(getExpectedScores(preferences, schedules))
+
+# The rank table is kept for the same students, also when they come back in another order with new schedules
+def testRankTableIsReusedForSameStudents():
+
+    preferences, schedules = makeStudents(300, 2)
+    batchscoring.BatchScores(preferences, schedules, [9] * len(preferences), SESSION_IDS, 4)
+    table = batchscoring.cached_rank_table
+
+    order = list(range(len(preferences)))
+    random.Random(3).shuffle(order)
+    shuffled = [preferences[index] for index in order]
+    _, new_schedules = makeStudents(300, 4)
+    scores = batchscoring.BatchScores(shuffled, new_schedules, [9] * len(shuffled), SESSION_IDS, 4, keys=shuffled)
+
+    assert batchscoring.cached_rank_table is table
+    assert scores.scores.tolist() == pytest.approx(getExpectedScores(shuffled, new_schedules))
+    listing = next(selections for selections in shuffled if selections)
+    assert scores.getRank(listing, listing[0]) == 1
+
+    # Other students get a table of their own
+    other, _ = makeStudents(300, 5)
+    batchscoring.BatchScores(other, new_schedules, [9] * len(other), SESSION_IDS, 4)
+    assert batchscoring.cached_rank_table is not table
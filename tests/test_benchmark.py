@@ -0,0 +1,27 @@
+import pytest
+
+from benchmark import findRegressions, getBaselineMismatch
+
+def makeReport(engine: str = "greedy", seed: int = 0, assign_seconds: float = 0.1):
+    return {
+        "engine": engine,
+        "seed": seed,
+        "memory_traced": False,
+        "results": [{"students": 1000, "phases": {"assign": {"seconds": assign_seconds}}}],
+    }
+
+def testSlowerPhaseIsRegression():
+
+    regressions = findRegressions(makeReport(assign_seconds=0.5), makeReport(assign_seconds=0.1), 0.25)
+
+    assert [(regression["phase"], regression["metric"]) for regression in regressions] == [("assign", "seconds")]
+
+# Another engine or dataset is a different workload, not a regression
+@pytest.mark.parametrize("changes", [{"engine": "flow"}, {"seed": 1}])
+def testOtherRunsAreNotCompared(changes):
+
+    report, baseline = makeReport(assign_seconds=0.5, **changes), makeReport(assign_seconds=0.1)
+
+    assert getBaselineMismatch(report, baseline) is not None
+    with pytest.raises(ValueError):
+        findRegressions(report, baseline, 0.25)
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import bounds
+import evaluation
+import supersorter
+from conftest import ROOT
+
+STUDENTS_FILE = os.path.join(ROOT, "real_data", "students.csv")
+SESSIONS_FILE = os.path.join(ROOT, "real_data", "sessions.csv")
+
+# Gets the real data sorted by an engine and its average score
+def getSortedSchedule(engine: str):
+
+    sessions = supersorter.getSessionData(filename=SESSIONS_FILE)
+    students = supersorter.getStudentData(filename=STUDENTS_FILE, session_ids=set(sessions.keys()))
+    result = supersorter.run(students, sessions, supersorter.SortConfig(engine=engine))
+
+    return result.students, result.sessions, supersorter.scoreSchedule(result.students, result.sessions)
+
+# No feasible schedule scores above the bound
+@pytest.mark.parametrize("engine", supersorter.ENGINES)
+def testBoundIsAboveFeasibleSchedules(check_schedule, engine):
+
+    students, sessions, score = getSortedSchedule(engine)
+    check_schedule(students, sessions)
+
+    bound = supersorter.getScheduleBound(students, sessions)
+
+    assert bound.method == "lagrangian"
+    assert score <= bound.value <= 100.0
+
+# Every set of capacity prices gives a bound at least the relaxation's optimum, and the prices get close to it
+def testLagrangianAgreesWithLP():
+
+    pytest.importorskip("scipy")
+    students, sessions, score = getSortedSchedule("flow")
+
+    lagrangian = supersorter.getScheduleBound(students, sessions, method="lagrangian", lower=score)
+    lp = supersorter.getScheduleBound(students, sessions, method="lp")
+
+    assert score <= lp.value <= lagrangian.value + 1e-6
+    assert lagrangian.value - lp.value < 0.05
+
+def testGapIsFractionOfBound():
+
+    bound = bounds.Bound(value=80.0, method="lagrangian", iterations=1, seconds=0.0)
+
+    assert bounds.getGap(60.0, bound) == pytest.approx(0.25)
+    assert bounds.getGap(90.0, bound) == 0.0
+
+def testUnknownMethodIsRefused():
+    with pytest.raises(ValueError):
+        bounds.getUpperBound([(1, 2)], [9], [1, 2], [4, 4], 2, method="exact")
+
+# The bound is only worked out when asked for
+def testEvaluationReportsBoundOnRequest(tmp_path, capsys):
+
+    students, sessions, _ = getSortedSchedule("greedy")
+    schedule_file = str(tmp_path / "schedule.csv")
+    supersorter.writeStudentSelectionFile(filename=schedule_file, students=students, sessions=sessions)
+
+    evaluation.main(SESSIONS_FILE, STUDENTS_FILE, schedule_file, str(tmp_path))
+    assert "Upper bound" not in capsys.readouterr().out
+
+    evaluation.main(SESSIONS_FILE, STUDENTS_FILE, schedule_file, str(tmp_path), report_bound=True)
+    assert "Upper bound all students" in capsys.readouterr().out
@@ -0,0 +1,30 @@
+import pytest
+
+import supersorter
+from craft_chal_data import SORTER_SPECIAL_SESSIONS, generate, getSpecialIds
+
+def testSpecialSessionsMatchSorter():
+    assert SORTER_SPECIAL_SESSIONS == supersorter.SPECIAL_SESSIONS
+
+@pytest.mark.parametrize("num_sessions, num_special, expected", [(46, None, {44, 45, 46}), (46, 3, {44, 45, 46}), (20, None, set()), (7, 0, set())])
+def testSpecialIdsAreTheSortersIds(num_sessions, num_special, expected):
+    assert getSpecialIds(num_sessions, num_special) == expected
+
+# Special sessions the sorter would take as regular ones are refused instead of written
+@pytest.mark.parametrize("num_sessions, num_special", [(46, 2), (50, None), (50, 3), (20, 3)])
+def testRejectsSpecialIdsSorterDoesNotKnow(tmp_path, num_sessions, num_special):
+
+    with pytest.raises(ValueError, match="treats as special"):
+        generate(str(tmp_path / "students.csv"), str(tmp_path / "sessions.csv"), 100, num_sessions=num_sessions, num_special=num_special)
+
+    assert not (tmp_path / "sessions.csv").exists()
+
+# Only the grades the sorter lets into special sessions choose them
+def testOnlyHighSchoolChoosesSpecialSessions(tmp_path):
+
+    students_file, sessions_file = str(tmp_path / "students.csv"), str(tmp_path / "sessions.csv")
+    generate(students_file, sessions_file, 2000, seed=3)
+    students = supersorter.getStudentData(filename=students_file)
+
+    assert any(set(student.preferences) & set(supersorter.SPECIAL_SESSIONS) for student in students)
+    assert all(student.grade >= 9 for student in students if set(student.preferences) & set(supersorter.SPECIAL_SESSIONS))
@@ -0,0 +1,93 @@
+import types
+
+import pytest
+
+from csvinput import InputError, iterSelectionRecords, readSessionRecords, readStudentRecords
+
+STUDENT_HEADER = "TIMESTAMP, FIRST_NAME, LAST_NAME, HOMEROOM, FIRST_PERIOD, ID, GRADE, CHOICE_1, CHOICE_2, CHOICE_3"
+SESSION_IDS = {1, 2, 3}
+
+# Writes a student file with the given rows, NUM_STUDENTS defaults to the number of rows
+def writeStudents(tmp_path, rows: list, num_students: int = None, header: str = None):
+
+    path = tmp_path / "students.csv"
+    first_line = header if (header is not None) else f"NUM_STUDENTS, {len(rows) if (num_students is None) else num_students}"
+    path.write_text("\n".join([first_line, STUDENT_HEADER] + rows) + "\n")
+
+    return str(path)
+
+def getStudentRow(student_id: int, choices: str = "1, 2, 3"):
+    return f"1729265784, ANA, B, N/A, SMITH, {student_id}, 10, {choices}"
+
+def testReadsValidStudents(tmp_path):
+
+    filename = writeStudents(tmp_path, [getStudentRow(101), "", getStudentRow(102, "3")], num_students=2)
+    records = list(readStudentRecords(filename, session_ids=SESSION_IDS, max_choices=3))
+
+    assert [record.id for record in records] == [101, 102]
+    assert records[0].choices == (1, 2, 3)
+    assert records[1].choices == (3,)
+
+# Rows come out as they are read, a problem further down is raised when the stream reaches it
+def testStudentsAreStreamed(tmp_path):
+
+    filename = writeStudents(tmp_path, [getStudentRow(101), getStudentRow(101)])
+    records = readStudentRecords(filename)
+
+    assert isinstance(records, types.GeneratorType)
+    assert next(records).id == 101
+    with pytest.raises(InputError, match="line 4: duplicate student id 101"):
+        next(records)
+
+@pytest.mark.parametrize("rows, num_students, header, message", [
+    ([getStudentRow(101)], None, "STUDENTS, 1", "expected NUM_STUDENTS line"),
+    ([getStudentRow(101)], None, "NUM_STUDENTS, many", "NUM_STUDENTS is not a number"),
+    ([getStudentRow(101), getStudentRow(101)], None, None, "duplicate student id 101"),
+    ([getStudentRow(101, "1, 9")], None, None, "chose unknown session 9"),
+    ([getStudentRow(101, "1, 1")], None, None, "chose the same session twice"),
+    ([getStudentRow(101, "1, 2, 3, 1")], None, None, "4 choices, at most 3 allowed"),
+    (["1729265784, ANA, B, N/A, SMITH, 101"], None, None, "expected at least 8 columns, got 6"),
+    ([getStudentRow(101, "1, x")], None, None, "choice is not a number"),
+    ([getStudentRow(101)], 2, None, "NUM_STUDENTS is 2 but the file has 1 students"),
+])
+def testRejectsBadStudentFiles(tmp_path, rows, num_students, header, message):
+
+    filename = writeStudents(tmp_path, rows, num_students, header)
+
+    with pytest.raises(InputError, match=message) as error_info:
+        list(readStudentRecords(filename, session_ids=SESSION_IDS, max_choices=3))
+
+    assert error_info.value.filename == filename
+
+def testRejectsBadSessionFiles(tmp_path):
+
+    path = tmp_path / "sessions.csv"
+    lines = ["NUM_SESSIONS, 2", "MIN_STUDENTS, 10", "MAX_STUDENTS, 25", "ID, Subject, Teacher, Presenter"]
+
+    path.write_text("\n".join(lines + ["1, Art, Smith, Jones", "1, Music, Lee, Park"]) + "\n")
+    with pytest.raises(InputError, match="line 6: duplicate session id 1"):
+        readSessionRecords(str(path))
+
+    path.write_text("\n".join(lines + ["1, Art, Smith"]) + "\n")
+    with pytest.raises(InputError, match="expected 4 columns, got 3"):
+        readSessionRecords(str(path))
+
+    path.write_text("\n".join(lines + ["1, Art, Smith, Jones"]) + "\n")
+    with pytest.raises(InputError, match="NUM_SESSIONS is 2 but the file has 1 sessions"):
+        readSessionRecords(str(path))
+
+    path.write_text("\n".join(["NUM_SESSIONS, 1", "MIN_STUDENTS, 30", "MAX_STUDENTS, 25", lines[3], "1, Art, Smith, Jones"]) + "\n")
+    with pytest.raises(InputError, match="MIN_STUDENTS 30 is above MAX_STUDENTS 25"):
+        readSessionRecords(str(path))
+
+def testRejectsBadScheduleFiles(tmp_path):
+
+    path = tmp_path / "schedule.csv"
+
+    path.write_text("NUM_STUDENTS, 1\nheader\nANA, B, N/A, SMITH, 101, 10, 1, A, 2, B\n")
+    with pytest.raises(InputError, match="expected 14 columns, got 10"):
+        list(iterSelectionRecords(str(path), 4, SESSION_IDS))
+
+    path.write_text("NUM_STUDENTS, 1\nheader\nANA, B, N/A, SMITH, 101, 10, 1, A, 9, B\n")
+    with pytest.raises(InputError, match="unknown session 9"):
+        list(iterSelectionRecords(str(path), 2, SESSION_IDS))
@@ -0,0 +1,46 @@
+import copy
+import os
+
+import pytest
+
+import evaluation
+import supersorter
+from conftest import ROOT
+
+STUDENTS_FILE = os.path.join(ROOT, "real_data", "students.csv")
+SESSIONS_FILE = os.path.join(ROOT, "real_data", "sessions.csv")
+
+# Gets evaluation's students and sessions for the real data and a schedule file sorted from it
+def getScheduleFile(tmp_path):
+
+    sessions = supersorter.getSessionData(filename=SESSIONS_FILE)
+    students = supersorter.getStudentData(filename=STUDENTS_FILE, session_ids=set(sessions.keys()))
+    students = supersorter.assignStudents(students, sessions, prioritize_small_classes=True, account_for_special_sessions=True)
+
+    schedule_file = str(tmp_path / "schedule.csv")
+    supersorter.writeStudentSelectionFile(filename=schedule_file, students=students, sessions=sessions)
+
+    (_, _, _, sess_dict) = evaluation.readSessionFile(SESSIONS_FILE)
+    student_data = evaluation.readStudentFile(STUDENTS_FILE, set(sess_dict.keys()))
+
+    return schedule_file, student_data, sess_dict
+
+def testReadsEveryRow(tmp_path):
+
+    schedule_file, student_data, sess_dict = getScheduleFile(tmp_path)
+
+    assert evaluation.readSelectionFile(schedule_file, student_data, sess_dict) == ([], [], [])
+    assert all(None not in s.selections_attending for s in student_data)
+
+# Two students with one id would leave one of them out of the index
+@pytest.mark.parametrize("rename", [False, True])
+def testDuplicateStudentIdIsRefused(tmp_path, rename):
+
+    schedule_file, student_data, sess_dict = getScheduleFile(tmp_path)
+    twin = copy.copy(student_data[3])
+    if rename:
+        twin.first_name += "X"
+    student_data.append(twin)
+
+    with pytest.raises(ValueError, match=f"duplicate student id {twin.id}"):
+        evaluation.readSelectionFile(schedule_file, student_data, sess_dict)
@@ -0,0 +1,47 @@
+import logging
+import os
+
+import supersorter
+from conftest import ROOT
+
+STUDENTS_FILE = os.path.join(ROOT, "real_data", "students.csv")
+SESSIONS_FILE = os.path.join(ROOT, "real_data", "sessions.csv")
+
+# Gets the real data assigned without filling, with the minimum of one regular and one special class
+# that have room raised above their size
+def getUnfilledSchedule(extra: int):
+
+    sessions = supersorter.getSessionData(filename=SESSIONS_FILE, use_snapshot=False)
+    students = supersorter.getStudentData(filename=STUDENTS_FILE, session_ids=set(sessions.keys()), use_snapshot=False)
+    students = supersorter.assignStudents(students, sessions, prioritize_small_classes=True, account_for_special_sessions=True, fill=False)
+
+    raised = []
+    for special, period in [(False, 1), (True, 2)]:
+        session_class = next(session.classes[period] for session in sessions.values() if ((session.id in supersorter.SPECIAL_SESSIONS) == special) and (len(session.classes[period].students) + 3 <= session.classes[period].max_limit))
+        session_class.min_limit = len(session_class.students) + extra
+        raised.append(session_class)
+    sessions.size_index.build()
+    sessions.shortfall = supersorter.ShortfallCounter(sessions)
+
+    return students, sessions, raised
+
+def testFillReachesRaisedMinimums(check_aligned):
+
+    students, sessions, raised = getUnfilledSchedule(3)
+    students = supersorter.fillClasses(students, sessions)
+
+    check_aligned(students, sessions)
+    assert all(session_class.needsStudents() == 0 for session_class in raised)
+    assert not [violation for violation in supersorter.getViolations(students, sessions) if violation.kind in ("below_min", "above_max", "duplicate_session", "ineligible")]
+
+# A minimum nobody can meet is reported and filling still ends
+def testFillReportsImpossibleMinimum(check_aligned, caplog):
+
+    students, sessions, raised = getUnfilledSchedule(len(supersorter.getStudentData(filename=STUDENTS_FILE, use_snapshot=False)))
+
+    with caplog.at_level(logging.WARNING):
+        students = supersorter.fillClasses(students, sessions)
+
+    check_aligned(students, sessions)
+    assert all(session_class.needsStudents() > 0 for session_class in raised)
+    assert "could not be filled" in caplog.text
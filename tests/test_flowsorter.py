@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+import flowsorter
+import supersorter
+
+# Tight instances where the overflow seats of some students could only go to sessions they already had
+@pytest.mark.parametrize("num_students, seed", [(139, 5), (135, 48)])
+def testFlowNeverRepeatsSessions(tight_data, check_schedule, num_students, seed):
+
+    students, sessions = tight_data(num_students, seed)
+    result = supersorter.run(students, sessions, supersorter.SortConfig(engine="flow"))
+
+    check_schedule(result.students, result.sessions)
+
+@pytest.mark.parametrize("seed", range(10))
+def testFlowFillsTightInstances(tight_data, check_schedule, seed):
+
+    students, sessions = tight_data(random.Random(seed).randint(100, 140), seed)
+    result = supersorter.run(students, sessions, supersorter.SortConfig(engine="flow"))
+
+    check_schedule(result.students, result.sessions)
+
+# Sessions 1 and 2 have no room in the first period, so the student only has a class in two later periods
+def getBlockedFirstPeriod():
+
+    sessions = supersorter.SessionTable({session_id: supersorter.Session(id=session_id, subject="", teacher=0, presenter=0, classes=supersorter.getDefaultClasses(min_limit=0, max_limit=1)) for session_id in (1, 2)})
+    for session in sessions.values():
+        session.classes[0].max_limit = 0
+
+    return sessions
+
+def testUnmatchedPeriodKeepsItsSlot():
+
+    schedule = flowsorter.choosePeriods([[1, 2]], getBlockedFirstPeriod(), supersorter.NUM_ASSIGNED_CLASSES)
+
+    assert len(schedule[0]) == supersorter.NUM_ASSIGNED_CLASSES
+    assert schedule[0][0] is None
+    assert sorted(session_id for session_id in schedule[0] if session_id is not None) == [1, 2]
+
+def testUnmatchedStudentStaysAligned(monkeypatch, check_aligned):
+
+    sessions = getBlockedFirstPeriod()
+    students = [supersorter.Student(timestamp=0, first_name="A", last_name="B", homeroom=0, first_period=0, id=1, grade=9, choices=[1, 2])]
+    monkeypatch.setattr(flowsorter, "chooseSessions", lambda students, sessions, num_periods: [[1, 2]])
+
+    flowsorter.assignStudentsFlow(students, sessions)
+
+    check_aligned(students, sessions)
+    assert all(len(session_class.students) <= session_class.max_limit for session in sessions.values() for session_class in session.classes)
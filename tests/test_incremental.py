@@ -0,0 +1,90 @@
+import os
+import random
+
+import pytest
+
+import incremental
+import supersorter
+from csvinput import iterSelectionRecords, readStudentRecords
+from conftest import ROOT
+
+STUDENTS_FILE = os.path.join(ROOT, "real_data", "students.csv")
+SESSIONS_FILE = os.path.join(ROOT, "real_data", "sessions.csv")
+
+# Gets the real data roster and its schedule as read back from a schedule file
+def getPreviousSchedule(tmp_path):
+
+    sessions = supersorter.getSessionData(filename=SESSIONS_FILE, use_snapshot=False)
+    session_ids = set(sessions.keys())
+    students = supersorter.getStudentData(filename=STUDENTS_FILE, session_ids=session_ids, use_snapshot=False)
+    students = supersorter.assignStudents(students, sessions, prioritize_small_classes=True, account_for_special_sessions=True)
+
+    schedule_file = str(tmp_path / "schedule.csv")
+    supersorter.writeStudentSelectionFile(filename=schedule_file, students=students, sessions=sessions)
+
+    roster = {record.id: record for record in readStudentRecords(STUDENTS_FILE, session_ids=session_ids, max_choices=supersorter.NUM_CHOICES, use_snapshot=False)}
+    previous = list(iterSelectionRecords(schedule_file, incremental.NUM_PERIODS, session_ids))
+
+    return previous, roster
+
+# Gets random drops, choice edits and adds, enough drops that some classes fall below their minimum
+def getChanges(roster: dict, seed: int, num_drops: int = 120, num_edits: int = 10, num_adds: int = 15):
+
+    rng = random.Random(seed)
+    ids = sorted(roster)
+    rng.shuffle(ids)
+
+    drops = set(ids[:num_drops])
+    edits = {student_id: tuple(reversed(roster[student_id].choices)) for student_id in ids[num_drops:num_drops + num_edits] if len(roster[student_id].choices) > 1}
+    adds = [roster[student_id]._replace(id=900000 + index) for index, student_id in enumerate(ids[-num_adds:])]
+
+    return incremental.Changes(adds=adds, drops=drops, edits=edits)
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def testRepairKeepsScheduleValid(tmp_path, check_schedule, seed):
+
+    previous, roster = getPreviousSchedule(tmp_path)
+    changes = getChanges(roster, seed)
+    roster.update((record.id, record) for record in changes.adds)
+
+    sessions = supersorter.getSessionData(filename=SESSIONS_FILE, use_snapshot=False)
+    students, summary = incremental.resolveChanges(previous, roster, sessions, changes)
+
+    check_schedule(students, sessions)
+    assert not summary["short_classes"]
+    assert summary["moved_students"]
+    assert {student.id for student in students} == (roster.keys() - changes.drops)
+
+    # Students nobody changed or moved keep their row
+    assigned = {student.id: student.assigned for student in students}
+    kept = [record for record in previous if (record.id not in changes.drops) and (record.id not in changes.edits) and (record.id not in summary["moved_students"])]
+    assert kept
+    for record in kept:
+        assert assigned[record.id] == list(record.session_ids)
+
+# With nothing to change the schedule is loaded as it was
+def testNoChangesKeepsSchedule(tmp_path, check_schedule):
+
+    previous, roster = getPreviousSchedule(tmp_path)
+    sessions = supersorter.getSessionData(filename=SESSIONS_FILE, use_snapshot=False)
+    students, summary = incremental.resolveChanges(previous, roster, sessions, incremental.Changes(adds=[], drops=set(), edits={}))
+
+    check_schedule(students, sessions)
+    assert not summary["moved_students"]
+    assert [student.assigned for student in students] == [list(record.session_ids) for record in previous]
+
+# Students are indexed by how much they want each session they listed, added students included
+def testWantedByIndexesEveryListing(tmp_path):
+
+    previous, roster = getPreviousSchedule(tmp_path)
+    sessions = supersorter.getSessionData(filename=SESSIONS_FILE, use_snapshot=False)
+    repair = incremental.Repair(sessions)
+    students, _ = incremental.loadSchedule(previous, roster, sessions, incremental.Changes(adds=[], drops=set(), edits={}), repair)
+
+    added = supersorter.getStudent(next(iter(roster.values()))._replace(id=900000))
+    repair.addWanted(added)
+
+    for student in students + [added]:
+        for session_id in student.preferences:
+            assert any(listed is student for listed in repair.wanted_by[session_id][repair.getValue(student, session_id)])
+    assert sum(len(listed) for by_value in repair.wanted_by.values() for listed in by_value.values()) == sum(len(set(student.preferences)) for student in students + [added])
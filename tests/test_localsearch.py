@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+import evaluation
+import supersorter
+from craft_chal_data import generate
+from localsearch import SWAP_CANDIDATES, LocalSearch, ScoreTable, improveSchedule
+
+# Local search keeps its own running score, it has to agree with evaluation and leave a valid schedule
+@pytest.mark.parametrize("engine", ["flow", "array"])
+def testImproveKeepsScheduleValid(tight_data, check_schedule, engine):
+
+    students, sessions = tight_data(130, 4)
+    result = supersorter.run(students, sessions, supersorter.SortConfig(engine=engine, seed=1))
+    before = evaluation.evaluateSchedule(result.students, result.sessions, supersorter.SPECIAL_SESSIONS).average_score
+
+    improvement = improveSchedule(result.students, result.sessions, seed=1)
+
+    check_schedule(result.students, result.sessions)
+    after = evaluation.evaluateSchedule(result.students, result.sessions, supersorter.SPECIAL_SESSIONS).average_score
+    assert improvement["score_before"] == pytest.approx(before)
+    assert improvement["score_after"] == pytest.approx(after)
+    assert after >= before
+
+def testScoreTableMatchesEvaluation(tight_data):
+
+    students, sessions = tight_data(130, 5)
+    result = supersorter.run(students, sessions, supersorter.SortConfig(engine="flow"))
+
+    table = ScoreTable(result.students, supersorter.NUM_ASSIGNED_CLASSES)
+    expected = [evaluation.scoreSelectionList(student.preferences, student.assigned) for student in result.students]
+
+    assert [table.getScore(index, table.value_sums[index], table.hits[index]) for index in range(len(result.students))] == pytest.approx(expected)
+
+# Gets a schedule whose classes are far bigger than SWAP_CANDIDATES
+def getBigClassSchedule(tmp_path):
+
+    students_file, sessions_file = str(tmp_path / "students.csv"), str(tmp_path / "sessions.csv")
+    generate(students_file, sessions_file, 8000, num_sessions=20, min_students=50, max_students=600, seed=1)
+    sessions = supersorter.getSessionData(filename=sessions_file, use_snapshot=False)
+    students = supersorter.getStudentData(filename=students_file, session_ids=set(sessions.keys()), use_snapshot=False)
+
+    return supersorter.run(students, sessions, supersorter.SortConfig(engine="array"))
+
+def testSwapTriesFewPartners(tmp_path):
+
+    result = getBigClassSchedule(tmp_path)
+    search = LocalSearch(result.students, result.sessions, seed=1)
+
+    checked = []
+    can_take = search.canTake
+    search.canTake = lambda student, session_id: checked.append(student) or can_take(student, session_id)
+
+    most = 0
+    for student in result.students[:100]:
+        for session_id in [session_id for session_id in student.preferences if can_take(student, session_id)]:
+            for period in range(search.num_periods):
+                checked.clear()
+                if search.trySwap(student, period, session_id):
+                    break
+                most = max(most, len(checked))
+
+    assert 0 < most <= SWAP_CANDIDATES
+
+def testImproveKeepsTimeLimit(tmp_path, check_schedule):
+
+    result = getBigClassSchedule(tmp_path)
+
+    start = time.perf_counter()
+    improvement = improveSchedule(result.students, result.sessions, time_limit=0.3, seed=1)
+
+    assert time.perf_counter() - start < 0.3 + 0.1
+    assert improvement["iterations"] > 0
+    check_schedule(result.students, result.sessions)
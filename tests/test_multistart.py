@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+import evaluation
+import supersorter
+from conftest import ROOT
+
+STUDENTS_FILE = os.path.join(ROOT, "real_data", "students.csv")
+SESSIONS_FILE = os.path.join(ROOT, "real_data", "sessions.csv")
+
+# The score multiStart reports has to be the score of the schedule it returns, also when local search
+# runs on a time budget and a run cannot be rebuilt from its seed
+@pytest.mark.parametrize("improve_time_limit", [None, 0.01])
+def testMultiStartReturnsScoredSchedule(improve_time_limit):
+
+    config = supersorter.SortConfig(improve=True, improve_time_limit=improve_time_limit)
+    result = supersorter.multiStart(STUDENTS_FILE, SESSIONS_FILE, config, runs=3, workers=2)
+
+    assert result.score == evaluation.evaluateSchedule(result.students, result.sessions, supersorter.SPECIAL_SESSIONS).average_score
+    assert result.improvement is not None
+
+def testUnseededLocalSearchIsReproducible(tight_data):
+
+    schedules = []
+    for _ in range(2):
+        students, sessions = tight_data(130, 2)
+        result = supersorter.run(students, sessions, supersorter.SortConfig(engine="array", improve=True))
+        schedules.append([list(student.assigned) for student in result.students])
+
+    assert schedules[0] == schedules[1]
@@ -0,0 +1,54 @@
+import logging
+import os
+
+import snapshot
+import supersorter
+from conftest import ROOT
+
+# Writes a file and loads it through a snapshot, counting how often it is parsed
+def loadCounted(filename: str, builds: list):
+
+    def build():
+        builds.append(filename)
+        with open(filename) as file:
+            return file.read()
+
+    return snapshot.loadSnapshot(filename, "text", build)
+
+def testEditedFileInvalidatesSnapshot(tmp_path):
+
+    source = tmp_path / "input.csv"
+    builds = []
+
+    source.write_text("first")
+    assert loadCounted(str(source), builds) == "first"
+    assert loadCounted(str(source), builds) == "first"
+    assert len(builds) == 1
+
+    source.write_text("second")
+    assert loadCounted(str(source), builds) == "second"
+    assert len(builds) == 2
+
+    # The old snapshot is replaced, not kept next to the new one
+    assert len(os.listdir(snapshot.SNAPSHOT_DIR)) == 1
+
+def testUnwritableSnapshotIsLogged(tmp_path, monkeypatch, caplog):
+
+    blocked = tmp_path / "blocked"
+    blocked.write_text("a file where the directory should be")
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", str(blocked))
+    source = tmp_path / "input.csv"
+    source.write_text("data")
+
+    with caplog.at_level(logging.WARNING):
+        assert loadCounted(str(source), []) == "data"
+
+    assert "Could not save snapshot" in caplog.text
+
+# Library calls parse the files and leave no snapshots behind
+def testLibraryCallsWriteNoSnapshots():
+
+    sessions = supersorter.getSessionData(filename=os.path.join(ROOT, "real_data", "sessions.csv"))
+    supersorter.getStudentData(filename=os.path.join(ROOT, "real_data", "students.csv"), session_ids=set(sessions.keys()))
+
+    assert not os.path.exists(snapshot.SNAPSHOT_DIR)
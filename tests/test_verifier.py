@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from verifier import MISSING, Verifier, Violation, getAssignmentMatrix
+
+SESSION_IDS = [1, 2, 3, 4, 5]
+SPECIAL_SESSIONS = [5]
+NUM_PERIODS = 2
+
+# Five sessions of one to two students per class over two periods, session 5 only for grade 9 and up
+def getVerifier():
+    return Verifier(SESSION_IDS, 1, 2, NUM_PERIODS, SPECIAL_SESSIONS)
+
+# Every class has one or two students and the special session goes to grade 9 and up
+def getCleanSchedule():
+
+    schedules = [[1, 2], [2, 3], [3, 4], [4, 5], [5, 1], [1, 2], [2, 3], [3, 4]]
+    grades = [9, 9, 9, 10, 11, 8, 7, 8]
+
+    return schedules, grades
+
+def verify(schedules: list, grades: list):
+    return getVerifier().verify(getAssignmentMatrix(schedules, NUM_PERIODS), grades, [100 + row for row in range(len(schedules))])
+
+def testCleanSchedulePasses():
+
+    schedules, grades = getCleanSchedule()
+
+    assert verify(schedules, grades) == []
+
+def testOverCapacity():
+
+    schedules, grades = getCleanSchedule()
+    schedules[1] = [1, 3] # Session 1 period 0 now has three students, session 2 period 0 one
+
+    assert verify(schedules, grades) == [Violation("above_max", session_id=1, period=0, value=3, limit=2)]
+
+def testUnderMinimum():
+
+    schedules, grades = getCleanSchedule()
+    schedules[3] = [3, 5] # Session 4 period 0 loses its only student
+    grades[3] = 10
+
+    violations = verify(schedules, grades)
+
+    assert Violation("below_min", session_id=4, period=0, value=0, limit=1) in violations
+    assert {violation.kind for violation in violations} == {"below_min", "above_max"}
+
+def testDoubleBookedSession():
+
+    schedules, grades = getCleanSchedule()
+    schedules[0] = [1, 1]
+
+    assert Violation("duplicate_session", session_id=1, period=1, student_id=100) in verify(schedules, grades)
+
+# A special session needs the special grade, grade 9 itself is allowed
+def testSpecialSessionNeedsGrade():
+
+    schedules, grades = getCleanSchedule()
+    grades[3], grades[4] = 8, 9
+
+    assert verify(schedules, grades) == [Violation("ineligible", session_id=5, period=1, student_id=103)]
+
+def testMissingPeriodAndUnknownSession():
+
+    schedules, grades = getCleanSchedule()
+    schedules[0] = [None, 2]
+    schedules[5] = [9, 2]
+
+    violations = [violation for violation in verify(schedules, grades) if violation.kind in ("missing_period", "unknown_session")]
+
+    assert violations == [Violation("missing_period", period=0, student_id=100), Violation("unknown_session", session_id=9, period=0, student_id=105)]
+
+# Limits per session and period override the single numbers
+def testLimitsPerClass():
+
+    schedules, grades = getCleanSchedule()
+    max_limits = np.full((len(SESSION_IDS), NUM_PERIODS), 2)
+    max_limits[0, 0] = 1
+
+    violations = Verifier(SESSION_IDS, 1, max_limits, NUM_PERIODS, SPECIAL_SESSIONS).verify(getAssignmentMatrix(schedules, NUM_PERIODS), grades)
+
+    assert violations == [Violation("above_max", session_id=1, period=0, student_id=None, value=2, limit=1)]
+
+@pytest.mark.parametrize("schedule, row", [([3], [3, MISSING]), ([None, 4, 5], [MISSING, 4])])
+def testAssignmentMatrixPadsAndCuts(schedule, row):
+    assert getAssignmentMatrix([schedule], NUM_PERIODS).tolist() == [row]
@@ -0,0 +1,110 @@
+from typing import List, NamedTuple
+
+import numpy as np
+
+# Single pass schedule verifier
+#
+# Checks a whole schedule held as an assignment matrix (students x periods of
+# session ids, MISSING where a student has no class) against every rule:
+#
+#   below_min / above_max  class size outside the class's limits
+#   duplicate_session      a student attends the same session twice
+#   ineligible             a student below the special grade in a special session
+#   missing_period         a student has no class in a period
+#   unknown_session        a session id that is not in the session table
+#
+# Class sizes come from one bincount over the matrix and the other rules are
+# array comparisons, so a clean schedule costs a few array passes and no
+# Python loop over students; only the violations found are turned into
+# Violation records. A Verifier is built once per session table and can then
+# be called repeatedly, e.g. by an optimizer checking candidate schedules.
+
+MISSING = -1
+
+# CUSTOM TYPES
+
+class Violation(NamedTuple):
+    kind: str
+    session_id: int = None
+    period: int = None
+    student_id: int = None
+    value: int = None # Class size for limit violations
+    limit: int = None # Limit that was broken
+
+class Verifier:
+
+    def __init__(self, session_ids: list, min_limits, max_limits, num_periods: int, special_sessions: list = (), special_grade: int = 9):
+
+        self.session_ids = np.array(list(session_ids), dtype=np.int64)
+        self.num_periods = num_periods
+        num_sessions = len(self.session_ids)
+
+        # Limits may be one number or one per session and period
+        self.min_limit = np.broadcast_to(np.asarray(min_limits, dtype=np.int64), (num_sessions, num_periods))
+        self.max_limit = np.broadcast_to(np.asarray(max_limits, dtype=np.int64), (num_sessions, num_periods))
+
+        self.special = np.isin(self.session_ids, list(special_sessions))
+        self.special_grade = special_grade
+
+        # Session id -> column lookup, ids outside the table map to MISSING
+        self.lookup = np.full(int(self.session_ids.max(initial=0)) + 2, MISSING, dtype=np.int64)
+        self.lookup[self.session_ids] = np.arange(num_sessions)
+
+    # Gets the session column of every entry, MISSING for no class or an unknown id
+    def getColumns(self, assignment: np.ndarray):
+        in_range = (assignment >= 0) & (assignment < len(self.lookup))
+        return np.where(in_range, self.lookup[np.where(in_range, assignment, 0)], MISSING)
+
+    # Gets the number of students in every class, sessions x periods
+    def getClassSizes(self, columns: np.ndarray):
+        num_sessions = len(self.session_ids)
+        periods = np.broadcast_to(np.arange(self.num_periods), columns.shape)
+        assigned = columns >= 0
+        return np.bincount(columns[assigned] * self.num_periods + periods[assigned], minlength=num_sessions * self.num_periods).reshape(num_sessions, self.num_periods)
+
+    # Gets every rule the schedule breaks, an empty list means the schedule is valid
+    def verify(self, assignment, grades, student_ids=None) -> List[Violation]:
+
+        assignment = np.asarray(assignment, dtype=np.int64).reshape(-1, self.num_periods)
+        grades = np.asarray(grades)
+        student_ids = np.asarray(student_ids) if (student_ids is not None) else np.arange(len(assignment))
+
+        columns = self.getColumns(assignment)
+        violations: List[Violation] = []
+
+        sizes = self.getClassSizes(columns)
+        for session_column, period in zip(*np.nonzero(sizes < self.min_limit)):
+            violations.append(Violation("below_min", session_id=int(self.session_ids[session_column]), period=int(period), value=int(sizes[session_column, period]), limit=int(self.min_limit[session_column, period])))
+        for session_column, period in zip(*np.nonzero(sizes > self.max_limit)):
+            violations.append(Violation("above_max", session_id=int(self.session_ids[session_column]), period=int(period), value=int(sizes[session_column, period]), limit=int(self.max_limit[session_column, period])))
+
+        # Repeats are found by comparing each period with the earlier ones
+        for period in range(1, self.num_periods):
+            repeated = (columns[:, :period] == columns[:, period:period + 1]).any(axis=1) & (columns[:, period] >= 0)
+            for row in np.flatnonzero(repeated):
+                violations.append(Violation("duplicate_session", session_id=int(assignment[row, period]), period=period, student_id=int(student_ids[row])))
+
+        ineligible = (columns >= 0) & self.special[np.maximum(columns, 0)] & (grades[:, None] < self.special_grade)
+        for row, period in zip(*np.nonzero(ineligible)):
+            violations.append(Violation("ineligible", session_id=int(assignment[row, period]), period=int(period), student_id=int(student_ids[row])))
+
+        for row, period in zip(*np.nonzero(assignment == MISSING)):
+            violations.append(Violation("missing_period", period=int(period), student_id=int(student_ids[row])))
+
+        for row, period in zip(*np.nonzero((columns == MISSING) & (assignment != MISSING))):
+            violations.append(Violation("unknown_session", session_id=int(assignment[row, period]), period=int(period), student_id=int(student_ids[row])))
+
+        return violations
+
+# FUNCTIONS
+
+# Gets an assignment matrix from per-student lists of attended session ids, None for no class
+def getAssignmentMatrix(schedules: list, num_periods: int):
+
+    assignment = np.full((len(schedules), num_periods), MISSING, dtype=np.int64)
+    for row, session_ids in enumerate(schedules):
+        for period, session_id in enumerate(session_ids[:num_periods]):
+            if (session_id is not None):
+                assignment[row, period] = session_id
+
+    return assignment